@@ -0,0 +1,394 @@
+"""
+Approximate Nearest Neighbour Index
+IVF (inverted file) index over the resident service vectors for global, non-geo semantic search
+"""
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.vector_index import vector_index, normalize
+
+logger = logging.getLogger(__name__)
+
+# Cluster label for services added before the index had any centroids
+UNCLUSTERED = -1
+
+
+class ANNIndex:
+    """
+    Inverted-file index: services are clustered around k-means centroids and a
+    query only scores the members of its `nprobe` nearest clusters.
+
+    Vectors themselves live in the shared VectorIndex; this index only keeps the
+    centroids and the cluster membership of each active service, so it stays
+    small enough to persist to a local file and reload at startup.
+    Recall is tuned with nprobe (more clusters probed = higher recall, more work).
+    Once the index has doubled it is re-clustered in a background thread.
+    """
+    _instance = None
+
+    # Below this many services an exact scan is as fast as probing clusters
+    EXACT_SCAN_THRESHOLD = 2000
+    KMEANS_ITERATIONS = 10
+    KMEANS_SAMPLE = 50000
+    KMEANS_POINTS_PER_CLUSTER = 40
+    ASSIGN_CHUNK = 10000
+    # Re-cluster once the index has grown this much since it was trained
+    REBUILD_GROWTH = 2.0
+    # Persist after this many incremental inserts/deletes
+    SAVE_EVERY = 500
+    # Pick up services written by other workers at most this often
+    SYNC_INTERVAL_SECONDS = 30
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        # Only initialize once
+        if not hasattr(self, '_initialized'):
+            self._lock = threading.RLock()
+            # Serializes loading, syncing and training; held across DB queries and k-means,
+            # which never run under self._lock, so searches are not blocked by them
+            self._build_lock = threading.Lock()
+            self._path = os.getenv("ANN_INDEX_PATH", "db/ann_index.npz")
+            self._nprobe = int(os.getenv("ANN_NPROBE", 8))
+            self._centroids = np.zeros((0, vector_index.dimension), dtype=np.float32)
+            self._lists: List[set] = []
+            self._assignment: Dict[int, int] = {}
+            self._trained_size = 0
+            self._dirty = 0
+            self._built = False
+            self._watermark = None
+            self._last_sync = 0.0
+            # Ids added, changed or removed while a training runs, re-applied when it is installed
+            self._retrain_changes: Optional[set] = None
+            self._retrain_pending = False
+            self._initialized = True
+
+    def __len__(self) -> int:
+        return len(self._assignment)
+
+    # ------------------------------------------------------------------ build
+
+    def ensure_built(self, db) -> None:
+        """
+        Load the persisted index (or train a new one) on first use, then apply
+        services changed by other workers at most every SYNC_INTERVAL_SECONDS
+
+        The database is read and k-means runs without the index lock; only the
+        result is swapped in under it. A caller arriving during a sync keeps
+        using the current index instead of waiting.
+        """
+        now = time.monotonic()
+        if self._built and now - self._last_sync < self.SYNC_INTERVAL_SECONDS:
+            return
+        if not self._build_lock.acquire(blocking=not self._built):
+            return
+        try:
+            if self._built and now - self._last_sync < self.SYNC_INTERVAL_SECONDS:
+                return
+            vector_index.ensure_loaded(db)
+            if self._built:
+                self._sync(db)
+            else:
+                active_ids = self._active_ids(db)
+                saved = self._read_saved(active_ids)
+                if saved is not None:
+                    with self._lock:
+                        self._install(*saved)
+                else:
+                    self._retrain(active_ids)
+                self._built = True
+            self._last_sync = now
+        finally:
+            self._build_lock.release()
+
+    def rebuild(self, db) -> None:
+        """Re-train the clusters from scratch (e.g. after a bulk re-embedding)"""
+        with self._build_lock:
+            vector_index.ensure_loaded(db)
+            self._retrain(self._active_ids(db))
+            self._built = True
+
+    def _active_ids(self, db) -> List[int]:
+        from app.models.service import Service
+
+        rows = db.query(Service.id, Service.updated_at).filter(Service.status == "active").all()
+        self._advance_watermark(rows)
+        return [row[0] for row in rows if vector_index.contains(row[0])]
+
+    def _sync(self, db) -> None:
+        from app.models.service import Service
+
+        query = db.query(Service.id, Service.updated_at, Service.status)
+        if self._watermark is not None:
+            query = query.filter(Service.updated_at >= self._watermark)
+        rows = query.all()
+        self._advance_watermark(rows)
+        with self._lock:
+            for service_id, _, status in rows:
+                self._discard(service_id)
+                if status == "active":
+                    self._assign(service_id)
+
+    def _advance_watermark(self, rows) -> None:
+        for row in rows:
+            updated_at = row[1]
+            if updated_at is not None and (self._watermark is None or updated_at > self._watermark):
+                self._watermark = updated_at
+
+    def _fit(self, ids: List[int]) -> Tuple[np.ndarray, Dict[int, int]]:
+        """
+        Cluster the given services: (centroids, {service_id: label})
+
+        Reads vectors from the VectorIndex only, never this index's state, so
+        it can run without holding the lock.
+        """
+        n = len(ids)
+        nlist = max(1, min(4096, int(np.sqrt(n))))
+
+        if n == 0:
+            return np.zeros((0, vector_index.dimension), dtype=np.float32), {}
+
+        # Spherical k-means on a sample: vectors are unit length, so assign by dot product
+        rng = np.random.default_rng(0)
+        sample_size = min(n, self.KMEANS_SAMPLE, nlist * self.KMEANS_POINTS_PER_CLUSTER)
+        sample = vector_index.vectors([ids[i] for i in rng.choice(n, size=sample_size, replace=False)])
+        centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+        for _ in range(self.KMEANS_ITERATIONS):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Keep the previous centroid for clusters that lost all their members
+            centroids = np.where(norms > 0, sums / np.where(norms == 0, 1.0, norms), centroids)
+        centroids = centroids.astype(np.float32)
+
+        assignment = {}
+        # Assign every service in chunks to bound the temporary score matrix
+        for start in range(0, n, self.ASSIGN_CHUNK):
+            chunk = ids[start:start + self.ASSIGN_CHUNK]
+            labels = np.argmax(vector_index.vectors(chunk) @ centroids.T, axis=1)
+            assignment.update(zip(chunk, labels.tolist()))
+        return centroids, assignment
+
+    def _install(self, centroids: np.ndarray, assignment: Dict[int, int], trained_size: int) -> None:
+        """Swap in trained clusters (caller holds the lock)"""
+        self._centroids = centroids
+        self._assignment = assignment
+        self._lists = [set() for _ in range(len(centroids))]
+        for service_id, label in assignment.items():
+            if label != UNCLUSTERED:
+                self._lists[label].add(service_id)
+        self._trained_size = trained_size
+
+    def _retrain(self, ids: Optional[List[int]] = None) -> None:
+        """
+        Train on `ids` (default: the services now in the index) and swap the result in
+
+        Caller holds _build_lock. k-means and the full reassignment run without
+        the index lock, so searches and writes continue against the old
+        clusters; services added, changed or removed meanwhile are re-applied
+        to the new clusters when they are installed.
+        """
+        with self._lock:
+            self._retrain_changes = set()
+            if ids is None:
+                ids = list(self._assignment.keys())
+        try:
+            centroids, assignment = self._fit(ids)
+            with self._lock:
+                changed = self._retrain_changes
+                for service_id in changed:
+                    assignment.pop(service_id, None)
+                live = [service_id for service_id in changed if service_id in self._assignment]
+                self._install(centroids, assignment, len(ids))
+                for service_id in live:
+                    self._assign(service_id)
+        finally:
+            with self._lock:
+                self._retrain_changes = None
+        logger.info(f"ANN index trained: {len(ids)} services in {len(centroids)} clusters")
+        self.save()
+
+    def _retrain_in_background(self) -> None:
+        """Re-cluster off the request path once the index has grown (see _after_change)"""
+        try:
+            with self._build_lock:
+                self._retrain()
+        except Exception as e:
+            logger.error(f"ANN index retraining failed: {e}")
+        finally:
+            self._retrain_pending = False
+
+    # -------------------------------------------------------------- persistence
+
+    def save(self) -> bool:
+        """Persist centroids and cluster membership to ANN_INDEX_PATH"""
+        with self._lock:
+            try:
+                directory = os.path.dirname(self._path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                ids = np.fromiter(self._assignment.keys(), dtype=np.int64, count=len(self._assignment))
+                labels = np.fromiter(self._assignment.values(), dtype=np.int32, count=len(self._assignment))
+                tmp_path = self._path + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    np.savez(f, centroids=self._centroids, ids=ids, labels=labels,
+                             trained_size=np.int64(self._trained_size),
+                             model_id=np.str_(vector_index.model_id or ""))
+                os.replace(tmp_path, self._path)
+                self._dirty = 0
+                return True
+            except OSError as e:
+                logger.warning(f"Could not persist ANN index to {self._path}: {e}")
+                return False
+
+    def _read_saved(self, active_ids: List[int]) -> Optional[Tuple[np.ndarray, Dict[int, int], int]]:
+        """
+        The persisted index reconciled with the database: (centroids, assignment, trained_size)
+
+        None when there is no usable file (missing, unreadable, or built for another model).
+        """
+        if not os.path.exists(self._path):
+            return None
+        try:
+            with np.load(self._path) as data:
+                centroids = data["centroids"].astype(np.float32)
+                ids = data["ids"]
+                labels = data["labels"]
+                trained_size = int(data["trained_size"])
+                model_id = str(data["model_id"]) if "model_id" in data else None
+        except Exception as e:
+            logger.warning(f"Could not load ANN index from {self._path}: {e}")
+            return None
+        # Centroids trained on another embedding model are meaningless for this one
+        if centroids.shape[1:] != (vector_index.dimension,) or model_id != (vector_index.model_id or ""):
+            logger.info(f"ANN index at {self._path} was built for another model; retraining")
+            return None
+
+        # Reconcile with the database: drop services that are gone, assign new ones
+        active = set(active_ids)
+        assignment = {
+            service_id: label
+            for service_id, label in zip(ids.tolist(), labels.tolist())
+            if service_id in active and 0 <= label < len(centroids)
+        }
+        new_ids = [service_id for service_id in active_ids if service_id not in assignment]
+        if new_ids:
+            if len(centroids):
+                new_labels = np.argmax(vector_index.vectors(new_ids) @ centroids.T, axis=1).tolist()
+            else:
+                new_labels = [UNCLUSTERED] * len(new_ids)
+            assignment.update(zip(new_ids, new_labels))
+        logger.info(f"ANN index loaded from {self._path}: {len(assignment)} services")
+        return centroids, assignment, trained_size
+
+    # ------------------------------------------------------------ incremental
+
+    def add(self, service_id: int) -> None:
+        """Insert or re-assign a service after its vector changed in the VectorIndex"""
+        if not self._built:
+            return
+        with self._lock:
+            self._discard(service_id)
+            self._assign(service_id)
+            self._after_change()
+
+    def remove(self, service_id: int) -> None:
+        """Drop a service (deleted or deactivated)"""
+        if not self._built:
+            return
+        with self._lock:
+            if self._discard(service_id):
+                self._after_change()
+
+    def _assign(self, service_id: int) -> None:
+        vec = vector_index.get(service_id)
+        if vec is None:
+            return
+        if not len(self._centroids):
+            # Not trained yet (tiny index): tracked for the exact scan only
+            self._assignment[service_id] = UNCLUSTERED
+            return
+        label = int(np.argmax(self._centroids @ vec))
+        self._assignment[service_id] = label
+        self._lists[label].add(service_id)
+
+    def _discard(self, service_id: int) -> bool:
+        # Every add, remove and sync discards first; a running retrain re-applies these ids
+        if self._retrain_changes is not None:
+            self._retrain_changes.add(service_id)
+        label = self._assignment.pop(service_id, None)
+        if label is None:
+            return False
+        if label != UNCLUSTERED:
+            self._lists[label].discard(service_id)
+        return True
+
+    def _after_change(self) -> None:
+        self._dirty += 1
+        grown = len(self._assignment) > max(self.EXACT_SCAN_THRESHOLD, self._trained_size * self.REBUILD_GROWTH)
+        if grown and not self._retrain_pending:
+            # Re-clustering takes seconds at large n: never in the writer's thread under the lock
+            self._retrain_pending = True
+            threading.Thread(target=self._retrain_in_background, name="ann-retrain", daemon=True).start()
+        elif self._dirty >= self.SAVE_EVERY:
+            self.save()
+
+    # ------------------------------------------------------------------ query
+
+    def search(self, query_vec, k: int, nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Top-k services by cosine similarity
+
+        Args:
+            query_vec: Raw query embedding
+            k: Number of results
+            nprobe: Clusters to scan (default: ANN_NPROBE); ignored for small indexes
+
+        Returns:
+            [(service_id, score)] sorted by score descending
+        """
+        query = normalize(query_vec)
+        if query is None or k <= 0:
+            return []
+
+        with self._lock:
+            if len(self._assignment) <= self.EXACT_SCAN_THRESHOLD or not len(self._centroids):
+                candidates = list(self._assignment.keys())
+            else:
+                nprobe = min(nprobe or self._nprobe, len(self._centroids))
+                centroid_scores = self._centroids @ query
+                probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+                candidates = [sid for label in probe for sid in self._lists[label]]
+
+        if not candidates:
+            return []
+        scores = vector_index.scores(query, candidates)
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(candidates[i], float(scores[i])) for i in top]
+
+    def get_stats(self) -> dict:
+        """Get index statistics"""
+        sizes = [len(members) for members in self._lists]
+        return {
+            "built": self._built,
+            "services": len(self._assignment),
+            "clusters": len(self._centroids),
+            "nprobe": self._nprobe,
+            "largest_cluster": max(sizes) if sizes else 0,
+            "path": self._path,
+        }
+
+
+# Global instance
+ann_index = ANNIndex()
@@ -3,21 +3,166 @@ Redis Cache Manager
 Handles caching of search results for performance
 """
 import redis
+import redis.asyncio as aioredis
+import asyncio
+import fnmatch
 import json
 import logging
-from typing import Any, Optional
+import math
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
 import os
 
+from app.core.cache_codec import encode_payload, decode_payload
+
 logger = logging.getLogger(__name__)
 
 
+def normalize_query(query: str) -> str:
+    """Lowercase and collapse whitespace so trivially different queries share an entry"""
+    return " ".join(query.lower().split())
+
+
+class LocalCache:
+    """
+    Bounded in-process LRU with per-entry expiry (the L1 tier in front of Redis)
+    
+    Holds decoded entries, so a hit costs neither a network round trip nor a
+    JSON parse. Thread-safe: it is read on the event loop and invalidated from
+    the pub/sub listener thread.
+    """
+    
+    def __init__(self, max_size: int, ttl: float):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def put(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store for min(ttl, L1 TTL) seconds, evicting the least recently used entry when full"""
+        ttl = self._ttl if ttl is None else min(ttl, self._ttl)
+        if ttl <= 0 or self._max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+    
+    def discard(self, keys: Iterable[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+    
+    def discard_pattern(self, pattern: str) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if fnmatch.fnmatchcase(k, pattern)]:
+                del self._entries[key]
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class CircuitBreaker:
+    """
+    Stops calling Redis after repeated failures so a slow or dead server costs
+    requests nothing
+
+    Trips (opens) after `threshold` failures within `window` seconds. While
+    open every cache call is skipped; CacheManager's health probe closes it
+    again once Redis answers a PING.
+    """
+
+    def __init__(self, threshold: int, window: float):
+        self._threshold = threshold
+        self._window = window
+        self._failures: deque = deque()
+        self._lock = threading.Lock()
+        self._open = False
+        self._opened_at: Optional[float] = None
+        self._trips = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self._open
+
+    def allow(self) -> bool:
+        return not self._open
+
+    def record_failure(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._failures.append(now)
+            while self._failures and self._failures[0] < now - self._window:
+                self._failures.popleft()
+            if not self._open and len(self._failures) >= self._threshold:
+                self._open = True
+                self._opened_at = time.time()
+                self._trips += 1
+                logger.warning(f"Redis circuit breaker opened after {len(self._failures)} failures; caching disabled")
+
+    def close(self) -> None:
+        with self._lock:
+            self._open = False
+            self._opened_at = None
+            self._failures.clear()
+
+    def get_stats(self) -> dict:
+        return {
+            "state": "open" if self._open else "closed",
+            "recent_failures": len(self._failures),
+            "threshold": self._threshold,
+            "trips": self._trips,
+            "opened_at": self._opened_at,
+        }
+
+
 class CacheManager:
     """
     Redis cache manager for search results
     Provides sub-5ms response times for hot queries
+    
+    Search entries carry a soft and a hard TTL. Until the soft TTL an entry is
+    fresh; between soft and hard it is served stale while exactly one worker
+    (holder of a short Redis lock) recomputes it in the background. Refreshes
+    also start probabilistically a little before the soft TTL (XFetch), scaled
+    by how long the value took to compute, so hot keys rarely expire at all.
+    
+    Reads go through a per-process L1 (LocalCache) before Redis (L2). Every
+    deletion is broadcast on INVALIDATION_CHANNEL, and each process drops the
+    keys from its L1 on receipt; the short L1 TTL bounds staleness if a
+    message is ever missed. While the breaker is open, searches are served
+    from and stored in the L1 alone.
+    
+    Connections are pooled and opened lazily, so importing this module never
+    waits on Redis. The listener and health-probe threads are started by
+    start() from the app's startup hook, not at import, so scripts and tests
+    importing the cache run none of them (there a tripped breaker stays open:
+    caching is simply off for the rest of the run). Operations time out after REDIS_TIMEOUT_MS (default 50 ms),
+    and a circuit breaker turns caching off after repeated failures until a
+    background PING succeeds.
     """
     _instance = None
-    _redis_client = None
     
     def __new__(cls):
         if cls._instance is None:
@@ -25,119 +170,512 @@ class CacheManager:
         return cls._instance
     
     def __init__(self):
-        if self._redis_client is None:
-            try:
-                redis_host = os.getenv('REDIS_HOST', 'redis')
-                redis_port = int(os.getenv('REDIS_PORT', 6379))
-                
-                self._redis_client = redis.Redis(
-                    host=redis_host,
-                    port=redis_port,
-                    db=0,
-                    decode_responses=True,
-                    socket_connect_timeout=5,
-                    socket_timeout=5
-                )
-                
-                # Test connection
-                self._redis_client.ping()
-                logger.info(f"Connected to Redis at {redis_host}:{redis_port}")
-            except Exception as e:
-                logger.warning(f"Redis connection failed: {e}. Cache will be disabled.")
-                self._redis_client = None
+        if not hasattr(self, '_stats'):
+            # Served past the soft TTL while one worker refreshes (seconds)
+            self._stale_ttl = int(os.getenv("CACHE_STALE_TTL", 120))
+            # XFetch beta: > 1 refreshes earlier, 0 disables early refresh
+            self._early_beta = float(os.getenv("CACHE_EARLY_EXPIRY_BETA", 1.0))
+            self._refresh_tasks: set = set()
+            self._l1 = LocalCache(
+                max_size=int(os.getenv("CACHE_L1_SIZE", 1024)),
+                ttl=float(os.getenv("CACHE_L1_TTL", 30))
+            )
+            self._listener = None
+            self._stats = {
+                "l1_hits": 0, "l1_misses": 0, "l2_hits": 0, "l2_misses": 0,
+                "stale_hits": 0, "refreshes": 0, "lock_waits": 0, "invalidations_received": 0,
+            }
+            
+            redis_host = os.getenv('REDIS_HOST', 'redis')
+            redis_port = int(os.getenv('REDIS_PORT', 6379))
+            timeout = int(os.getenv('REDIS_TIMEOUT_MS', 50)) / 1000
+            max_connections = int(os.getenv('REDIS_MAX_CONNECTIONS', 50))
+            
+            # Values are binary (see cache_codec), so responses are not decoded to str.
+            # Nothing connects here: pools open connections on first use.
+            pool_options = dict(
+                host=redis_host,
+                port=redis_port,
+                db=0,
+                decode_responses=False,
+                max_connections=max_connections,
+                socket_connect_timeout=timeout,
+                socket_timeout=timeout,
+            )
+            self._redis_client = redis.Redis(connection_pool=redis.ConnectionPool(**pool_options))
+            # Async client for the non-blocking search path
+            self._async_client = aioredis.Redis(connection_pool=aioredis.ConnectionPool(**pool_options))
+            
+            self._breaker = CircuitBreaker(
+                threshold=int(os.getenv("REDIS_BREAKER_THRESHOLD", 5)),
+                window=float(os.getenv("REDIS_BREAKER_WINDOW_SECONDS", 30))
+            )
+            self._probe_interval = float(os.getenv("REDIS_HEALTH_PROBE_SECONDS", 2))
+            self._prober = None
+            self._stop = threading.Event()
+            logger.info(f"Redis cache configured for {redis_host}:{redis_port} (timeout {timeout * 1000:.0f} ms)")
+    
+    def start(self) -> None:
+        """Start the L1 invalidation listener and the Redis health probe (no-op if running)"""
+        self._stop.clear()
+        self._start_listener()
+        self._start_prober()
+    
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        for thread in (self._listener, self._prober):
+            if thread:
+                thread.join(timeout)
+    
+    # Keys/members handled per Redis round trip when scanning or deleting in bulk
+    SCAN_BATCH = 500
+    # Recompute lock lifetime, and how long a hard miss waits for another worker's result
+    LOCK_TTL_MS = 10000
+    LOCK_WAIT_SECONDS = 2.0
+    LOCK_POLL_SECONDS = 0.05
+    
+    INVALIDATION_CHANNEL = "cache:invalidate"
+    
+    _RELEASE_LOCK_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
     
-    def _generate_key(self, query: str, lat: float, lng: float, km: int) -> str:
+    def _tag_key(self, tag: str) -> str:
+        return f"search_tag:{tag}"
+    
+    def _generate_key(self, query: str, cell: str, radius_km: int, filters: Optional[Dict[str, Any]] = None) -> str:
         """
         Generate cache key from search parameters
         
-        Format: search:{query}:{lat}:{lng}:{km}
+        Format: search:{query}:{cell}:{radius_km}[:{filters}]
+        
+        The location is the H3 cell the origin was snapped to and the radius is
+        its bucket (see location_engine.snap_search_area), so every user in the
+        same cell asking for a similar radius shares the entry. Filtered
+        searches (category, price, provider) get their own entries.
+        """
+        key = f"search:{normalize_query(query)}:{cell}:{radius_km}"
+        active = sorted((name, value) for name, value in (filters or {}).items() if value is not None)
+        if active:
+            key += ":" + ",".join(f"{name}={normalize_query(str(value))}" for name, value in active)
+        return key
+    
+    async def aget_or_compute(
+        self,
+        query: str,
+        cell: str,
+        radius_km: int,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: int = 300,
+        tags: Optional[Iterable[str]] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        """
+        Cached search results with stampede protection
+        
+        - Fresh hit: returned as is
+        - Stale hit (past the soft TTL, or picked for early refresh): returned
+          as is; if this worker wins the refresh lock it recomputes in the background
+        - Miss: the lock holder computes and stores; other workers wait up to
+          LOCK_WAIT_SECONDS for that result before computing it themselves
+        
+        Args:
+            compute: Coroutine factory producing fresh results; it may run after
+                the request finished, so it must not use request-scoped resources
+            ttl: Soft TTL in seconds (entries live CACHE_STALE_TTL longer)
+            tags: H3 cells the search covered; a service write in one of them
+                invalidates this entry (see invalidate_tags)
+            filters: Search filters the results were computed with (part of the key)
         """
-        # Round coordinates to 4 decimal places (~11m precision)
-        lat_rounded = round(lat, 4)
-        lng_rounded = round(lng, 4)
+        key = self._generate_key(query, cell, radius_km, filters)
+        if not self._breaker.allow():
+            return await self._local_get_or_compute(key, compute, ttl)
         
-        # Normalize query (lowercase, strip whitespace)
-        query_normalized = query.lower().strip()
+        entry = await self._aget_entry(key)
+        if entry is not None:
+            if not self._should_refresh(entry):
+                logger.info(f"Cache HIT for query: {query}")
+                return entry["value"]
+            # The L1 copy may predate a refresh done by another worker
+            fresher = await self._aget_entry(key, skip_l1=True)
+            if fresher is not None and not self._should_refresh(fresher):
+                return fresher["value"]
+            token = await self._acquire_lock(key)
+            if token:
+                self._stats["refreshes"] += 1
+                task = asyncio.create_task(self._refresh(key, token, compute, ttl, tags))
+                self._refresh_tasks.add(task)
+                task.add_done_callback(self._refresh_tasks.discard)
+            self._stats["stale_hits"] += 1
+            logger.info(f"Cache STALE for query: {query} (refreshing: {bool(token)})")
+            return entry["value"]
         
-        return f"search:{query_normalized}:{lat_rounded}:{lng_rounded}:{km}"
+        logger.info(f"Cache MISS for query: {query}")
+        token = await self._acquire_lock(key)
+        if not token:
+            # Another worker is computing this key; share its result instead of piling on
+            self._stats["lock_waits"] += 1
+            deadline = time.monotonic() + self.LOCK_WAIT_SECONDS
+            # A failed lock attempt (Redis down) trips the breaker, which ends the wait at once
+            while time.monotonic() < deadline and self._breaker.allow():
+                await asyncio.sleep(self.LOCK_POLL_SECONDS)
+                entry = await self._aget_entry(key)
+                if entry is not None:
+                    return entry["value"]
+        try:
+            return await self._compute_and_store(key, compute, ttl, tags)
+        finally:
+            if token:
+                await self._release_lock(key, token)
     
-    def get(self, query: str, lat: float, lng: float, km: int) -> Optional[Any]:
+    async def _local_get_or_compute(self, key: str, compute, ttl: int) -> Any:
         """
-        Get cached search results
+        Redis unavailable (breaker open): serve and fill this process's L1 only
+        
+        Without Redis there is no cross-worker lock or invalidation broadcast;
+        the L1 TTL bounds staleness, and local writes clear the L1 (see
+        invalidate_tags).
+        """
+        entry = self._l1_get(key)
+        if entry is not None and time.time() < entry["soft_expiry"]:
+            return entry["value"]
+        started = time.monotonic()
+        value = await compute()
+        self._l1.put(key, self._make_entry(value, ttl, time.monotonic() - started), ttl)
+        return value
+    
+    async def _refresh(self, key: str, token: str, compute, ttl: int, tags) -> None:
+        try:
+            await self._compute_and_store(key, compute, ttl, tags)
+        except Exception as e:
+            logger.error(f"Background cache refresh failed: {e}")
+        finally:
+            await self._release_lock(key, token)
+    
+    async def _compute_and_store(self, key: str, compute, ttl: int, tags) -> Any:
+        started = time.monotonic()
+        value = await compute()
+        try:
+            await self._astore(key, value, ttl, tags, delta=time.monotonic() - started)
+        except Exception as e:
+            logger.error(f"Cache set error: {e}")
+            self._breaker.record_failure()
+            # Keep serving it from this process while Redis is unreachable
+            self._l1.put(key, self._make_entry(value, ttl, time.monotonic() - started), ttl)
+        return value
+    
+    async def _astore(self, key: str, data: Any, ttl: int, tags, delta: float = 0.0) -> None:
+        hard_ttl = ttl + self._stale_ttl
+        entry = self._make_entry(data, ttl, delta)
+        async with self._async_client.pipeline(transaction=False) as pipe:
+            pipe.setex(key, hard_ttl, encode_payload(entry))
+            self._add_tags(pipe, key, tags, hard_ttl)
+            await pipe.execute()
+        self._l1.put(key, entry, hard_ttl)
+    
+    async def _aget_entry(self, key: str, skip_l1: bool = False) -> Optional[dict]:
+        entry = None if skip_l1 else self._l1_get(key)
+        if entry is not None:
+            return entry
+        try:
+            cached_data = await self._async_client.get(key)
+            return self._l2_loaded(key, cached_data)
+        except Exception as e:
+            logger.error(f"Cache get error: {e}")
+            self._breaker.record_failure()
+            return None
+    
+    def _l1_get(self, key: str) -> Optional[dict]:
+        entry = self._l1.get(key)
+        self._stats["l1_hits" if entry is not None else "l1_misses"] += 1
+        return entry
+    
+    def _l2_loaded(self, key: str, cached_data: Optional[bytes]) -> Optional[dict]:
+        """Decode a Redis read and promote it to L1 until its hard expiry"""
+        try:
+            entry = self._decode_entry(cached_data) if cached_data else None
+        except ValueError as e:
+            # Written by a release with another payload version: recompute rather than misread
+            logger.warning(f"Ignoring cache entry {key}: {e}")
+            entry = None
+        if entry is None:
+            self._stats["l2_misses"] += 1
+            return None
+        self._stats["l2_hits"] += 1
+        self._l1.put(key, entry, entry["soft_expiry"] + self._stale_ttl - time.time())
+        return entry
+    
+    async def _acquire_lock(self, key: str) -> Optional[str]:
+        token = uuid.uuid4().hex
+        try:
+            acquired = await self._async_client.set(f"lock:{key}", token, nx=True, px=self.LOCK_TTL_MS)
+            return token if acquired else None
+        except Exception as e:
+            logger.error(f"Cache lock error: {e}")
+            self._breaker.record_failure()
+            return None
+    
+    async def _release_lock(self, key: str, token: str) -> None:
+        # Only delete our own lock: it may have expired and been taken by another worker
+        try:
+            await self._async_client.eval(self._RELEASE_LOCK_SCRIPT, 1, f"lock:{key}", token)
+        except Exception as e:
+            logger.error(f"Cache unlock error: {e}")
+            self._breaker.record_failure()
+    
+    def _make_entry(self, data: Any, ttl: int, delta: float = 0.0) -> dict:
+        """Wrap a value with its soft expiry (epoch seconds) and recompute time"""
+        return {"value": data, "soft_expiry": time.time() + ttl, "delta": delta}
+    
+    def _decode_entry(self, raw: bytes) -> dict:
+        entry = decode_payload(raw)
+        if not isinstance(entry, dict) or "soft_expiry" not in entry:
+            # Written before soft TTLs existed: treat as fresh until its hard TTL
+            return {"value": entry, "soft_expiry": math.inf, "delta": 0.0}
+        return entry
+    
+    def _should_refresh(self, entry: dict) -> bool:
+        """XFetch: refresh when now - delta * beta * ln(U) passes the soft expiry, U ~ (0, 1]"""
+        early = -entry["delta"] * self._early_beta * math.log(1.0 - random.random())
+        return time.time() + early >= entry["soft_expiry"]
+    
+    def _add_tags(self, pipe, key: str, tags: Optional[Iterable[str]], ttl: int) -> None:
+        """Register `key` in each tag set; tag sets outlive their newest entry by one TTL"""
+        for tag in tags or ():
+            tag_key = self._tag_key(tag)
+            pipe.sadd(tag_key, key)
+            pipe.expire(tag_key, ttl)
+    
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """
+        Delete every cached search registered under any of the given tags
+        
+        Each tag set is first renamed away atomically, so entries cached while
+        the purge runs register in a fresh set instead of being lost. Members
+        are read with SSCAN and removed with UNLINK in batches, so Redis is
+        never blocked the way KEYS or a large DEL would block it.
+        
+        Args:
+            tags: H3 cells touched by a service write
         
         Returns:
-            Cached results or None if not found/expired
+            Number of cache entries deleted
         """
-        if not self._redis_client:
+        if not self._breaker.allow():
+            # Tag sets live in Redis, so the affected L1 keys are unknown: drop them all
+            self._l1.clear()
+            return 0
+        
+        deleted = 0
+        try:
+            for tag in set(tags):
+                if not tag:
+                    continue
+                purge_key = f"{self._tag_key(tag)}:purge:{uuid.uuid4().hex}"
+                try:
+                    self._redis_client.rename(self._tag_key(tag), purge_key)
+                except redis.ResponseError:
+                    continue  # No entries cached under this tag
+                deleted += self._unlink_all(self._redis_client.sscan_iter(purge_key, count=self.SCAN_BATCH))
+                self._redis_client.unlink(purge_key)
+            if deleted:
+                logger.info(f"Invalidated {deleted} cached searches for cells: {sorted(set(tags))}")
+            return deleted
+        except Exception as e:
+            logger.error(f"Cache invalidation error: {e}")
+            self._breaker.record_failure()
+            return deleted
+    
+    def _unlink_all(self, keys: Iterable[str]) -> int:
+        deleted = 0
+        batch = []
+        for key in keys:
+            batch.append(key)
+            if len(batch) >= self.SCAN_BATCH:
+                deleted += self._unlink_batch(batch)
+                batch = []
+        if batch:
+            deleted += self._unlink_batch(batch)
+        return deleted
+    
+    def _unlink_batch(self, keys: list) -> int:
+        keys = [key.decode() if isinstance(key, bytes) else key for key in keys]
+        deleted = self._redis_client.unlink(*keys)
+        self._l1.discard(keys)
+        self._publish_invalidation({"keys": keys})
+        return deleted
+    
+    # ------------------------------------------------------------ L1 coherence
+    
+    def _publish_invalidation(self, message: dict) -> None:
+        try:
+            self._redis_client.publish(self.INVALIDATION_CHANNEL, json.dumps(message))
+        except Exception as e:
+            logger.error(f"Cache invalidation publish error: {e}")
+            self._breaker.record_failure()
+    
+    def _start_listener(self) -> None:
+        if self._listener and self._listener.is_alive():
+            return
+        self._listener = threading.Thread(target=self._listen, name="cache-invalidation", daemon=True)
+        self._listener.start()
+    
+    def _listen(self) -> None:
+        """Drop L1 entries invalidated by any process (including this one)"""
+        while not self._stop.is_set():
+            if not self._breaker.allow():
+                # The health probe re-enables Redis; resubscribe after that
+                self._stop.wait(self._probe_interval)
+                continue
+            pubsub = None
+            try:
+                pubsub = self._redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.INVALIDATION_CHANNEL)
+                # Messages published while we were not subscribed are lost, so start clean
+                self._l1.clear()
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        self._apply_invalidation(json.loads(message["data"]))
+            except Exception as e:
+                logger.warning(f"Cache invalidation listener error: {e}; resubscribing")
+                self._breaker.record_failure()
+                self._stop.wait(1.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+    
+    # ------------------------------------------------------------ health probe
+    
+    def _start_prober(self) -> None:
+        if self._prober and self._prober.is_alive():
+            return
+        self._prober = threading.Thread(target=self._probe, name="cache-health-probe", daemon=True)
+        self._prober.start()
+    
+    def _probe(self) -> None:
+        """While the breaker is open, PING Redis and close the breaker once it answers"""
+        while not self._stop.wait(self._probe_interval):
+            if self._breaker.allow():
+                continue
+            try:
+                self._redis_client.ping()
+            except Exception:
+                continue
+            # Invalidations may have been missed while Redis was unreachable
+            self._l1.clear()
+            self._breaker.close()
+            logger.info("Redis reachable again; caching re-enabled")
+    
+    def _apply_invalidation(self, message: dict) -> None:
+        self._stats["invalidations_received"] += 1
+        if "keys" in message:
+            self._l1.discard(message["keys"])
+        if "pattern" in message:
+            self._l1.discard_pattern(message["pattern"])
+    
+    def get_raw(self, key: str) -> Optional[str]:
+        """
+        Get a raw string value by key (used by auxiliary caches such as query embeddings)
+        """
+        if not self._breaker.allow():
             return None
         
         try:
-            key = self._generate_key(query, lat, lng, km)
-            cached_data = self._redis_client.get(key)
-            
-            if cached_data:
-                logger.info(f"Cache HIT for query: {query}")
-                return json.loads(cached_data)
-            
-            logger.info(f"Cache MISS for query: {query}")
+            value = self._redis_client.get(key)
+            return value.decode("utf-8") if value is not None else None
+        except Exception as e:
+            logger.error(f"Cache get error: {e}")
+            self._breaker.record_failure()
             return None
+    
+    def set_raw(self, key: str, value: str, ttl: int = 300) -> bool:
+        """
+        Store a raw string value under key with a TTL
+        """
+        if not self._breaker.allow():
+            return False
+        
+        try:
+            self._redis_client.setex(key, ttl, value)
+            return True
+        except Exception as e:
+            logger.error(f"Cache set error: {e}")
+            self._breaker.record_failure()
+            return False
+    
+    async def aget_raw(self, key: str) -> Optional[str]:
+        """
+        Async variant of get_raw()
+        """
+        if not self._breaker.allow():
+            return None
+        
+        try:
+            value = await self._async_client.get(key)
+            return value.decode("utf-8") if value is not None else None
         except Exception as e:
             logger.error(f"Cache get error: {e}")
+            self._breaker.record_failure()
             return None
     
-    def set(
-        self, 
-        query: str, 
-        lat: float, 
-        lng: float, 
-        km: int, 
-        data: Any, 
-        ttl: int = 300
-    ) -> bool:
+    async def aset_raw(self, key: str, value: str, ttl: int = 300) -> bool:
         """
-        Cache search results
+        Async variant of set_raw()
         """
-        if not self._redis_client:
+        if not self._breaker.allow():
             return False
         
         try:
-            key = self._generate_key(query, lat, lng, km)
-            serialized = json.dumps(data, default=str)
-            self._redis_client.setex(key, ttl, serialized)
-            logger.info(f"Cached {len(data)} results for query: {query} (TTL: {ttl}s)")
+            await self._async_client.setex(key, ttl, value)
             return True
         except Exception as e:
             logger.error(f"Cache set error: {e}")
+            self._breaker.record_failure()
             return False
     
     def clear_pattern(self, pattern: str) -> int:
         """
         Clear cache entries matching pattern
         
+        Iterates with SCAN and frees memory with UNLINK, so it is safe to run
+        against a live Redis (KEYS would block every other client).
+        
         Args:
             pattern: Redis key pattern (e.g., "search:*")
         
         Returns:
             Number of keys deleted
         """
-        if not self._redis_client:
+        if not self._breaker.allow():
             return 0
         
         try:
-            keys = self._redis_client.keys(pattern)
-            if keys:
-                deleted = self._redis_client.delete(*keys)
+            deleted = self._unlink_all(self._redis_client.scan_iter(match=pattern, count=self.SCAN_BATCH))
+            self._l1.discard_pattern(pattern)
+            self._publish_invalidation({"pattern": pattern})
+            if deleted:
                 logger.info(f"Cleared {deleted} cache entries matching: {pattern}")
-                return deleted
-            return 0
+            return deleted
         except Exception as e:
             logger.error(f"Cache clear error: {e}")
+            self._breaker.record_failure()
             return 0
     
+    def _ratio(self, hits: str, misses: str) -> Optional[float]:
+        total = self._stats[hits] + self._stats[misses]
+        return round(self._stats[hits] / total, 4) if total else None
+    
     def get_stats(self) -> dict:
         """Get cache statistics"""
-        if not self._redis_client:
-            return {"status": "disabled"}
+        if not self._breaker.allow():
+            return {"status": "unavailable", "breaker": self._breaker.get_stats()}
         
         try:
             info = self._redis_client.info()
@@ -147,9 +685,15 @@ class CacheManager:
                 "total_keys": self._redis_client.dbsize(),
                 "hits": info.get('keyspace_hits', 0),
                 "misses": info.get('keyspace_misses', 0),
+                "l1_size": len(self._l1),
+                "l1_hit_ratio": self._ratio("l1_hits", "l1_misses"),
+                "l2_hit_ratio": self._ratio("l2_hits", "l2_misses"),
+                "breaker": self._breaker.get_stats(),
+                **self._stats,
             }
         except Exception as e:
-            return {"status": "error", "error": str(e)}
+            self._breaker.record_failure()
+            return {"status": "error", "error": str(e), "breaker": self._breaker.get_stats()}
 
 
 # Global instance
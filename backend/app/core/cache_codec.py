@@ -0,0 +1,92 @@
+"""
+Cache Payload Codec
+Compact, versioned binary encoding for cached search results
+"""
+import json
+import os
+import zlib
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - falls back to the stdlib encoder
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zlib is always available
+    zstandard = None
+
+# Leading version byte of every payload; bump it when the layout changes so
+# workers on the old release treat new entries as misses instead of misreading them
+PAYLOAD_VERSION = 0x01
+
+# Second byte: how the body is compressed
+COMPRESSION_NONE = 0x00
+COMPRESSION_ZLIB = 0x01
+COMPRESSION_ZSTD = 0x02
+
+# Bodies smaller than this are stored uncompressed (compression would not pay off)
+COMPRESS_THRESHOLD = int(os.getenv("CACHE_COMPRESS_THRESHOLD", 1024))
+
+_zstd_compressor = zstandard.ZstdCompressor(level=3) if zstandard else None
+_zstd_decompressor = zstandard.ZstdDecompressor() if zstandard else None
+
+
+def _dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, default=str, separators=(",", ":")).encode("utf-8")
+
+
+def _loads(body: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def encode_payload(value: Any) -> bytes:
+    """
+    Serialize a cache value
+
+    Layout: version byte, compression byte, then the JSON body (orjson when
+    installed), compressed with zstd (or zlib) once it exceeds COMPRESS_THRESHOLD.
+    Datetimes are written as ISO 8601 strings.
+    """
+    body = _dumps(value)
+    compression = COMPRESSION_NONE
+    if len(body) >= COMPRESS_THRESHOLD:
+        if _zstd_compressor is not None:
+            body, compression = _zstd_compressor.compress(body), COMPRESSION_ZSTD
+        else:
+            body, compression = zlib.compress(body, 6), COMPRESSION_ZLIB
+    return bytes((PAYLOAD_VERSION, compression)) + body
+
+
+def decode_payload(raw: bytes) -> Any:
+    """
+    Deserialize a cache value written by encode_payload
+
+    Plain JSON text written before the binary format is still accepted.
+
+    Raises:
+        ValueError: Unknown version or compression (e.g. written by a newer release)
+    """
+    if isinstance(raw, str):
+        raw = raw.encode("utf-8")
+    if raw[:1] in (b"{", b"["):
+        # Compatibility shim: JSON text from before the versioned format
+        return _loads(raw)
+    if len(raw) < 2 or raw[0] != PAYLOAD_VERSION:
+        raise ValueError(f"Unsupported cache payload version: {raw[:1]!r}")
+
+    compression, body = raw[1], raw[2:]
+    if compression == COMPRESSION_ZLIB:
+        body = zlib.decompress(body)
+    elif compression == COMPRESSION_ZSTD:
+        if _zstd_decompressor is None:
+            raise ValueError("Cache payload is zstd-compressed but zstandard is not installed")
+        body = _zstd_decompressor.decompress(body)
+    elif compression != COMPRESSION_NONE:
+        raise ValueError(f"Unsupported cache payload compression: {compression}")
+    return _loads(body)
@@ -0,0 +1,75 @@
+"""
+Exponentially Decayed Sums
+O(1) time-decayed aggregates stored against a reference epoch
+
+A value v added at time t contributes v * exp(-lambda * (now - t)) at time
+`now`. Factoring out the epoch t0:
+
+    sum(now) = exp(-lambda * (now - t0)) * sum_i v_i * exp(lambda * (t_i - t0))
+
+so only the rebased sum (the right-hand sum) is stored. Adding a value costs
+one exp(), reading costs one exp(), and neither depends on how many values
+were added. The rebased terms grow with t_i - t0, so the epoch is moved
+forward (rescaling the stored sum once) before they lose precision.
+"""
+import math
+from datetime import datetime
+from typing import Optional, Tuple
+
+SECONDS_PER_DAY = 86400.0
+
+# Rebase once a new term would be scaled by more than exp(MAX_EXPONENT) (~1e13),
+# well inside float64 range and precision
+MAX_EXPONENT = 30.0
+
+
+def _days(delta) -> float:
+    return delta.total_seconds() / SECONDS_PER_DAY
+
+
+def rebased_add(
+    totals: Tuple[float, ...],
+    epoch: Optional[datetime],
+    values: Tuple[float, ...],
+    at: datetime,
+    decay_per_day: float
+) -> Tuple[Tuple[float, ...], datetime]:
+    """
+    Add values observed at `at` to rebased sums sharing one epoch
+
+    Sums kept side by side (a weighted sum and its weight total) must be
+    rebased together, so they are updated as a tuple.
+
+    Args:
+        totals: Stored rebased sums (zeros when empty)
+        epoch: Their reference time (None when empty)
+        values: One value per sum (e.g. (rating, 1.0))
+        at: When the values were observed (UTC)
+        decay_per_day: Decay rate lambda
+
+    Returns:
+        (new rebased sums, new epoch)
+    """
+    if epoch is None:
+        return tuple(values), at
+
+    exponent = decay_per_day * _days(at - epoch)
+    if exponent > MAX_EXPONENT:
+        # Move the epoch to `at`: existing terms shrink by exp(-exponent), the new ones enter at 1
+        shrink = math.exp(-exponent)
+        return tuple(total * shrink + value for total, value in zip(totals, values)), at
+
+    scale = math.exp(exponent)
+    return tuple(total + value * scale for total, value in zip(totals, values)), epoch
+
+
+def decayed_value(total: float, epoch: Optional[datetime], now: datetime, decay_per_day: float) -> float:
+    """
+    The decayed sum as of `now`
+
+    Ratios of sums sharing an epoch (e.g. weighted sum / weight total) need no
+    rescaling: the factor cancels.
+    """
+    if epoch is None:
+        return 0.0
+    return total * math.exp(-decay_per_day * _days(now - epoch))
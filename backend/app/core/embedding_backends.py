@@ -0,0 +1,156 @@
+"""
+Embedding Backends
+Interchangeable text-to-vector models behind one interface, selected with EMBEDDING_BACKEND
+"""
+import logging
+import os
+import re
+import zlib
+from typing import List, Optional
+
+import google.generativeai as genai
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBackend:
+    """
+    Base class for embedding models
+
+    `model_id` is stored next to every embedding, so vectors produced by
+    different models (or different settings of the same model) are never
+    compared with each other.
+    """
+    name = "base"
+    provider = ""
+    model_id = ""
+    dimension = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed indexable texts (service title + description); raises on failure"""
+        raise NotImplementedError
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a search query; raises on failure"""
+        raise NotImplementedError
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Async variant of embed_query(); local backends just compute inline"""
+        return self.embed_query(text)
+
+
+class GeminiBackend(EmbeddingBackend):
+    """Google Gemini text-embedding-004 (remote API)"""
+    name = "Gemini text-embedding-004"
+    provider = "Google Cloud"
+    model_id = "models/text-embedding-004"
+    dimension = 768
+
+    def __init__(self, api_key: str):
+        genai.configure(api_key=api_key)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        # Use task_type="retrieval_document" for storing indexable content
+        result = genai.embed_content(
+            model=self.model_id,
+            content=texts,
+            task_type="retrieval_document",
+            title="Service Listing"
+        )
+        return result['embedding']
+
+    def embed_query(self, text: str) -> List[float]:
+        # Use task_type="retrieval_query" for search queries
+        result = genai.embed_content(
+            model=self.model_id,
+            content=text,
+            task_type="retrieval_query"
+        )
+        return result['embedding']
+
+    async def aembed_query(self, text: str) -> List[float]:
+        result = await genai.embed_content_async(
+            model=self.model_id,
+            content=text,
+            task_type="retrieval_query"
+        )
+        return result['embedding']
+
+
+class HashingBackend(EmbeddingBackend):
+    """
+    Local CPU embeddings via the hashing trick
+
+    Words, word bigrams and character trigrams are hashed into a fixed number
+    of signed buckets with log-scaled counts. There is no vocabulary or
+    training step, so the vectors are stable across processes and restarts,
+    need no network access, and cost microseconds per text. Character
+    trigrams make partial words match ("plumb" ~ "plumbing").
+    """
+    name = "Local hashing vectorizer"
+    provider = "Local (CPU)"
+
+    _TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+    def __init__(self, dimension: int = 768):
+        self.dimension = dimension
+        self.model_id = f"local/hashing-v1-{dimension}"
+
+    def _features(self, text: str) -> List[str]:
+        words = self._TOKEN_RE.findall((text or "").lower())
+        features = [f"w:{word}" for word in words]
+        features += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f"<{word}>"
+            features += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+        return features
+
+    def _embed(self, text: str) -> List[float]:
+        counts = {}
+        for feature in self._features(text):
+            # crc32 is stable across processes (unlike hash()), so stored vectors stay comparable
+            h = zlib.crc32(feature.encode("utf-8"))
+            bucket = h % self.dimension
+            sign = 1.0 if h & 0x80000000 else -1.0
+            counts[bucket] = counts.get(bucket, 0.0) + sign
+
+        vec = np.zeros(self.dimension, dtype=np.float32)
+        for bucket, count in counts.items():
+            vec[bucket] = np.sign(count) * (1.0 + np.log(abs(count))) if count else 0.0
+        norm = float(np.linalg.norm(vec))
+        if norm:
+            vec /= norm
+        return vec.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def create_backend() -> Optional[EmbeddingBackend]:
+    """
+    Build the backend named by EMBEDDING_BACKEND ("gemini" or "hashing")
+
+    Returns:
+        The backend, or None when semantic search is unavailable (Gemini without an API key)
+    """
+    choice = os.getenv("EMBEDDING_BACKEND", "gemini").lower()
+    if choice == "hashing":
+        return HashingBackend(int(os.getenv("HASHING_EMBEDDING_DIM", 768)))
+    if choice != "gemini":
+        logger.warning(f"Unknown EMBEDDING_BACKEND '{choice}', using gemini")
+
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        logger.warning("GEMINI_API_KEY not found in environment. Semantic search will be disabled.")
+        return None
+    return GeminiBackend(api_key)
+
+
+# Global instance (None when semantic search is disabled)
+embedding_backend = create_backend()
@@ -0,0 +1,107 @@
+"""
+Embedding Codec
+Packs embedding vectors into compact binary blobs and decodes them without copying
+"""
+import json
+import os
+import struct
+from typing import Optional
+
+import numpy as np
+
+# Leading format byte of every packed blob
+FORMAT_FLOAT32 = 0x01
+FORMAT_FLOAT16 = 0x02
+FORMAT_INT8 = 0x03
+
+_FORMATS = {
+    "float32": FORMAT_FLOAT32,
+    "float16": FORMAT_FLOAT16,
+    "int8": FORMAT_INT8,
+}
+
+# Storage format for newly written embeddings (float32 is lossless vs. the API output)
+STORAGE_FORMAT = os.getenv("EMBEDDING_STORAGE_FORMAT", "float32")
+
+
+def encode_embedding(vector, fmt: str = None) -> Optional[bytes]:
+    """
+    Pack an embedding into bytes
+    
+    Layout: 1 format byte, then
+    - float32: 4 bytes per dimension (~3 KB for 768 dims)
+    - float16: 2 bytes per dimension
+    - int8:    a float32 scale followed by 1 byte per dimension (symmetric quantization)
+    
+    Args:
+        vector: Sequence of floats or numpy array
+        fmt: "float32", "float16" or "int8" (default: EMBEDDING_STORAGE_FORMAT)
+    
+    Returns:
+        Packed bytes, or None for a missing vector
+    """
+    if vector is None:
+        return None
+    fmt = fmt or STORAGE_FORMAT
+    if fmt not in _FORMATS:
+        raise ValueError(f"Unknown embedding format: {fmt}")
+    arr = np.asarray(vector, dtype=np.float32).reshape(-1)
+    
+    if fmt == "float32":
+        return bytes([FORMAT_FLOAT32]) + arr.astype("<f4", copy=False).tobytes()
+    if fmt == "float16":
+        return bytes([FORMAT_FLOAT16]) + arr.astype("<f2").tobytes()
+    
+    peak = float(np.max(np.abs(arr))) if arr.size else 0.0
+    scale = peak / 127.0 if peak > 0 else 1.0
+    quantized = np.clip(np.rint(arr / scale), -127, 127).astype(np.int8)
+    return bytes([FORMAT_INT8]) + struct.pack("<f", scale) + quantized.tobytes()
+
+
+def decode_embedding(raw) -> Optional[np.ndarray]:
+    """
+    Unpack a stored embedding into a float32 array
+    
+    float32 blobs are viewed in place with np.frombuffer (zero-copy, read-only).
+    Rows that still hold the legacy JSON list (as text, bytes or an already
+    parsed list) are decoded too, so reads work before the repack has run.
+    
+    Returns:
+        1-D float32 array, or None for a missing/empty value
+    """
+    if raw is None:
+        return None
+    if isinstance(raw, np.ndarray):
+        return raw.astype(np.float32, copy=False)
+    if isinstance(raw, (list, tuple)):
+        return np.asarray(raw, dtype=np.float32)
+    if isinstance(raw, str):
+        return _decode_json(raw)
+    
+    raw = bytes(raw) if isinstance(raw, memoryview) else raw
+    if not raw:
+        return None
+    
+    fmt = raw[0]
+    if fmt == FORMAT_FLOAT32:
+        return np.frombuffer(raw, dtype="<f4", offset=1)
+    if fmt == FORMAT_FLOAT16:
+        return np.frombuffer(raw, dtype="<f2", offset=1).astype(np.float32)
+    if fmt == FORMAT_INT8:
+        (scale,) = struct.unpack_from("<f", raw, 1)
+        return np.frombuffer(raw, dtype=np.int8, offset=5).astype(np.float32) * np.float32(scale)
+    
+    # Compatibility shim: JSON text left behind by the JSON -> BLOB column change
+    return _decode_json(raw.decode("utf-8"))
+
+
+def is_packed(raw) -> bool:
+    """True if a stored value is already in the packed binary layout"""
+    return isinstance(raw, (bytes, bytearray, memoryview)) and len(raw) > 0 and raw[0] in _FORMATS.values()
+
+
+def _decode_json(text: str) -> Optional[np.ndarray]:
+    value = json.loads(text)
+    if value is None:
+        return None
+    return np.asarray(value, dtype=np.float32)
@@ -0,0 +1,194 @@
+"""
+Background Embedding Worker
+Drains the embedding_jobs table off the request path and indexes the results
+"""
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+from app.db.database import SessionLocal
+from app.models.embedding_job import EmbeddingJob
+from app.models.service import Service
+from app.core.search_engine import search_engine
+from app.core.vector_index import vector_index
+from app.core.ann_index import ann_index
+from app.core.cache import cache_manager
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingWorker:
+    """
+    In-process worker thread for queued embedding jobs
+
+    Jobs live in the database, so nothing is lost on restart and several
+    workers (one per process) can share the queue: each claims a batch with
+    SELECT ... FOR UPDATE SKIP LOCKED. Writers call notify() after committing
+    a job so this process picks it up immediately instead of at the next poll.
+    """
+    _instance = None
+
+    BATCH_SIZE = 32
+    POLL_INTERVAL_SECONDS = 5.0
+    MAX_ATTEMPTS = 5
+    # A job stuck in "processing" this long belonged to a crashed worker and is reclaimed
+    LEASE_SECONDS = 300
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        # Only initialize once
+        if not hasattr(self, '_initialized'):
+            self._wake = threading.Event()
+            self._stop = threading.Event()
+            self._thread = None
+            self._stats = {"embedded": 0, "failed": 0, "retried": 0}
+            self._initialized = True
+
+    def start(self):
+        """Start the worker thread (no-op if disabled or already running)"""
+        if os.getenv("EMBEDDING_WORKER_ENABLED", "true").lower() != "true":
+            logger.info("Embedding worker disabled by EMBEDDING_WORKER_ENABLED")
+            return
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="embedding-worker", daemon=True)
+        self._thread.start()
+        logger.info("Embedding worker started")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def notify(self):
+        """Wake the worker after a job was committed"""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            processed = 0
+            try:
+                if search_engine._enabled:
+                    processed = self.process_batch()
+            except Exception as e:
+                logger.error(f"Embedding worker error: {e}")
+            # Keep draining while there is work; otherwise sleep until notified or the next poll
+            if not processed:
+                self._wake.wait(self.POLL_INTERVAL_SECONDS)
+                self._wake.clear()
+
+    def process_batch(self) -> int:
+        """
+        Claim and process up to BATCH_SIZE due jobs
+
+        Returns:
+            Number of jobs claimed
+        """
+        db = SessionLocal()
+        try:
+            claimed = self._claim(db)
+            if not claimed:
+                return 0
+
+            service_ids = [service_id for service_id, _ in claimed]
+            services = {
+                svc.id: svc for svc in db.query(Service).filter(Service.id.in_(service_ids)).all()
+            }
+            live = [(service_id, version) for service_id, version in claimed if service_id in services]
+            texts = [f"{services[sid].title} {services[sid].description or ''}" for sid, _ in live]
+
+            try:
+                vectors = search_engine.embed_documents(texts)
+            except Exception as e:
+                self._fail(db, live, str(e))
+                return len(claimed)
+
+            # (service_id, vector, status, h3_res5) of the results committed below,
+            # captured before commit() expires the ORM objects
+            indexed = []
+            for (service_id, version), vector in zip(live, vectors):
+                # Only finish the job if nobody re-enqueued it while we were embedding;
+                # otherwise the vector is for outdated text and the newer job will replace it
+                done = db.query(EmbeddingJob).filter(
+                    EmbeddingJob.service_id == service_id,
+                    EmbeddingJob.version == version
+                ).delete(synchronize_session=False)
+                if not done:
+                    continue
+                svc = services[service_id]
+                svc.embedding = vector
+                svc.embedding_model = search_engine.model_id
+                svc.embedding_status = "ready"
+                indexed.append((service_id, vector, svc.status, svc.h3_res5))
+            db.commit()
+
+            for service_id, vector, status, _ in indexed:
+                vector_index.upsert(service_id, vector)
+                if status == "active":
+                    ann_index.add(service_id)
+            # New vectors change rankings, so cached searches around these services are stale
+            cache_manager.invalidate_tags([cell for _, _, _, cell in indexed if cell])
+            self._stats["embedded"] += len(indexed)
+            logger.info(f"Embedded {len(indexed)} queued services")
+            return len(claimed)
+        finally:
+            db.close()
+
+    def _claim(self, db) -> list[tuple[int, int]]:
+        now = datetime.utcnow()
+        lease_expired = now - timedelta(seconds=self.LEASE_SECONDS)
+        jobs = db.query(EmbeddingJob).filter(
+            ((EmbeddingJob.status == "pending") & (EmbeddingJob.available_at <= now)) |
+            ((EmbeddingJob.status == "processing") & (EmbeddingJob.available_at <= lease_expired))
+        ).order_by(EmbeddingJob.available_at).limit(self.BATCH_SIZE).with_for_update(skip_locked=True).all()
+
+        claimed = []
+        for job in jobs:
+            job.status = "processing"
+            job.available_at = now
+            job.attempts += 1
+            claimed.append((job.service_id, job.version))
+        db.commit()
+        return claimed
+
+    def _fail(self, db, claimed: list[tuple[int, int]], error: str):
+        """Back off and retry, or give up after MAX_ATTEMPTS"""
+        logger.error(f"Embedding batch of {len(claimed)} failed: {error}")
+        now = datetime.utcnow()
+        for service_id, version in claimed:
+            job = db.query(EmbeddingJob).filter(
+                EmbeddingJob.service_id == service_id,
+                EmbeddingJob.version == version
+            ).first()
+            if job is None:
+                continue
+            job.last_error = error[:1000]
+            if job.attempts >= self.MAX_ATTEMPTS:
+                job.status = "failed"
+                db.query(Service).filter(Service.id == service_id).update(
+                    {"embedding_status": "failed"}, synchronize_session=False
+                )
+                self._stats["failed"] += 1
+            else:
+                job.status = "pending"
+                job.available_at = now + timedelta(seconds=min(600, 10 * 2 ** job.attempts))
+                self._stats["retried"] += 1
+        db.commit()
+
+    def get_stats(self) -> dict:
+        """Get worker statistics"""
+        return {
+            "running": bool(self._thread and self._thread.is_alive()),
+            **self._stats,
+        }
+
+
+# Global instance
+embedding_worker = EmbeddingWorker()
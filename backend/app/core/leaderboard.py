@@ -0,0 +1,348 @@
+"""
+Provider Leaderboards
+Top providers per category and per H3 region, kept in Redis sorted sets
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core.cache import cache_manager
+from app.core.location_engine import CACHE_TAG_RESOLUTION, get_h3_indexes
+
+logger = logging.getLogger(__name__)
+
+# Regions are the res-5 cells already stored on every service (h3_res5, ~250 km²)
+REGION_RESOLUTION = CACHE_TAG_RESOLUTION
+
+
+def board_key(category: Optional[str] = None, region: Optional[str] = None) -> str:
+    """
+    Name of the leaderboard for a category, a region, or both
+
+    Format: leaderboard:category:{category} | leaderboard:region:{cell}[:category:{category}]
+    """
+    parts = ["leaderboard"]
+    if region:
+        parts += ["region", region]
+    if category:
+        parts += ["category", normalize_category(category)]
+    return ":".join(parts)
+
+
+def normalize_category(category: str) -> str:
+    """Categories match case-insensitively, as in the /services category filter"""
+    return " ".join(category.lower().split())
+
+
+def boards_for(memberships: Iterable[Tuple[Optional[str], Optional[str]]]) -> Set[str]:
+    """
+    Every board a provider belongs to, given the (category, region) of each of their active services
+    """
+    boards = set()
+    for category, region in memberships:
+        if category:
+            boards.add(board_key(category=category))
+        if region:
+            boards.add(board_key(region=region))
+        if category and region:
+            boards.add(board_key(category=category, region=region))
+    return boards
+
+
+class MemoryBoards:
+    """
+    In-process equivalent of the Redis sorted sets
+
+    Each board is a list of (-score, provider_id) kept sorted with bisect, so a
+    page is one slice and an update is a binary search plus one list shift.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._boards: Dict[str, List[Tuple[float, int]]] = {}
+        self._scores: Dict[Tuple[str, int], float] = {}
+        self._members: Dict[int, Set[str]] = {}
+
+    def _remove_locked(self, board: str, provider_id: int) -> None:
+        score = self._scores.pop((board, provider_id), None)
+        if score is None:
+            return
+        entries = self._boards[board]
+        i = bisect.bisect_left(entries, (-score, provider_id))
+        if i < len(entries) and entries[i] == (-score, provider_id):
+            entries.pop(i)
+        if not entries:
+            del self._boards[board]
+
+    def set_provider(self, provider_id: int, score: float, boards: Set[str]) -> None:
+        """Place a provider on exactly `boards` with `score` (empty set removes them)"""
+        with self._lock:
+            for board in self._members.pop(provider_id, set()):
+                self._remove_locked(board, provider_id)
+            for board in boards:
+                bisect.insort(self._boards.setdefault(board, []), (-score, provider_id))
+                self._scores[(board, provider_id)] = score
+            if boards:
+                self._members[provider_id] = set(boards)
+
+    def page(self, board: str, offset: int, limit: int) -> Tuple[List[Tuple[int, float]], int]:
+        """([(provider_id, score)] best first, board size)"""
+        with self._lock:
+            entries = self._boards.get(board, [])
+            return [(provider_id, -neg_score) for neg_score, provider_id in entries[offset:offset + limit]], len(entries)
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._boards.clear()
+            self._scores.clear()
+            self._members.clear()
+
+
+class Leaderboard:
+    """
+    Per-category and per-region provider rankings by reputation score
+
+    Boards live in Redis sorted sets (score = overall reputation score), so a
+    page costs O(log n + page size) and every worker sees the same boards. A
+    provider's board memberships are kept in a per-provider set, which lets an
+    update move them off boards they left (category or location change).
+
+    While Redis is unavailable (circuit breaker open, or LEADERBOARD_BACKEND=memory)
+    the boards are served from an in-process MemoryBoards copy, rebuilt from the
+    database at most every LEADERBOARD_MEMORY_TTL seconds and updated in place
+    by this worker's writes.
+    """
+    _instance = None
+
+    BUILT_KEY = "leaderboard:built"
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        # Only initialize once
+        if not hasattr(self, '_initialized'):
+            self._use_redis = os.getenv("LEADERBOARD_BACKEND", "redis").lower() != "memory"
+            self._memory = MemoryBoards()
+            self._memory_ttl = float(os.getenv("LEADERBOARD_MEMORY_TTL", 60))
+            self._memory_built_at: Optional[float] = None
+            self._build_lock = threading.Lock()
+            self._initialized = True
+
+    def _member_key(self, provider_id: int) -> str:
+        return f"leaderboard:member:{provider_id}"
+
+    def _redis_available(self) -> bool:
+        return self._use_redis and cache_manager._breaker.allow()
+
+    # ------------------------------------------------------------------ reads
+
+    def _query_memberships(self, db, provider_id: Optional[int] = None):
+        """(provider_id, overall_score, category, h3_res5) for ranked providers' active services"""
+        from app.models.provider_reputation import ProviderReputation
+        from app.models.service import Service
+
+        query = db.query(
+            ProviderReputation.provider_id, ProviderReputation.overall_score, Service.category, Service.h3_res5
+        ).join(
+            Service, Service.provider_id == ProviderReputation.provider_id
+        ).filter(
+            Service.status == "active",
+            ProviderReputation.total_bookings > 0
+        )
+        if provider_id is not None:
+            query = query.filter(ProviderReputation.provider_id == provider_id)
+        return query.distinct().all()
+
+    def _group(self, rows) -> Dict[int, Tuple[float, Set[str]]]:
+        providers: Dict[int, Tuple[float, list]] = {}
+        for provider_id, score, category, region in rows:
+            providers.setdefault(provider_id, (score, []))[1].append((category, region))
+        return {provider_id: (score, boards_for(memberships)) for provider_id, (score, memberships) in providers.items()}
+
+    # ---------------------------------------------------------------- updates
+
+    def update_provider(self, db, provider_id: int) -> None:
+        """
+        Re-rank a provider after their reputation or services changed
+
+        Never raises: a failed update only leaves the boards briefly stale.
+        """
+        try:
+            grouped = self._group(self._query_memberships(db, provider_id))
+        except Exception as e:
+            logger.error(f"Leaderboard update failed for provider {provider_id}: {e}")
+            return
+
+        score, boards = grouped.get(provider_id, (0.0, set()))
+        self._memory.set_provider(provider_id, score, boards)
+        if self._redis_available():
+            try:
+                self._redis_set_provider(provider_id, score, boards)
+            except Exception as e:
+                logger.error(f"Leaderboard update in Redis failed for provider {provider_id}: {e}")
+                cache_manager._breaker.record_failure()
+
+    def _redis_set_provider(self, provider_id: int, score: float, boards: Set[str]) -> None:
+        member_key = self._member_key(provider_id)
+
+        def apply(pipe):
+            # WATCHed: a concurrent update of this provider makes EXEC fail and the read retry,
+            # so the boards removed are always the ones the provider is actually on
+            previous = {key.decode() if isinstance(key, bytes) else key for key in pipe.smembers(member_key)}
+            pipe.multi()
+            for board in previous - boards:
+                pipe.zrem(board, provider_id)
+            for board in boards:
+                pipe.zadd(board, {provider_id: score})
+            pipe.delete(member_key)
+            if boards:
+                pipe.sadd(member_key, *boards)
+
+        cache_manager._redis_client.transaction(apply, member_key)
+
+    def rebuild(self, db) -> int:
+        """
+        Rebuild every board from the database
+
+        Returns:
+            Number of ranked providers
+        """
+        grouped = self._group(self._query_memberships(db))
+        self._fill_memory(grouped)
+
+        if self._redis_available():
+            try:
+                self._redis_rebuild(grouped)
+            except Exception as e:
+                logger.error(f"Leaderboard rebuild in Redis failed: {e}")
+                cache_manager._breaker.record_failure()
+
+        logger.info(f"Leaderboards rebuilt for {len(grouped)} providers")
+        return len(grouped)
+
+    def _redis_rebuild(self, grouped: Dict[int, Tuple[float, Set[str]]]) -> None:
+        """
+        Write the new boards under temporary names, then swap them in with one MULTI
+
+        Readers see the old boards until EXEC and the new ones right after, never
+        an empty or half-built board. Keys of boards that no longer exist are
+        dropped in the same transaction.
+        """
+        client = cache_manager._redis_client
+        prefix = f"leaderboard-build:{uuid.uuid4().hex}:"
+        existing = {key.decode() if isinstance(key, bytes) else key for key in client.scan_iter(match="leaderboard:*", count=500)}
+
+        built = set()
+        try:
+            with client.pipeline(transaction=False) as pipe:
+                for provider_id, (score, boards) in grouped.items():
+                    for board in boards:
+                        pipe.zadd(prefix + board, {provider_id: score})
+                        built.add(board)
+                    if boards:
+                        pipe.sadd(prefix + self._member_key(provider_id), *boards)
+                        built.add(self._member_key(provider_id))
+                pipe.execute()
+
+            with client.pipeline(transaction=True) as pipe:
+                for key in built:
+                    pipe.rename(prefix + key, key)
+                stale = sorted(existing - built - {self.BUILT_KEY})
+                for i in range(0, len(stale), 500):
+                    pipe.unlink(*stale[i:i + 500])
+                pipe.set(self.BUILT_KEY, 1)
+                pipe.execute()
+        except Exception:
+            # Do not leave the temporary keys behind
+            leftovers = list(client.scan_iter(match=prefix + "*", count=500))
+            for i in range(0, len(leftovers), 500):
+                client.unlink(*leftovers[i:i + 500])
+            raise
+
+    def _ensure_memory(self, db) -> None:
+        now = time.monotonic()
+        if self._memory_built_at is not None and now - self._memory_built_at < self._memory_ttl:
+            return
+        with self._build_lock:
+            if self._memory_built_at is None or now - self._memory_built_at >= self._memory_ttl:
+                self.rebuild_memory(db)
+
+    def rebuild_memory(self, db) -> None:
+        """Refresh only the in-process boards (Redis unavailable)"""
+        self._fill_memory(self._group(self._query_memberships(db)))
+
+    def _fill_memory(self, grouped: Dict[int, Tuple[float, Set[str]]]) -> None:
+        self._memory.clear()
+        for provider_id, (score, boards) in grouped.items():
+            self._memory.set_provider(provider_id, score, boards)
+        self._memory_built_at = time.monotonic()
+
+    # ------------------------------------------------------------------ query
+
+    def top(
+        self,
+        db,
+        category: Optional[str] = None,
+        lat: Optional[float] = None,
+        lng: Optional[float] = None,
+        offset: int = 0,
+        limit: int = 10
+    ) -> Tuple[List[Tuple[int, float]], int]:
+        """
+        One page of a category and/or regional board
+
+        A region is exactly the res-5 cell of (lat, lng), not a radius
+        around it: a provider just across the cell edge is on the neighbouring
+        board and not listed here, however close.
+
+        Args:
+            category: Category name (case-insensitive)
+            lat, lng: A point in the region (its res-5 H3 cell)
+
+        Returns:
+            ([(provider_id, score)] best first, total providers on the board)
+        """
+        # The parent of the point's finest cell, as stored in h3_res5: H3 parents do not
+        # always contain their children's points, so latlng_to_cell at res 5 can differ
+        region = get_h3_indexes(lat, lng)[REGION_RESOLUTION] if lat is not None and lng is not None else None
+        board = board_key(category=category, region=region)
+
+        if self._redis_available():
+            try:
+                client = cache_manager._redis_client
+                if not client.exists(self.BUILT_KEY):
+                    with self._build_lock:
+                        if not client.exists(self.BUILT_KEY):
+                            self.rebuild(db)
+                with client.pipeline(transaction=False) as pipe:
+                    pipe.zrevrange(board, offset, offset + limit - 1, withscores=True)
+                    pipe.zcard(board)
+                    entries, total = pipe.execute()
+                return [(int(member), float(score)) for member, score in entries], total
+            except Exception as e:
+                logger.error(f"Leaderboard read from Redis failed, using in-memory boards: {e}")
+                cache_manager._breaker.record_failure()
+
+        self._ensure_memory(db)
+        return self._memory.page(board, offset, limit)
+
+    def get_stats(self) -> dict:
+        """Get leaderboard statistics"""
+        return {
+            "backend": "redis" if self._redis_available() else "memory",
+            "memory_providers": len(self._memory),
+        }
+
+
+# Global instance
+leaderboard = Leaderboard()
@@ -2,7 +2,40 @@
 H3 Geospatial Location Engine
 Converts lat/lng to H3 hexagonal indexes for fast radius-based searches
 """
+import math
+
 import h3
+import numpy as np
+
+# Radius multiplier that absorbs cell-size variation across a disk
+RING_SLACK = 1.05
+
+# H3 index bit layout (see https://h3geo.org/docs/core-library/h3Indexing)
+_MAX_RES = 15
+_RES_OFFSET = 52
+_RES_MASK = 0xF
+_DIGIT_BITS = 3
+_DIGIT_MASK = 0x7
+
+# Resolutions stored per service (finest first): res 9 is `h3_index`, the
+# coarser parents back wide-radius searches
+SEARCH_RESOLUTIONS = (9, 7, 5)
+
+# Largest raw disk worth generating, and the SQL term budget per search
+MAX_DISK_CELLS = 5000
+MAX_CELL_TERMS = 150
+
+# Search-result cache areas: (radius bucket km, snap resolution). Requests are
+# rounded up to a bucket and their origin snapped to a cell that is small next
+# to the bucket, so nearby users asking for similar radii share one entry
+CACHE_RADIUS_BUCKETS = ((1, 9), (2, 8), (5, 8), (10, 7), (20, 7), (50, 6))
+
+# Cached searches are tagged with the cells they cover at this resolution
+# (stored per service as `h3_res5`), so a write only purges nearby entries
+CACHE_TAG_RESOLUTION = 5
+
+# Mean Earth radius used by H3's great-circle distance
+EARTH_RADIUS_KM = 6371.007180918475
 
 
 def get_h3_index(lat: float, lng: float, resolution: int = 9) -> str:
@@ -22,7 +55,48 @@ def get_h3_index(lat: float, lng: float, resolution: int = 9) -> str:
     return h3.latlng_to_cell(lat, lng, resolution)
 
 
-def get_nearby_h3_cells(lat: float, lng: float, km: int, resolution: int = 9) -> list[str]:
+def get_h3_indexes(lat: float, lng: float) -> dict[int, str]:
+    """
+    H3 cell of a point at every stored search resolution
+    
+    Returns:
+        {resolution: H3 index string} for each of SEARCH_RESOLUTIONS
+    """
+    finest = h3.latlng_to_cell(lat, lng, SEARCH_RESOLUTIONS[0])
+    return {
+        res: finest if res == SEARCH_RESOLUTIONS[0] else h3.cell_to_parent(finest, res)
+        for res in SEARCH_RESOLUTIONS
+    }
+
+
+def get_ring_size(lat: float, lng: float, km: float, resolution: int = 9) -> int:
+    """
+    Smallest k such that grid_disk(center, k) covers every point within `km`
+    
+    Derived from the center cell's actual (shortest) edge length rather than a
+    lookup table: a hexagon's circumradius equals its edge length e, and cells at
+    grid distance j have centers at least 1.5·j·e away. Any point within `km` lies
+    in a cell whose center is within km + 2e of the center cell's center, so we
+    need 1.5·(k+1)·e > km + 2e.
+    
+    Args:
+        lat: Center latitude
+        lng: Center longitude
+        km: Radius in kilometers
+        resolution: H3 resolution
+    
+    Returns:
+        Ring size k (>= 1)
+    """
+    center_hex = h3.latlng_to_cell(lat, lng, resolution)
+    edge_km = min(h3.edge_length(e, unit='km') for e in h3.origin_to_directed_edges(center_hex))
+    
+    # Small slack for cell-size distortion across the disk
+    reach = km * RING_SLACK + 2 * edge_km
+    return max(1, math.floor(reach / (1.5 * edge_km)))
+
+
+def get_nearby_h3_cells(lat: float, lng: float, km: float, resolution: int = 9) -> list[str]:
     """
     Get all H3 cells within a radius (in kilometers)
     
@@ -39,26 +113,123 @@ def get_nearby_h3_cells(lat: float, lng: float, km: int, resolution: int = 9) ->
         List of H3 index strings covering the radius
     """
     center_hex = h3.latlng_to_cell(lat, lng, resolution)
+    k = get_ring_size(lat, lng, km, resolution)
     
-    # Map km to k-ring size (approximate)
-    # At resolution 9, each ring adds ~0.5km radius
-    k_ring_map = {
-        1: 1,   # ~1km radius
-        2: 2,   # ~2km radius
-        5: 3,   # ~5km radius
-        10: 5,  # ~10km radius
-        25: 10, # ~25km radius
-    }
+    # Get all hexagons within k rings
+    return list(h3.grid_disk(center_hex, k))
+
+
+def get_compact_h3_cells(lat: float, lng: float, km: float, resolution: int = 9) -> list[str]:
+    """
+    Same coverage as get_nearby_h3_cells, compacted into mixed-resolution cells
     
-    # Find closest k value
-    k = k_ring_map.get(km, 3)
-    for threshold, ring_size in sorted(k_ring_map.items()):
-        if km <= threshold:
-            k = ring_size
+    Interior areas collapse into coarse parents, so a large disk is described by
+    a few hundred cells instead of thousands.
+    """
+    return list(h3.compact_cells(get_nearby_h3_cells(lat, lng, km, resolution)))
+
+
+def plan_search_cells(lat: float, lng: float, km: float) -> tuple[int, list[str]]:
+    """
+    Pick the stored resolution to filter on for a radius search
+    
+    Walks from the finest resolution to the coarsest and returns the first one
+    whose compacted disk fits in MAX_CELL_TERMS SQL terms. Small radii stay
+    precise at res 9, wide radii drop to res 7 or 5, so the query size stays
+    roughly constant from 1 km to 50 km; the exact distance post-filter
+    removes the extra rows a coarse cover lets through.
+    
+    Returns:
+        (resolution, compacted cells) - cells are at `resolution` or coarser
+    """
+    cells = []
+    for resolution in SEARCH_RESOLUTIONS:
+        k = get_ring_size(lat, lng, km, resolution)
+        # Hexagonal number: cells in a k-disk, known before generating it
+        if 3 * k * (k + 1) + 1 > MAX_DISK_CELLS and resolution != SEARCH_RESOLUTIONS[-1]:
+            continue
+        center_hex = h3.latlng_to_cell(lat, lng, resolution)
+        cells = list(h3.compact_cells(h3.grid_disk(center_hex, k)))
+        if len(cells) <= MAX_CELL_TERMS:
             break
+    return resolution, cells
+
+
+def snap_search_area(lat: float, lng: float, km: float) -> tuple[str, int, float, float, float]:
+    """
+    Snap a radius search to a shareable cache area
     
-    # Get all hexagons within k rings
-    return list(h3.grid_disk(center_hex, k))
+    The area is the disk around the snapped cell's center with radius
+    bucket + the cell's circumradius, which contains the `km` disk around any
+    point inside the cell. Results fetched for the area can therefore be
+    re-filtered by exact distance for every request that snaps to it.
+    
+    Returns:
+        (cell, bucket_km, center_lat, center_lng, fetch_km)
+    """
+    bucket, resolution = next(
+        ((b, res) for b, res in CACHE_RADIUS_BUCKETS if km <= b),
+        (math.ceil(km), CACHE_RADIUS_BUCKETS[-1][1])
+    )
+    cell = h3.latlng_to_cell(lat, lng, resolution)
+    center_lat, center_lng = h3.cell_to_latlng(cell)
+    boundary = h3.cell_to_boundary(cell)
+    circumradius = float(np.max(get_distances_km(
+        center_lat, center_lng, [p[0] for p in boundary], [p[1] for p in boundary]
+    )))
+    return cell, bucket, center_lat, center_lng, bucket + circumradius
+
+
+def get_cache_tags(lat: float, lng: float, km: float) -> list[str]:
+    """
+    Cells at CACHE_TAG_RESOLUTION covering a search area, used as cache tags
+    
+    Every service within `km` of (lat, lng) lies in one of these cells, so
+    invalidating a service's `h3_res5` tag reaches every cached search that
+    could contain it.
+    """
+    return get_nearby_h3_cells(lat, lng, km, CACHE_TAG_RESOLUTION)
+
+
+def get_child_range(cell: str, resolution: int) -> tuple[str, str]:
+    """
+    Lowest and highest descendant index of `cell` at a finer resolution
+    
+    H3 stores one 3-bit digit per resolution, most significant first, so every
+    descendant at `resolution` sorts between the all-0 and all-6 digit variants.
+    Indexes are fixed-width lowercase hex, which makes the string order match
+    the integer order and lets an indexed column answer `BETWEEN lo AND hi`.
+    """
+    h = h3.str_to_int(cell)
+    cell_res = h3.get_resolution(cell)
+    h = (h & ~(_RES_MASK << _RES_OFFSET)) | (resolution << _RES_OFFSET)
+    lo = hi = h
+    for digit in range(cell_res + 1, resolution + 1):
+        shift = _DIGIT_BITS * (_MAX_RES - digit)
+        lo &= ~(_DIGIT_MASK << shift)
+        hi = (hi & ~(_DIGIT_MASK << shift)) | (6 << shift)
+    return h3.int_to_str(lo), h3.int_to_str(hi)
+
+
+def split_compact_cells(cells: list[str], resolution: int = 9) -> tuple[list[str], list[tuple[str, str]]]:
+    """
+    Split compacted cells into exact matches and descendant ranges for SQL
+    
+    Args:
+        cells: Output of get_compact_h3_cells
+        resolution: Resolution of the indexed column
+    
+    Returns:
+        (cells at `resolution` for an IN list, [(lo, hi)] ranges for coarser cells)
+    """
+    exact = []
+    ranges = []
+    for cell in cells:
+        if h3.get_resolution(cell) >= resolution:
+            exact.append(cell)
+        else:
+            ranges.append(get_child_range(cell, resolution))
+    return exact, ranges
 
 
 def get_distance_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
@@ -74,3 +245,22 @@ def get_distance_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float
     """
     # H3 v4 uses great_circle_distance
     return h3.great_circle_distance((lat1, lng1), (lat2, lng2), unit='km')
+
+
+def get_distances_km(lat: float, lng: float, lats, lngs) -> np.ndarray:
+    """
+    Vectorized great-circle distance from one point to many (haversine)
+    
+    Args:
+        lat, lng: Origin point
+        lats, lngs: Sequences of destination coordinates
+    
+    Returns:
+        Array of distances in kilometers
+    """
+    lat1 = math.radians(lat)
+    lat2 = np.radians(np.asarray(lats, dtype=np.float64))
+    dlat = lat2 - lat1
+    dlng = np.radians(np.asarray(lngs, dtype=np.float64)) - math.radians(lng)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
@@ -0,0 +1,104 @@
+"""
+Keyset Pagination
+Opaque cursor tokens over (sort column, id), so deep pages cost the same as the first
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import and_, func, or_
+
+# Response header carrying the token for the next page (absent on the last page)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class InvalidCursorError(ValueError):
+    """A cursor token that was not produced by encode_cursor (a client error, not a permission one)"""
+
+
+def encode_cursor(sort_value: datetime, row_id: int) -> str:
+    """
+    Build the opaque token pointing just past a row
+
+    Args:
+        sort_value: The row's sort key (created_at or slot_start)
+        row_id: The row's primary key (tie-breaker for equal sort keys)
+    """
+    raw = json.dumps([sort_value.isoformat(), row_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[datetime, int]:
+    """
+    Parse a token produced by encode_cursor
+
+    Raises:
+        InvalidCursorError: The token is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        sort_value, row_id = json.loads(raw)
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except Exception:
+        raise InvalidCursorError("Invalid cursor")
+
+
+def _naive(value: datetime) -> datetime:
+    # MySQL DATETIME columns come back naive; compare like with like
+    return value.replace(tzinfo=None) if value.tzinfo else value
+
+
+def paginate(qry, sort_column, id_column, cursor: Optional[str], limit: int, descending: bool = True, offset: int = 0):
+    """
+    Fetch one page of a query in (sort_column, id_column) order
+
+    The cursor becomes a range predicate on the composite index instead of
+    an OFFSET, so the database seeks straight to the page.
+
+    Args:
+        qry: ORM query with all filters applied (no ordering)
+        sort_column: Column to sort by (e.g. Service.created_at)
+        id_column: Primary key column used as tie-breaker
+        cursor: Token from the previous page, or None for the first page
+        limit: Page size
+        descending: Newest first (default) or oldest first
+        offset: Rows to skip after the cursor (legacy skip/offset parameters)
+
+    Returns:
+        (rows, next_cursor); next_cursor is None on the last page
+
+    Raises:
+        ValueError: The cursor is malformed
+    """
+    sort_attr, id_attr = sort_column.key, id_column.key
+    as_julian = qry.session.get_bind().dialect.name == "sqlite"
+    if as_julian:
+        # SQLite stores datetimes as text, with or without microseconds depending on
+        # who wrote them; compare and order as julian days so both spellings agree
+        sort_column = func.julianday(sort_column)
+
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        sort_value = _naive(sort_value)
+        if as_julian:
+            sort_value = func.julianday(sort_value.isoformat(sep=" "))
+        if descending:
+            qry = qry.filter(or_(sort_column < sort_value, and_(sort_column == sort_value, id_column < row_id)))
+        else:
+            qry = qry.filter(or_(sort_column > sort_value, and_(sort_column == sort_value, id_column > row_id)))
+
+    if descending:
+        qry = qry.order_by(sort_column.desc(), id_column.desc())
+    else:
+        qry = qry.order_by(sort_column.asc(), id_column.asc())
+
+    # One extra row tells whether another page exists
+    rows = qry.offset(offset).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    next_cursor = encode_cursor(getattr(last, sort_attr), getattr(last, id_attr))
+    return rows, next_cursor
@@ -0,0 +1,181 @@
+"""
+Query Embedding Cache
+Two-tier (in-process LRU + Redis) cache for query embeddings with request coalescing
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Awaitable, Callable, List, Optional
+
+from app.core.cache import cache_manager, normalize_query
+
+logger = logging.getLogger(__name__)
+
+
+class QueryEmbeddingCache:
+    """
+    Caches query embeddings independently of location
+
+    Lookup order:
+    1. Bounded in-process LRU (no network)
+    2. Redis, shared by all workers (optional, skipped when Redis is down)
+    3. The embedding provider; concurrent identical misses share one in-flight call
+    """
+
+    def __init__(self, max_size: int = None, redis_ttl: int = None):
+        self._max_size = max_size or int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", 2048))
+        self._redis_ttl = redis_ttl or int(os.getenv("QUERY_EMBEDDING_CACHE_TTL", 7 * 24 * 3600))
+        self._lru: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._inflight: dict[str, Future] = {}
+        self._ainflight: dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {"lru_hits": 0, "redis_hits": 0, "misses": 0, "coalesced": 0}
+
+    def _key(self, model_id: str, query: str) -> str:
+        digest = hashlib.sha1(normalize_query(query).encode("utf-8")).hexdigest()
+        return f"qemb:{model_id}:{digest}"
+
+    def _lru_get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vec = self._lru.get(key)
+            if vec is not None:
+                self._lru.move_to_end(key)
+            return vec
+
+    def _lru_put(self, key: str, vec: List[float]):
+        with self._lock:
+            self._lru[key] = vec
+            self._lru.move_to_end(key)
+            while len(self._lru) > self._max_size:
+                self._lru.popitem(last=False)
+
+    def get_or_compute(
+        self,
+        model_id: str,
+        query: str,
+        compute: Callable[[str], Optional[List[float]]]
+    ) -> Optional[List[float]]:
+        """
+        Return the cached embedding for a query, computing it at most once across concurrent callers
+
+        Args:
+            model_id: Embedding model id (part of the key so model changes never mix vectors)
+            query: Raw query text
+            compute: Called with the normalized query on a full miss; may return None on failure
+
+        Returns:
+            Embedding vector, or None if the provider failed (failures are not cached)
+        """
+        key = self._key(model_id, query)
+
+        vec = self._lru_get(key)
+        if vec is not None:
+            self._stats["lru_hits"] += 1
+            return vec
+
+        # Coalesce concurrent misses for the same key onto one future
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self._stats["coalesced"] += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            vec = self._redis_get(key)
+            if vec is not None:
+                self._stats["redis_hits"] += 1
+            else:
+                self._stats["misses"] += 1
+                vec = compute(normalize_query(query))
+                if vec is not None:
+                    self._redis_set(key, vec)
+            if vec is not None:
+                self._lru_put(key, vec)
+            future.set_result(vec)
+            return vec
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def aget_or_compute(
+        self,
+        model_id: str,
+        query: str,
+        compute: Callable[[str], Awaitable[Optional[List[float]]]]
+    ) -> Optional[List[float]]:
+        """
+        Async variant of get_or_compute() for the event-loop search path
+
+        Concurrent identical misses await the same in-flight coroutine instead of
+        each issuing their own provider call.
+        """
+        key = self._key(model_id, query)
+
+        vec = self._lru_get(key)
+        if vec is not None:
+            self._stats["lru_hits"] += 1
+            return vec
+
+        future = self._ainflight.get(key)
+        if future is not None:
+            self._stats["coalesced"] += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._ainflight[key] = future
+        try:
+            vec = self._decode(await cache_manager.aget_raw(key))
+            if vec is not None:
+                self._stats["redis_hits"] += 1
+            else:
+                self._stats["misses"] += 1
+                vec = await compute(normalize_query(query))
+                if vec is not None:
+                    await cache_manager.aset_raw(key, json.dumps(vec), ttl=self._redis_ttl)
+            if vec is not None:
+                self._lru_put(key, vec)
+            future.set_result(vec)
+            return vec
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters re-raise it; mark retrieved so an uncontended failure is not logged as unhandled
+            future.exception()
+            raise
+        finally:
+            self._ainflight.pop(key, None)
+
+    @staticmethod
+    def _decode(raw: Optional[str]) -> Optional[List[float]]:
+        if raw is None:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+    def _redis_get(self, key: str) -> Optional[List[float]]:
+        return self._decode(cache_manager.get_raw(key))
+
+    def _redis_set(self, key: str, vec: List[float]):
+        cache_manager.set_raw(key, json.dumps(vec), ttl=self._redis_ttl)
+
+    def get_stats(self) -> dict:
+        """Get cache statistics"""
+        return {"size": len(self._lru), "max_size": self._max_size, **self._stats}
@@ -1,21 +1,54 @@
 """
-Semantic Search Engine using Google Gemini API
-Generates embeddings and computes semantic similarity using Cloud Intelligence
+Semantic Search Engine
+Generates embeddings through the configured backend (Gemini or local) and computes semantic similarity
 """
-import google.generativeai as genai
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Sequence, Tuple
 import logging
-import os
+
+import numpy as np
+
+from app.core.vector_index import vector_index
+from app.core.text_index import text_index
+from app.core.query_embedding_cache import QueryEmbeddingCache
+from app.core.embedding_backends import embedding_backend
 
 logger = logging.getLogger(__name__)
 
+# Reciprocal rank fusion constant: larger values flatten the advantage of top ranks
+RRF_K = 60
+
+# Blended ranking (rank=blended): weights of relevance, proximity and provider reputation
+BLEND_RELEVANCE_WEIGHT = 0.6
+BLEND_PROXIMITY_WEIGHT = 0.25
+BLEND_REPUTATION_WEIGHT = 0.15
+# Reputation assumed for providers without a score yet (the reputation engine's prior)
+NEUTRAL_REPUTATION = 3.0
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = RRF_K) -> Dict[int, float]:
+    """
+    Fuse several rankings of service ids into one score per id
+    
+    score(id) = sum over rankings of 1 / (k + rank), rank starting at 1. Only
+    ranks matter, so BM25 and cosine scores need no common scale.
+    
+    Args:
+        rankings: Lists of ids, best first; ids absent from a list get nothing from it
+    
+    Returns:
+        {service_id: fused score}
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, service_id in enumerate(ranking, start=1):
+            fused[service_id] = fused.get(service_id, 0.0) + 1.0 / (k + rank)
+    return fused
+
 
 class SearchEngine:
     """
-    Cloud-powered semantic search engine
-    Uses Google's Gemini text-embedding-004 model
+    Semantic search engine
+    Uses the embedding backend selected by EMBEDDING_BACKEND (default: Gemini text-embedding-004)
     """
     _instance = None
     
@@ -27,47 +60,79 @@ class SearchEngine:
     def __init__(self):
         # Only initialize once
         if not hasattr(self, '_initialized'):
-            api_key = os.getenv("GEMINI_API_KEY")
-            if not api_key:
-                logger.warning("GEMINI_API_KEY not found in environment. Semantic search will be disabled.")
-                self._enabled = False
-            else:
-                genai.configure(api_key=api_key)
-                # We use the latest high-performance embedding model
-                self._model_id = "models/text-embedding-004"
-                self._enabled = True
+            self._backend = embedding_backend
+            self._enabled = self._backend is not None
+            self._model_id = self._backend.model_id if self._enabled else None
+            if self._enabled:
                 logger.info(f"Search engine initialized with {self._model_id}")
+            self._query_cache = QueryEmbeddingCache()
             self._initialized = True
     
+    @property
+    def model_id(self) -> Optional[str]:
+        """Tag stored with every embedding; only vectors with the current tag are compared"""
+        return self._model_id
+    
     def generate_embedding(self, text: str) -> List[float]:
         """
-        Generate semantic embedding for text using Google Gemini
+        Generate semantic embedding for text with the configured backend
         
         Args:
             text: Input text (service title + description)
         
         Returns:
-            768-dimensional embedding vector (Gemini standard)
+            Embedding vector (zero vector if disabled or on error)
         """
         if not self._enabled:
             logger.error("Search engine disabled: Missing API Key")
-            return [0.0] * 768
+            return [0.0] * vector_index.dimension
 
         if not text or not text.strip():
-            return [0.0] * 768
+            return [0.0] * vector_index.dimension
         
         try:
-            # Use task_type="retrieval_document" for storing indexable content
-            result = genai.embed_content(
-                model=self._model_id,
-                content=text,
-                task_type="retrieval_document",
-                title="Service Listing"
-            )
-            return result['embedding']
+            return self._backend.embed_documents([text])[0]
         except Exception as e:
-            logger.error(f"Gemini Embedding Error: {e}")
-            return [0.0] * 768
+            logger.error(f"Embedding Error: {e}")
+            return [0.0] * vector_index.dimension
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a batch of documents in one API call
+        
+        Unlike generate_embedding(), errors are raised instead of returning zero
+        vectors, so batch jobs can retry instead of storing unusable embeddings.
+        
+        Args:
+            texts: Service texts (title + description); at most 100 per call
+        
+        Returns:
+            One embedding per input text, in order
+        """
+        if not self._enabled:
+            raise RuntimeError("Search engine disabled: Missing API Key")
+        return self._backend.embed_documents(texts)
+    
+    def _embed_query_uncached(self, query: str) -> List[float]:
+        return self._backend.embed_query(query)
+    
+    def embed_query(self, query: str) -> List[float]:
+        """
+        Get the embedding for a search query
+        
+        Served from the query-embedding cache, so the same text asked from
+        different locations (or concurrently) costs at most one API call.
+        """
+        return self._query_cache.get_or_compute(self._model_id, query, self._embed_query_uncached)
+    
+    async def _aembed_query_uncached(self, query: str) -> List[float]:
+        return await self._backend.aembed_query(query)
+    
+    async def aembed_query(self, query: str) -> List[float]:
+        """
+        Async variant of embed_query() that does not block the event loop
+        """
+        return await self._query_cache.aget_or_compute(self._model_id, query, self._aembed_query_uncached)
     
     def rank_by_similarity(
         self, 
@@ -75,73 +140,137 @@ class SearchEngine:
         services: List[Dict[str, Any]]
     ) -> List[Dict[str, Any]]:
         """
-        Rank services by semantic similarity to query
+        Rank services by hybrid relevance to query (semantic + BM25 keyword)
+        
+        Falls back to BM25 alone when semantic search is disabled or the
+        query embedding fails.
+        """
+        if not services:
+            return services
+        if not self._enabled:
+            return self._rank_with_text(query, services)
+        
+        try:
+            query_vec = self.embed_query(query)
+            return self._rank_hybrid(query, query_vec, services)
+        except Exception as e:
+            logger.error(f"Semantic Ranking Error: {e}")
+            return self._rank_with_text(query, services)
+    
+    async def arank_by_similarity(
+        self, 
+        query: str, 
+        services: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Async variant of rank_by_similarity(); only the query embedding is awaited,
+        the scoring itself is in-memory and vectorized
         """
-        if not services or not self._enabled:
+        if not services:
             return services
+        if not self._enabled:
+            return self._rank_with_text(query, services)
         
         try:
-            # Generate query embedding with task_type="retrieval_query"
-            query_result = genai.embed_content(
-                model=self._model_id,
-                content=query,
-                task_type="retrieval_query"
-            )
-            query_vec = np.array([query_result['embedding']])
-            
-            # Extract service embeddings
-            service_embeddings = []
-            for service in services:
-                # Store embeddings in local DB as we retrieve them to save on API calls
-                service_embeddings.append(service.get('embedding') or [0.0] * 768)
-            
-            service_vecs = np.array(service_embeddings)
-            
-            # Compute cosine similarity
-            similarities = cosine_similarity(query_vec, service_vecs)[0]
-            
-            # Add scores to services
-            for i, service in enumerate(services):
-                service['score'] = float(similarities[i])
-            
-            # Sort by score (descending)
-            ranked = sorted(services, key=lambda x: x['score'], reverse=True)
-            return ranked
-            
+            query_vec = await self.aembed_query(query)
+            return self._rank_hybrid(query, query_vec, services)
         except Exception as e:
-            logger.error(f"Gemini Ranking Error: {e}")
-            # SMART FALLBACK: If AI fails, use text-based similarity
-            for service in services:
-                service['score'] = self._calculate_fallback_score(
-                    query, 
-                    service.get('title', ''), 
-                    service.get('description', '')
-                )
-            # Re-sort by fallback score
-            return sorted(services, key=lambda x: x['score'], reverse=True)
-            
-    def _calculate_fallback_score(self, query: str, title: str, description: str) -> float:
-        """
-        Simple text-based similarity score for fallback when AI is disabled
-        """
-        query_words = set(query.lower().split())
-        content = (title + " " + (description or "")).lower()
-        
-        if not query_words:
-            return 0.0
-            
-        # Count how many query words are present in title/description
-        matches = sum(1 for word in query_words if word in content)
-        # Normalize by query length (0.0 to 1.0)
-        return matches / len(query_words)
+            logger.error(f"Semantic Ranking Error: {e}")
+            return self._rank_with_text(query, services)
+    
+    def _rank_hybrid(self, query: str, query_vec: List[float], services: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Score all candidates against both resident indexes, then fuse the two rankings
+        ids = [service['id'] for service in services]
+        vector_scores = vector_index.scores(query_vec, ids)
+        text_scores = text_index.scores(query, ids)
+        
+        # Services without a vector (embedding pending) or without a keyword match sit out that ranking
+        has_vector = np.fromiter((vector_index.contains(i) for i in ids), dtype=bool, count=len(ids))
+        vector_order = [ids[i] for i in np.argsort(-vector_scores, kind="stable") if has_vector[i]]
+        text_order = [ids[i] for i in np.argsort(-text_scores, kind="stable") if text_scores[i] > 0]
+        fused = reciprocal_rank_fusion([vector_order, text_order])
+        
+        for service in services:
+            service['score'] = fused.get(service['id'], 0.0)
+        return sorted(services, key=lambda x: x['score'], reverse=True)
+    
+    def _rank_with_text(self, query: str, services: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Keyword-only ranking (BM25) when no query vector is available
+        text_scores = text_index.scores(query, [service['id'] for service in services])
+        for service, score in zip(services, text_scores):
+            service['score'] = float(score)
+        return sorted(services, key=lambda x: x['score'], reverse=True)
+    
+    def blend_ranking(
+        self,
+        services: List[Dict[str, Any]],
+        reputations: Dict[int, float],
+        radius_km: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Re-rank relevance-scored results by relevance, proximity and provider reputation
+        
+        One vectorized pass: relevance is scaled by the best score in the set,
+        proximity is 1 at the caller and 0 at the radius edge, reputation is the
+        provider's overall score out of 5. Without a radius (global search) the
+        proximity weight is left out and the others renormalized.
+        
+        Args:
+            services: Results with 'score', 'provider_id' and (local search) 'distance_km'
+            reputations: {provider_id: overall reputation score (0-5)}
+            radius_km: Search radius, or None for global search
+        
+        Returns:
+            Services sorted by blended score, with 'score' set to it and
+            'reputation_score' to the provider's reputation
+        """
+        if not services:
+            return services
+        
+        relevance = np.fromiter((s.get('score') or 0.0 for s in services), dtype=np.float64, count=len(services))
+        top = relevance.max()
+        if top > 0:
+            relevance = relevance / top
+        reputation = np.fromiter(
+            (reputations.get(s['provider_id'], NEUTRAL_REPUTATION) for s in services),
+            dtype=np.float64, count=len(services)
+        )
+        
+        weights = [BLEND_RELEVANCE_WEIGHT, BLEND_REPUTATION_WEIGHT]
+        columns = [relevance, reputation / 5.0]
+        if radius_km:
+            distance = np.fromiter((s.get('distance_km') or 0.0 for s in services), dtype=np.float64, count=len(services))
+            weights.append(BLEND_PROXIMITY_WEIGHT)
+            columns.append(1.0 - np.clip(distance / radius_km, 0.0, 1.0))
+        blended = np.average(np.vstack(columns), axis=0, weights=weights)
+        
+        for service, score, rep in zip(services, blended, reputation):
+            service['score'] = float(score)
+            service['reputation_score'] = round(float(rep), 2)
+        order = np.argsort(-blended, kind="stable")
+        return [services[i] for i in order]
+    
+    def fuse_hits(self, *hit_lists: List[Tuple[int, float]]) -> List[Tuple[int, float]]:
+        """
+        Fuse [(service_id, score)] lists from different retrievers (ANN, BM25)
+        
+        Returns:
+            [(service_id, fused score)] sorted by fused score descending
+        """
+        fused = reciprocal_rank_fusion([[service_id for service_id, _ in hits] for hits in hit_lists])
+        return sorted(fused.items(), key=lambda item: item[1], reverse=True)
     
     def get_model_info(self) -> Dict[str, Any]:
         """Get information about the model"""
+        backend = self._backend
         return {
-            "model_name": "Gemini text-embedding-004",
-            "provider": "Google Cloud",
-            "embedding_dimension": 768,
-            "status": "Ready" if self._enabled else "Disabled (Missing API Key)"
+            "model_name": backend.name if backend else "Gemini text-embedding-004",
+            "model_id": self._model_id,
+            "provider": backend.provider if backend else "Google Cloud",
+            "embedding_dimension": vector_index.dimension,
+            "status": "Ready" if self._enabled else "Disabled (Missing API Key)",
+            "ranking": "hybrid (vector + BM25, reciprocal rank fusion)" if self._enabled else "BM25",
+            "query_cache": self._query_cache.get_stats()
         }
 
 
@@ -0,0 +1,233 @@
+"""
+In-Process Text Index
+BM25 inverted index over service title, description and category for keyword relevance
+"""
+import logging
+import math
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+_STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is",
+    "it", "of", "on", "or", "the", "to", "with", "my", "me", "i", "near",
+})
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercase alphanumeric tokens without stopwords"""
+    return [token for token in _TOKEN_RE.findall((text or "").lower()) if token not in _STOPWORDS]
+
+
+class TextIndex:
+    """
+    Inverted index with BM25 scoring, keyed by service id
+
+    Each field contributes weighted term frequencies (a title hit counts more
+    than a description hit), so exact names and rare terms rank well. Only
+    active services are indexed. Like VectorIndex it is loaded lazily from the
+    services table, updated by service writes, and synced incrementally on
+    `updated_at` to pick up writes from other workers.
+    """
+    _instance = None
+
+    K1 = 1.2
+    B = 0.75
+    FIELD_WEIGHTS = {"title": 2.0, "category": 1.5, "description": 1.0}
+    SYNC_INTERVAL_SECONDS = 30
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        # Only initialize once
+        if not hasattr(self, '_initialized'):
+            self._lock = threading.RLock()
+            self._postings: Dict[str, Dict[int, float]] = {}
+            self._doc_terms: Dict[int, Dict[str, float]] = {}
+            self._doc_len: Dict[int, float] = {}
+            self._total_len = 0.0
+            self._loaded = False
+            self._watermark: Optional[datetime] = None
+            self._last_sync = 0.0
+            self._initialized = True
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    # ------------------------------------------------------------ maintenance
+
+    def upsert(self, service_id: int, title: str, description: Optional[str], category: Optional[str]) -> None:
+        """Index (or re-index) a service's text"""
+        terms: Dict[str, float] = {}
+        for field, text in (("title", title), ("description", description), ("category", category)):
+            weight = self.FIELD_WEIGHTS[field]
+            for token in tokenize(text):
+                terms[token] = terms.get(token, 0.0) + weight
+
+        with self._lock:
+            self._remove_locked(service_id)
+            if not terms:
+                return
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[service_id] = tf
+            self._doc_terms[service_id] = terms
+            length = sum(terms.values())
+            self._doc_len[service_id] = length
+            self._total_len += length
+
+    def remove(self, service_id: int) -> bool:
+        """Drop a service (deleted or deactivated)"""
+        with self._lock:
+            return self._remove_locked(service_id)
+
+    def _remove_locked(self, service_id: int) -> bool:
+        terms = self._doc_terms.pop(service_id, None)
+        if terms is None:
+            return False
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(service_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_len -= self._doc_len.pop(service_id, 0.0)
+        return True
+
+    def _apply_rows(self, rows) -> None:
+        for service_id, title, description, category, status, updated_at in rows:
+            if status == "active":
+                self.upsert(service_id, title, description, category)
+            else:
+                self.remove(service_id)
+            if updated_at is not None and (self._watermark is None or updated_at > self._watermark):
+                self._watermark = updated_at
+
+    def _text_columns(self, Service):
+        return (Service.id, Service.title, Service.description, Service.category, Service.status, Service.updated_at)
+
+    def ensure_loaded(self, db) -> None:
+        """
+        Build the index from the services table on first use, then sync
+        rows changed by other workers at most every SYNC_INTERVAL_SECONDS
+        """
+        from app.models.service import Service
+
+        now = time.monotonic()
+        if self._loaded and now - self._last_sync < self.SYNC_INTERVAL_SECONDS:
+            return
+
+        with self._lock:
+            if self._loaded and now - self._last_sync < self.SYNC_INTERVAL_SECONDS:
+                return
+
+            query = db.query(*self._text_columns(Service))
+            if self._loaded and self._watermark is not None:
+                query = query.filter(Service.updated_at >= self._watermark)
+            else:
+                query = query.filter(Service.status == "active")
+
+            self._apply_rows(query.all())
+            if not self._loaded:
+                logger.info(f"Text index loaded with {len(self._doc_len)} services")
+            self._loaded = True
+            self._last_sync = now
+
+    def load_missing(self, db, service_ids: List[int]) -> None:
+        """Index candidates that are not resident yet (e.g. created by another worker)"""
+        from app.models.service import Service
+
+        missing = [i for i in service_ids if i not in self._doc_len]
+        if not missing:
+            return
+        rows = db.query(*self._text_columns(Service)).filter(Service.id.in_(missing)).all()
+        with self._lock:
+            self._apply_rows(rows)
+
+    # ------------------------------------------------------------------ query
+
+    def _query_terms(self, query: str, prefix: bool) -> set:
+        tokens = set(tokenize(query))
+        if not prefix:
+            return tokens
+        # Prefix mode ("plumb" -> plumb, plumber, plumbing): one pass over the vocabulary
+        with self._lock:
+            return {term for term in self._postings if any(term.startswith(token) for token in tokens)}
+
+    def scores(self, query: str, service_ids: Iterable[int], prefix: bool = False) -> np.ndarray:
+        """
+        BM25 score of each given service for a query
+
+        Cost is one vectorized pass over the candidates per query term.
+
+        Args:
+            prefix: Also match indexed terms that start with a query token
+
+        Returns:
+            float32 array aligned with service_ids (0.0 = no query term matched)
+        """
+        return self._score_terms(self._query_terms(query, prefix), list(service_ids))
+
+    def _score_terms(self, terms: set, ids: List[int]) -> np.ndarray:
+        """BM25 scores of `ids` for already expanded query terms"""
+        out = np.zeros(len(ids), dtype=np.float64)
+        if not ids or not terms:
+            return out.astype(np.float32)
+
+        with self._lock:
+            n_docs = len(self._doc_len)
+            if not n_docs:
+                return out.astype(np.float32)
+            avg_len = self._total_len / n_docs
+            doc_len = np.fromiter((self._doc_len.get(i, 0.0) for i in ids), dtype=np.float64, count=len(ids))
+            norm = self.K1 * (1.0 - self.B + self.B * doc_len / avg_len)
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+                tf = np.fromiter((postings.get(i, 0.0) for i in ids), dtype=np.float64, count=len(ids))
+                out += idf * tf * (self.K1 + 1.0) / (tf + norm)
+        return out.astype(np.float32)
+
+    def search(self, query: str, k: int, prefix: bool = False) -> List[Tuple[int, float]]:
+        """
+        Top-k active services for a query across the whole index
+
+        Returns:
+            [(service_id, score)] sorted by score descending, matches only
+        """
+        terms = self._query_terms(query, prefix)
+        with self._lock:
+            candidates = list({sid for term in terms for sid in self._postings.get(term, ())})
+        if not candidates or k <= 0:
+            return []
+        # Reuse the expanded terms: in prefix mode expanding them scans the whole vocabulary
+        scores = self._score_terms(terms, candidates)
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(candidates[i], float(scores[i])) for i in top]
+
+    def get_stats(self) -> dict:
+        """Get index statistics"""
+        return {
+            "loaded": self._loaded,
+            "services": len(self._doc_len),
+            "terms": len(self._postings),
+        }
+
+
+# Global instance
+text_index = TextIndex()
@@ -0,0 +1,253 @@
+"""
+In-Process Vector Index
+Keeps pre-normalized service embeddings resident in a contiguous float32 matrix
+so semantic ranking is a single matrix-vector product instead of per-request JSON decoding
+"""
+import threading
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from app.core.embedding_backends import embedding_backend
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = 768
+
+
+def normalize(vector) -> Optional[np.ndarray]:
+    """
+    Convert an embedding to a unit-length float32 vector
+
+    Returns:
+        Normalized vector, or None for empty/zero vectors (e.g. failed embeddings)
+    """
+    if vector is None:
+        return None
+    arr = np.asarray(vector, dtype=np.float32).reshape(-1)
+    if arr.size == 0:
+        return None
+    norm = float(np.linalg.norm(arr))
+    if norm == 0.0 or not np.isfinite(norm):
+        return None
+    return arr / norm
+
+
+class VectorIndex:
+    """
+    Resident embedding matrix keyed by service id
+
+    Rows are stored pre-normalized, so cosine similarity reduces to a dot product.
+    The index is loaded lazily from the services table on first use and then kept
+    up to date by service create/update/delete. Rows written by other workers are
+    picked up by a periodic incremental sync on `updated_at`.
+    Only embeddings tagged with the current backend's model id are loaded, so
+    vectors from another model are never compared with this model's queries.
+    """
+    _instance = None
+
+    SYNC_INTERVAL_SECONDS = 30
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        # Only initialize once
+        if not hasattr(self, '_initialized'):
+            self._lock = threading.RLock()
+            self._dim = embedding_backend.dimension if embedding_backend else EMBEDDING_DIM
+            self._model_id = embedding_backend.model_id if embedding_backend else None
+            self._matrix = np.zeros((0, self._dim), dtype=np.float32)
+            self._ids = np.zeros(0, dtype=np.int64)
+            self._rows: Dict[int, int] = {}
+            self._size = 0
+            self._loaded = False
+            self._watermark: Optional[datetime] = None
+            self._last_sync = 0.0
+            self._initialized = True
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def dimension(self) -> int:
+        return self._dim
+
+    @property
+    def model_id(self) -> Optional[str]:
+        return self._model_id
+
+    def _current_model(self, Service):
+        return Service.embedding_model == self._model_id
+
+    def _grow(self, needed: int):
+        """Grow backing arrays geometrically so appends are amortized O(1)"""
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 64)
+        matrix = np.zeros((new_capacity, self._dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids = np.zeros(new_capacity, dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        self._matrix = matrix
+        self._ids = ids
+
+    def upsert(self, service_id: int, embedding) -> bool:
+        """
+        Insert or replace the embedding for a service
+
+        Returns:
+            True if the service is indexed, False if the embedding was unusable
+        """
+        vec = normalize(embedding)
+        with self._lock:
+            if vec is None or vec.shape[0] != self._dim:
+                self._remove_locked(service_id)
+                return False
+
+            row = self._rows.get(service_id)
+            if row is None:
+                self._grow(self._size + 1)
+                row = self._size
+                self._rows[service_id] = row
+                self._ids[row] = service_id
+                self._size += 1
+            self._matrix[row] = vec
+            return True
+
+    def remove(self, service_id: int) -> bool:
+        """Drop a service from the index"""
+        with self._lock:
+            return self._remove_locked(service_id)
+
+    def _remove_locked(self, service_id: int) -> bool:
+        row = self._rows.pop(service_id, None)
+        if row is None:
+            return False
+        # Swap the last row into the hole to keep the matrix contiguous
+        last = self._size - 1
+        if row != last:
+            moved_id = int(self._ids[last])
+            self._matrix[row] = self._matrix[last]
+            self._ids[row] = moved_id
+            self._rows[moved_id] = row
+        self._size -= 1
+        return True
+
+    def contains(self, service_id: int) -> bool:
+        return service_id in self._rows
+
+    def get(self, service_id: int) -> Optional[np.ndarray]:
+        """Return a copy of the normalized embedding for a service"""
+        with self._lock:
+            row = self._rows.get(service_id)
+            return None if row is None else self._matrix[row].copy()
+
+    def vectors(self, service_ids: List[int]) -> np.ndarray:
+        """
+        Gather normalized embeddings for the given services into a new (n, dim) matrix
+
+        Services missing from the index get a zero row.
+        """
+        with self._lock:
+            rows = np.fromiter((self._rows.get(i, -1) for i in service_ids), dtype=np.int64, count=len(service_ids))
+            out = np.zeros((len(service_ids), self._dim), dtype=np.float32)
+            present = rows >= 0
+            out[present] = self._matrix[rows[present]]
+        return out
+
+    def scores(self, query_vec, service_ids: Iterable[int]) -> np.ndarray:
+        """
+        Cosine similarity between a query and the given services
+
+        Args:
+            query_vec: Raw (un-normalized) query embedding
+            service_ids: Candidate service ids, in the order scores should be returned
+
+        Returns:
+            float32 array aligned with service_ids; services missing from the index score 0.0
+        """
+        ids = list(service_ids)
+        out = np.zeros(len(ids), dtype=np.float32)
+        query = normalize(query_vec)
+        if query is None or not ids:
+            return out
+
+        with self._lock:
+            rows = np.fromiter((self._rows.get(i, -1) for i in ids), dtype=np.int64, count=len(ids))
+            present = rows >= 0
+            if present.any():
+                out[present] = self._matrix[rows[present]] @ query
+        return out
+
+    def _load_rows(self, rows) -> int:
+        count = 0
+        for service_id, embedding, updated_at in rows:
+            if self.upsert(service_id, embedding):
+                count += 1
+            if updated_at is not None and (self._watermark is None or updated_at > self._watermark):
+                self._watermark = updated_at
+        return count
+
+    def ensure_loaded(self, db) -> None:
+        """
+        Build the index from the services table on first use, then sync
+        rows changed by other workers at most every SYNC_INTERVAL_SECONDS
+        """
+        from app.models.service import Service
+
+        now = time.monotonic()
+        if self._loaded and now - self._last_sync < self.SYNC_INTERVAL_SECONDS:
+            return
+
+        with self._lock:
+            if self._loaded and now - self._last_sync < self.SYNC_INTERVAL_SECONDS:
+                return
+
+            query = db.query(Service.id, Service.embedding, Service.updated_at).filter(
+                Service.embedding.isnot(None),
+                self._current_model(Service)
+            )
+            if self._loaded and self._watermark is not None:
+                query = query.filter(Service.updated_at >= self._watermark)
+
+            count = self._load_rows(query.all())
+            if not self._loaded:
+                logger.info(f"Vector index loaded with {count} services")
+            self._loaded = True
+            self._last_sync = now
+
+    def load_missing(self, db, service_ids: List[int]) -> int:
+        """Fetch and index candidates that are not resident yet (e.g. created by another worker)"""
+        from app.models.service import Service
+
+        missing = [i for i in service_ids if i not in self._rows]
+        if not missing:
+            return 0
+        rows = db.query(Service.id, Service.embedding, Service.updated_at).filter(
+            Service.id.in_(missing),
+            Service.embedding.isnot(None),
+            self._current_model(Service)
+        ).all()
+        with self._lock:
+            return self._load_rows(rows)
+
+    def get_stats(self) -> dict:
+        """Get index statistics"""
+        return {
+            "loaded": self._loaded,
+            "services": self._size,
+            "dimension": self._dim,
+            "model_id": self._model_id,
+            "memory_bytes": int(self._size * self._dim * 4),
+        }
+
+
+# Global instance
+vector_index = VectorIndex()
@@ -0,0 +1,23 @@
+"""
+Custom SQLAlchemy column types
+"""
+from sqlalchemy.types import TypeDecorator, LargeBinary
+
+from app.core.embedding_codec import encode_embedding, decode_embedding
+
+
+class EmbeddingType(TypeDecorator):
+    """
+    Stores embedding vectors as packed binary (see app.core.embedding_codec)
+    
+    Accepts lists or numpy arrays on write and returns float32 numpy arrays on read.
+    Legacy JSON values are decoded transparently.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return encode_embedding(value)
+
+    def process_result_value(self, value, dialect):
+        return decode_embedding(value)
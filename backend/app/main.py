@@ -2,8 +2,10 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.db.database import engine
-from app.models import user, service, booking, review, audit_log, chat_message, payment
+from app.models import user, service, booking, review, audit_log, chat_message, payment, embedding_job, provider_reputation
 from app.routers import users, search, bookings, services, chat, payments, reviews
+from app.core.embedding_worker import embedding_worker
+from app.core.cache import cache_manager
 
 # Create database tables
 user.Base.metadata.create_all(bind=engine)
@@ -13,6 +15,8 @@ review.Base.metadata.create_all(bind=engine)
 audit_log.Base.metadata.create_all(bind=engine)
 chat_message.Base.metadata.create_all(bind=engine)
 payment.Base.metadata.create_all(bind=engine)
+embedding_job.Base.metadata.create_all(bind=engine)
+provider_reputation.Base.metadata.create_all(bind=engine)
 
 app = FastAPI(title="Neighbourly API", version="1.0.0")
 
@@ -23,6 +27,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # keyset pagination token
 )
 
 # Include routers
@@ -34,6 +39,22 @@ app.include_router(chat.router)
 app.include_router(payments.router)
 app.include_router(reviews.router)
 
+@app.on_event("startup")
+def start_embedding_worker():
+    embedding_worker.start()
+
+@app.on_event("startup")
+def start_cache_listeners():
+    cache_manager.start()
+
+@app.on_event("shutdown")
+def stop_embedding_worker():
+    embedding_worker.stop()
+
+@app.on_event("shutdown")
+def stop_cache_listeners():
+    cache_manager.stop()
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Neighbourly API"}
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, DateTime, ForeignKey, String
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, String, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -7,6 +7,13 @@ from app.db.database import Base
 
 class Booking(Base):
     __tablename__ = "bookings"
+    __table_args__ = (
+        # Keyset pagination of /bookings by (slot_start, id), per seeker and per service
+        Index("ix_bookings_seeker_slot_id", "seeker_id", "slot_start", "id"),
+        Index("ix_bookings_service_slot_id", "service_id", "slot_start", "id"),
+        # Overlap check on booking: active bookings of a service by slot range
+        Index("ix_bookings_service_status_slot", "service_id", "status", "slot_start", "slot_end"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     service_id = Column(Integer, ForeignKey("services.id", ondelete="CASCADE"), nullable=False, index=True)
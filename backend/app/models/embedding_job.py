@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy.sql import func
+
+from app.db.database import Base
+
+
+class EmbeddingJob(Base):
+    __tablename__ = "embedding_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # One job per service: repeated updates re-arm the same row instead of queueing duplicates
+    service_id = Column(Integer, ForeignKey("services.id", ondelete="CASCADE"), unique=True, nullable=False)
+    status = Column(String(20), default="pending", nullable=False, index=True)  # pending, processing, failed
+    version = Column(Integer, default=1, nullable=False)  # bumped on every re-enqueue
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+    available_at = Column(DateTime, nullable=False)  # UTC; retries are delayed by pushing this forward
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey
+from sqlalchemy.sql import func
+
+from app.db.database import Base
+
+
+class ProviderReputation(Base):
+    __tablename__ = "provider_reputation"
+
+    # One row per provider, maintained in the same transaction as the booking/review write
+    provider_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    total_bookings = Column(Integer, default=0, nullable=False)
+    completed_bookings = Column(Integer, default=0, nullable=False)
+    total_reviews = Column(Integer, default=0, nullable=False)
+
+    # Time-decayed rating sums rebased to rating_epoch (see app/core/decay.py);
+    # their ratio is the review score. Double precision: the rebased terms are
+    # scaled by up to exp(30), and MySQL's single-precision FLOAT keeps ~7 digits.
+    rating_sum = Column(Float(precision=53), default=0.0, nullable=False)
+    rating_weight = Column(Float(precision=53), default=0.0, nullable=False)
+    rating_epoch = Column(DateTime, nullable=True)  # UTC
+
+    overall_score = Column(Float(precision=53), default=0.0, nullable=False, index=True)  # ordering for /reviews/top
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
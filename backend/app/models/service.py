@@ -1,12 +1,20 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
 from app.db.database import Base
+from app.db.types import EmbeddingType
 
 
 class Service(Base):
     __tablename__ = "services"
+    __table_args__ = (
+        # Keyword search for /services?q= (MySQL only; other databases use the in-process text index)
+        Index("ft_services_text", "title", "description", "category", mysql_prefix="FULLTEXT").ddl_if(dialect="mysql"),
+        # Keyset pagination, newest first (/services/all and the active /services listing)
+        Index("ix_services_created_id", "created_at", "id"),
+        Index("ix_services_status_created_id", "status", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     provider_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -19,10 +27,14 @@ class Service(Base):
     # Location fields for geospatial search
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
-    h3_index = Column(String(20), nullable=True, index=True)
+    h3_index = Column(String(20), nullable=True, index=True)  # resolution 9
+    h3_res7 = Column(String(20), nullable=True, index=True)   # parent cells for wide-radius search
+    h3_res5 = Column(String(20), nullable=True, index=True)
     
-    # Semantic search field
-    embedding = Column(JSON, nullable=True)
+    # Semantic search field (packed float32 blob, ~3 KB for 768 dims)
+    embedding = Column(EmbeddingType, nullable=True)
+    embedding_model = Column(String(100), nullable=True)  # model id that produced the embedding
+    embedding_status = Column(String(20), default="pending", nullable=False)  # pending, ready, failed
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 
 from app.dependencies import get_db, get_current_user
 from app.models.user import User
 from app.schemas.booking import BookingCreate, BookingUpdate, BookingResponse
 from app.services import booking_service
+from app.core.pagination import NEXT_CURSOR_HEADER
 
 router = APIRouter(prefix="/bookings", tags=["bookings"])
 
@@ -25,13 +26,24 @@ def create_booking(
 
 @router.get("", response_model=list[BookingResponse])
 def list_bookings(
+    response: Response,
     as_seeker: bool = Query(True, description="Include bookings where you are the seeker"),
     as_provider: bool = Query(True, description="Include bookings on services you provide"),
+    limit: int = Query(100, ge=1, le=200),
+    cursor: str | None = Query(None, description=f"Next-page token from the {NEXT_CURSOR_HEADER} header"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """List your bookings (as seeker and/or as provider)."""
-    return booking_service.list_for_user(db, current_user.id, as_seeker=as_seeker, as_provider=as_provider)
+    """List your bookings (as seeker and/or as provider), latest slot first. Follow X-Next-Cursor for more."""
+    try:
+        bookings, next_cursor = booking_service.list_for_user(
+            db, current_user.id, as_seeker=as_seeker, as_provider=as_provider, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return bookings
 
 
 @router.get("/{booking_id}", response_model=BookingResponse)
@@ -11,6 +11,7 @@ from app.core.chat_manager import manager
 from app.services.chat_service import get_messages_for_booking, get_unread_count_for_user, mark_messages_read
 from app.models.user import User
 from app.models.booking import Booking
+from app.core.pagination import InvalidCursorError
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 logger = logging.getLogger(__name__)
@@ -74,19 +75,23 @@ async def get_chat_messages(
     booking_id: int,
     limit: int = 50,
     offset: int = 0,
+    cursor: str = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Get chat messages for a booking
+    
+    Returns the latest messages; pass next_cursor back as cursor to load older ones
     """
     try:
-        messages = get_messages_for_booking(
+        messages, next_cursor = get_messages_for_booking(
             db=db,
             booking_id=booking_id,
             user_id=current_user.id,
             limit=limit,
-            offset=offset
+            offset=offset,
+            cursor=cursor
         )
 
         # Convert to response format
@@ -103,8 +108,10 @@ async def get_chat_messages(
                 "timestamp": msg.created_at.isoformat()
             })
 
-        return {"messages": message_list}
+        return {"messages": message_list, "next_cursor": next_cursor}
 
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=403, detail=str(e))
 
@@ -1,6 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from app.dependencies import get_db, get_current_user
 from app.models.user import User
@@ -29,11 +29,27 @@ def create_review(
 
 @router.get("/top")
 def get_top_providers(
-    limit: int = 5,
+    limit: int = Query(5, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    category: Optional[str] = Query(None, description="Top providers in this category"),
+    lat: Optional[float] = Query(None, ge=-90, le=90, description="Top providers in the region around this point"),
+    lng: Optional[float] = Query(None, ge=-180, le=180),
     db: Session = Depends(get_db)
 ):
-    """Get top rated providers"""
-    return reputation_service.get_top_providers(db, limit)
+    """Get top rated providers, overall or per category and/or region (e.g. "top plumbers near you")"""
+    if (lat is None) != (lng is None):
+        raise HTTPException(status_code=400, detail="lat and lng must be given together")
+    return reputation_service.get_top_providers(db, limit, offset=offset, category=category, lat=lat, lng=lng)
+
+@router.get("/stats")
+def get_provider_stats_batch(
+    provider_ids: List[int] = Query(..., description="Provider ids (repeat the parameter, up to 100)"),
+    db: Session = Depends(get_db)
+):
+    """Get reputation stats for many providers at once, keyed by provider id"""
+    if len(provider_ids) > 100:
+        raise HTTPException(status_code=400, detail="At most 100 provider ids per request")
+    return reputation_service.get_provider_scores(provider_ids, db)
 
 @router.get("/stats/{provider_id}")
 def get_provider_stats(
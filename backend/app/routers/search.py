@@ -2,29 +2,279 @@
 Search API Router
 Semantic + Location-Aware Search Endpoint
 """
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, or_, select
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Any, Dict, List, Optional
 import logging
 
 from app.dependencies import get_db
+from app.db.database import SessionLocal
 from app.schemas.service import ServiceList
 from app.core.search_engine import search_engine
-from app.core.location_engine import get_nearby_h3_cells
+from app.core.location_engine import plan_search_cells, split_compact_cells, get_distances_km, snap_search_area, get_cache_tags
 from app.core.cache import cache_manager
+from app.core.vector_index import vector_index
+from app.core.ann_index import ann_index
+from app.core.text_index import text_index
+from app.core.embedding_worker import embedding_worker
+from app.core.leaderboard import leaderboard
 from app.models.service import Service as ServiceModel
+from app.services.reputation_service import reputation_service
 
 router = APIRouter(prefix="/search", tags=["search"])
 logger = logging.getLogger(__name__)
 
+# Indexed H3 column holding each search resolution
+_H3_COLUMNS = {
+    9: ServiceModel.h3_index,
+    7: ServiceModel.h3_res7,
+    5: ServiceModel.h3_res5,
+}
+
+# Ranked candidates kept per cached search area; enough for any limit after distance re-filtering
+CACHE_MAX_RESULTS = 500
+
+# Cached results hold exactly what the response model needs (never embeddings or ORM state)
+_RESULT_FIELDS = tuple(ServiceList.model_fields)
+
+
+# Columns selected for search candidates: what ranking and the response need, never the embedding
+_CANDIDATE_COLUMNS = (
+    ServiceModel.id,
+    ServiceModel.provider_id,
+    ServiceModel.title,
+    ServiceModel.description,
+    ServiceModel.category,
+    ServiceModel.price,
+    ServiceModel.status,
+    ServiceModel.latitude,
+    ServiceModel.longitude,
+    ServiceModel.created_at,
+)
+
+
+def _filter_conditions(filters: Dict[str, Any]) -> list:
+    """SQL conditions for the optional search filters (category, price range, provider)"""
+    conditions = []
+    if filters.get("category"):
+        # Exact, case-insensitive match: user input must not act as LIKE wildcards (% and _)
+        conditions.append(func.lower(ServiceModel.category) == filters["category"].strip().lower())
+    if filters.get("min_price") is not None:
+        conditions.append(ServiceModel.price >= filters["min_price"])
+    if filters.get("max_price") is not None:
+        conditions.append(ServiceModel.price <= filters["max_price"])
+    if filters.get("provider_id") is not None:
+        conditions.append(ServiceModel.provider_id == filters["provider_id"])
+    return conditions
+
+
+def _fetch_candidates(
+    db: Session,
+    lat: float,
+    lng: float,
+    km: float,
+    resolution: int,
+    search_cells: List[str],
+    load_vectors: bool,
+    filters: Dict[str, Any]
+) -> List[dict]:
+    """
+    Fetch active services within `km` of (lat, lng) as plain dicts (blocking, run off the event loop)
+    
+    The H3 prefilter over-covers the circle, so rows are re-checked against the
+    exact great-circle distance, which is returned per result. Search filters
+    are applied in the same SQL query.
+    """
+    # Compacted parents become index range scans; cells at the column's resolution stay in the IN list
+    h3_column = _H3_COLUMNS[resolution]
+    exact_cells, cell_ranges = split_compact_cells(search_cells, resolution)
+    cell_filters = [h3_column.between(lo, hi) for lo, hi in cell_ranges]
+    if exact_cells:
+        cell_filters.append(h3_column.in_(exact_cells))
+    
+    # Only fetch services in nearby cells (massive performance boost)
+    # One Core query for just the needed columns: no ORM identity map, no embedding or state
+    result = db.execute(
+        select(*_CANDIDATE_COLUMNS).where(
+            ServiceModel.status == "active",
+            or_(*cell_filters),
+            *_filter_conditions(filters)
+        )
+    )
+    columns = list(result.keys())
+    rows = result.all()
+    
+    distances = get_distances_km(lat, lng, [row.latitude for row in rows], [row.longitude for row in rows])
+    
+    service_dicts = [
+        dict(zip(columns, row), distance_km=round(float(distance), 3), score=None)
+        for row, distance in zip(rows, distances)
+        if distance <= km
+    ]
+    
+    if service_dicts:
+        candidate_ids = [s["id"] for s in service_dicts]
+        text_index.ensure_loaded(db)
+        text_index.load_missing(db, candidate_ids)
+        if load_vectors:
+            vector_index.ensure_loaded(db)
+            vector_index.load_missing(db, candidate_ids)
+    
+    return service_dicts
+
+
+def _localize(results: List[dict], lat: float, lng: float, km: int, limit: int) -> List[dict]:
+    """
+    Re-filter ranked area results to the caller's exact radius, keeping rank order
+    
+    Cached entries are shared by everyone in a snapped cell, so distances are
+    recomputed from the caller's own coordinates before slicing to `limit`.
+    """
+    if not results:
+        return []
+    distances = get_distances_km(
+        lat, lng,
+        [r["latitude"] for r in results],
+        [r["longitude"] for r in results]
+    )
+    local = [
+        dict(r, distance_km=round(float(distance), 3))
+        for r, distance in zip(results, distances)
+        if distance <= km
+    ]
+    return local[:limit]
+
+
+def _fetch_area_candidates(*args) -> List[dict]:
+    """_fetch_candidates on a private session, so background cache refreshes can outlive the request"""
+    db = SessionLocal()
+    try:
+        return _fetch_candidates(db, *args)
+    finally:
+        db.close()
+
+
+async def _rank_area(
+    q: str,
+    center_lat: float,
+    center_lng: float,
+    fetch_km: float,
+    max_results: Optional[int],
+    filters: Dict[str, Any]
+) -> List[dict]:
+    """
+    Rank every active service in a cache area (the cache miss / refresh path)
+    """
+    # 2️⃣ Get nearby H3 cells for location filtering
+    # Wide radii filter on a coarser parent column so the cell list stays small
+    resolution, search_cells = plan_search_cells(center_lat, center_lng, fetch_km)
+    logger.info(f"Found {len(search_cells)} H3 cells (res {resolution}) in {fetch_km:.2f}km cache area")
+    
+    # 3️⃣ + 4️⃣ Query database with H3 filter, drop rows outside the area, convert to dicts
+    # The ORM session is synchronous, so run it in the threadpool instead of on the event loop
+    is_ai_enabled = search_engine._enabled
+    service_dicts = await run_in_threadpool(
+        _fetch_area_candidates, center_lat, center_lng, fetch_km, resolution, search_cells, is_ai_enabled, filters
+    )
+    logger.info(f"Found {len(service_dicts)} services in location")
+    
+    # 5️⃣ Rank by semantic similarity
+    ranked_services = await search_engine.arank_by_similarity(q, service_dicts) if service_dicts else []
+    logger.info(f"Ranked {len(ranked_services)} services by relevance (AI Enabled: {is_ai_enabled})")
+    
+    if not is_ai_enabled:
+        logger.warning("Search AI is disabled, using basic keyword matching")
+    
+    return [{field: service.get(field) for field in _RESULT_FIELDS} for service in ranked_services[:max_results]]
+
+
+def _fetch_global_results(
+    db: Session,
+    q: str,
+    query_vec: Optional[List[float]],
+    limit: int,
+    nprobe: Optional[int],
+    filters: Dict[str, Any]
+) -> List[dict]:
+    """
+    Top services anywhere: ANN (semantic) and BM25 (keyword) hits fused by rank
+    (blocking, run off the event loop)
+    
+    Without a query vector only the keyword retriever is used.
+    """
+    # Over-fetch: hits may have been deactivated or deleted by another worker, or fail the filters
+    filtered = any(value is not None for value in filters.values())
+    fetch_k = limit * (10 if filtered else 2)
+    text_index.ensure_loaded(db)
+    hit_lists = [text_index.search(q, fetch_k)]
+    if query_vec is not None:
+        ann_index.ensure_built(db)
+        hit_lists.append(ann_index.search(query_vec, fetch_k, nprobe=nprobe))
+    hits = search_engine.fuse_hits(*hit_lists)
+    if not hits:
+        return []
+    
+    result = db.execute(
+        select(*_CANDIDATE_COLUMNS).where(
+            ServiceModel.id.in_([service_id for service_id, _ in hits]),
+            ServiceModel.status == "active",
+            *_filter_conditions(filters)
+        )
+    )
+    columns = list(result.keys())
+    by_id = {row.id: row for row in result}
+    
+    results = [
+        dict(zip(columns, by_id[service_id]), distance_km=None, score=score)
+        for service_id, score in hits
+        if service_id in by_id
+    ]
+    return results[:limit]
+
+
+def _blend_with_reputation(db: Session, results: List[dict], km: Optional[float]) -> List[dict]:
+    """Re-rank results by relevance, proximity and provider reputation (one reputation query)"""
+    reputations = reputation_service.get_overall_scores([r["provider_id"] for r in results], db)
+    return search_engine.blend_ranking(results, reputations, km)
+
+
+async def _search_global(q: str, limit: int, nprobe: Optional[int], filters: Dict[str, Any], rank: str, db: Session) -> List[dict]:
+    query_vec = None
+    if search_engine._enabled:
+        try:
+            query_vec = await search_engine.aembed_query(q)
+        except Exception as e:
+            # Keyword retrieval still answers while the embedding API is down
+            logger.error(f"Query embedding failed for global search, using BM25 only: {e}")
+    
+    fetch = _fetch_global_blended if rank == "blended" else _fetch_global_results
+    results = await run_in_threadpool(fetch, db, q, query_vec, limit, nprobe, filters)
+    logger.info(f"Global search returned {len(results)} services")
+    return results
+
+
+def _fetch_global_blended(db: Session, q: str, query_vec: Optional[List[float]], limit: int, nprobe: Optional[int], filters: Dict[str, Any]) -> List[dict]:
+    # Blend over a wider candidate set so reputation can lift results just outside the relevance top-k
+    results = _fetch_global_results(db, q, query_vec, limit * 3, nprobe, filters)
+    return _blend_with_reputation(db, results, None)[:limit]
+
 
 @router.get("", response_model=List[ServiceList])
 async def search_services(
     q: str = Query(..., min_length=1, description="Search query"),
-    lat: float = Query(..., ge=-90, le=90, description="Latitude"),
-    lng: float = Query(..., ge=-180, le=180, description="Longitude"),
+    lat: Optional[float] = Query(None, ge=-90, le=90, description="Latitude (omit for global search)"),
+    lng: Optional[float] = Query(None, ge=-180, le=180, description="Longitude (omit for global search)"),
     km: int = Query(5, ge=1, le=50, description="Radius in kilometers"),
     limit: int = Query(10, ge=1, le=50, description="Max results"),
+    mode: Optional[str] = Query(None, pattern="^(local|global)$", description="local (radius) or global (anywhere); defaults to global when lat/lng are omitted"),
+    nprobe: Optional[int] = Query(None, ge=1, le=256, description="Global mode: clusters to probe (higher = better recall, slower)"),
+    category: Optional[str] = Query(None, description="Only services in this category"),
+    min_price: Optional[float] = Query(None, ge=0, description="Minimum price per hour"),
+    max_price: Optional[float] = Query(None, ge=0, description="Maximum price per hour"),
+    provider_id: Optional[int] = Query(None, description="Only services by this provider"),
+    rank: str = Query("relevance", pattern="^(relevance|blended)$", description="relevance, or blended (relevance + distance + provider reputation)"),
     db: "Session" = Depends(get_db)
 ):
     """
@@ -32,81 +282,74 @@ async def search_services(
     
     This endpoint combines:
     1. **Redis Cache** - Sub-5ms response for hot queries
-    2. **H3 Geospatial** - Constant-time location filtering
+    2. **H3 Geospatial** - Constant-time location filtering, refined by exact distance
     3. **ML Embeddings** - Semantic understanding of queries
-    4. **Cosine Similarity** - Relevance ranking
+    4. **Hybrid Ranking** - Cosine similarity and BM25 keyword scores, fused by rank
     
     Examples:
     - "math tutor" → finds "Physics & Algebra Teacher"
     - "bike repair" → finds "Motorcycle Mechanic"
     - "house clean" → finds "Home Cleaning Services"
     
+    Global mode (no lat/lng, or mode=global) skips the location filter and
+    answers "best matches anywhere" from an approximate nearest neighbour index
+    and the BM25 text index (keyword-only while the embedding API is unavailable).
+    
     Args:
         q: Search query (semantic understanding)
         lat: User latitude
         lng: User longitude
         km: Search radius (1-50 km)
         limit: Max results to return
+        mode: local or global
+        nprobe: ANN recall/latency trade-off for global mode
+        category, min_price, max_price, provider_id: Optional filters, applied in SQL
+        rank: relevance (default) or blended, which also weighs distance and provider reputation
     
     Returns:
         List of services ranked by semantic relevance with scores
     """
-    logger.info(f"Search request: query='{q}', location=({lat}, {lng}), radius={km}km")
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(status_code=400, detail="min_price cannot exceed max_price")
+    filters = {"category": category, "min_price": min_price, "max_price": max_price, "provider_id": provider_id}
     
-    # 1️⃣ Check cache first
-    cached_results = cache_manager.get(q, lat, lng, km)
-    if cached_results:
-        logger.info("Returning cached results")
-        return cached_results[:limit]
+    if mode is None:
+        mode = "global" if lat is None or lng is None else "local"
+    if mode == "global":
+        logger.info(f"Global search request: query='{q}'")
+        return await _search_global(q, limit, nprobe, filters, rank, db)
+    if lat is None or lng is None:
+        raise HTTPException(status_code=400, detail="lat and lng are required for local search")
     
-    # 2️⃣ Get nearby H3 cells for location filtering
-    nearby_cells = get_nearby_h3_cells(lat, lng, km)
-    logger.info(f"Found {len(nearby_cells)} H3 cells in {km}km radius")
+    logger.info(f"Search request: query='{q}', location=({lat}, {lng}), radius={km}km")
     
-    # 3️⃣ Query database with H3 filter
-    # Only fetch services in nearby cells (massive performance boost)
-    services_query = db.query(ServiceModel).filter(
-        ServiceModel.status == "active",
-        ServiceModel.h3_index.in_(nearby_cells)
+    # 1️⃣ Check cache first
+    # The entry covers the snapped cell and radius bucket and holds the full ranked list for
+    # that area (5 minute soft TTL); on expiry one worker refreshes it while others serve it stale
+    cell, radius_bucket, center_lat, center_lng, fetch_km = snap_search_area(lat, lng, km)
+    area_results = await cache_manager.aget_or_compute(
+        q, cell, radius_bucket,
+        lambda: _rank_area(q, center_lat, center_lng, fetch_km, CACHE_MAX_RESULTS, filters),
+        ttl=300,
+        # Tagged with the covered res-5 cells so service writes there invalidate it
+        tags=get_cache_tags(center_lat, center_lng, fetch_km),
+        filters=filters
     )
     
-    services = services_query.all()
-    logger.info(f"Found {len(services)} services in location")
-    
-    if not services:
-        return []
-    
-    # 4️⃣ Convert to dicts for semantic ranking
-    service_dicts = []
-    for service in services:
-        service_dict = {
-            "id": service.id,
-            "provider_id": service.provider_id,
-            "title": service.title,
-            "description": service.description,
-            "category": service.category,
-            "status": service.status,
-            "latitude": service.latitude,
-            "longitude": service.longitude,
-            "created_at": service.created_at,
-            "embedding": service.embedding,
-            "score": None  # Will be populated by search engine
-        }
-        service_dicts.append(service_dict)
-    
-    # 5️⃣ Rank by semantic similarity
-    is_ai_enabled = search_engine._enabled
-    ranked_services = search_engine.rank_by_similarity(q, service_dicts)
-    logger.info(f"Ranked {len(ranked_services)} services by relevance (AI Enabled: {is_ai_enabled})")
-    
-    if not is_ai_enabled:
-        logger.warning("Search AI is disabled, using basic keyword matching")
+    # 6️⃣ Take top results within this caller's radius
+    # (blended ranking re-orders everything in the radius, so keep it all until step 7)
+    blended = rank == "blended"
+    keep = None if blended else limit
+    top_results = _localize(area_results, lat, lng, km, keep)
     
-    # 6️⃣ Take top results
-    top_results = ranked_services[:limit]
+    # A truncated entry can only answer requests it still fills
+    if len(top_results) < limit and len(area_results) >= CACHE_MAX_RESULTS:
+        logger.info("Cached area is truncated, ranking uncached")
+        top_results = _localize(await _rank_area(q, center_lat, center_lng, fetch_km, None, filters), lat, lng, km, keep)
     
-    # 7️⃣ Cache results (5 minute TTL)
-    cache_manager.set(q, lat, lng, km, top_results, ttl=300)
+    # 7️⃣ Blend relevance, distance and provider reputation (after the cache: distances are per caller)
+    if blended and top_results:
+        top_results = (await run_in_threadpool(_blend_with_reputation, db, top_results, km))[:limit]
     
     # Log top result for debugging
     if top_results:
@@ -126,5 +369,10 @@ async def get_search_stats():
     """
     return {
         "cache": cache_manager.get_stats(),
-        "model": search_engine.get_model_info()
+        "model": search_engine.get_model_info(),
+        "vector_index": vector_index.get_stats(),
+        "ann_index": ann_index.get_stats(),
+        "text_index": text_index.get_stats(),
+        "embedding_worker": embedding_worker.get_stats(),
+        "leaderboard": leaderboard.get_stats()
     }
@@ -1,22 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 
 from app.dependencies import get_db, get_current_user
 from app.models.user import User
 from app.schemas.service import ServiceCreate, ServiceUpdate, ServiceResponse, ServiceList, ServiceDetailedResponse
 from app.services import service_service
+from app.core.pagination import NEXT_CURSOR_HEADER
 
 router = APIRouter(prefix="/services", tags=["services"])
 
 
 @router.get("/all", response_model=list[ServiceDetailedResponse])
 def get_all_services(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=200),
+    cursor: str | None = Query(None, description=f"Next-page token from the {NEXT_CURSOR_HEADER} header"),
     db: Session = Depends(get_db),
 ):
-    """List all services with full information (provider details, etc)."""
-    return service_service.get_all_services(db, skip=skip, limit=limit)
+    """List all services with full information (provider details, etc). Newest first; follow X-Next-Cursor for more."""
+    try:
+        services, next_cursor = service_service.get_all_services(db, skip=skip, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return services
 
 
 @router.post("", response_model=ServiceResponse, status_code=201)
@@ -34,15 +43,25 @@ def create_service(
 
 @router.get("", response_model=list[ServiceList])
 def list_services(
+    response: Response,
     q: str | None = Query(None, description="Search in title, description, category"),
     category: str | None = Query(None, description="Filter by category"),
     provider_id: int | None = Query(None, description="Filter by provider user id"),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=200),
+    cursor: str | None = Query(None, description=f"Next-page token from the {NEXT_CURSOR_HEADER} header (listing without q)"),
     db: Session = Depends(get_db),
 ):
-    """List active services. Optional search and filters."""
-    return service_service.list_services(db, q=q, category=category, provider_id=provider_id, skip=skip, limit=limit)
+    """List active services. Optional keyword search (ranked by relevance) and filters. Without q, follow X-Next-Cursor for more."""
+    try:
+        services, next_cursor = service_service.list_services(
+            db, q=q, category=category, provider_id=provider_id, skip=skip, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return services
 
 
 @router.get("/{service_id}", response_model=ServiceResponse)
@@ -17,6 +17,8 @@ class ServiceUpdate(BaseModel):
     description: str | None = None
     category: str | None = Field(None, max_length=100)
     status: str | None = Field(None, pattern="^(active|inactive)$")
+    latitude: float | None = Field(None, ge=-90, le=90)
+    longitude: float | None = Field(None, ge=-180, le=180)
 
 
 class ServiceResponse(BaseModel):
@@ -27,6 +29,7 @@ class ServiceResponse(BaseModel):
     category: str | None
     price: float
     status: str
+    embedding_status: str = "ready"  # "pending" until the background worker has indexed the service
     latitude: float | None = None
     longitude: float | None = None
     created_at: datetime
@@ -45,13 +48,16 @@ class ServiceList(BaseModel):
     title: str
     description: str | None
     category: str | None
+    price: float | None = None
     status: str
     latitude: float | None = None
     longitude: float | None = None
     created_at: datetime
     
-    # Search score (only populated in search results)
+    # Search score and distance (only populated in search results)
     score: float | None = None
+    distance_km: float | None = None
+    reputation_score: float | None = None  # provider reputation, populated by rank=blended
 
     class Config:
         from_attributes = True
@@ -1,3 +1,5 @@
+import threading
+from contextlib import nullcontext
 from datetime import timezone
 from sqlalchemy.orm import Session, aliased
 
@@ -6,43 +8,83 @@ from app.models.service import Service
 from app.models.user import User
 from app.schemas.booking import BookingCreate, BookingUpdate
 from app.services.payment_service import payment_service
+from app.core.pagination import paginate
+from app.services.reputation_service import reputation_service
+from app.core.leaderboard import leaderboard
 
 
-def _overlaps(a_start, a_end, b_start, b_end) -> bool:
-    # Ensure all are naive for safely comparing MySQL datetimes
-    a_s = a_start.replace(tzinfo=None) if a_start.tzinfo else a_start
-    a_e = a_end.replace(tzinfo=None) if a_end.tzinfo else a_end
-    b_s = b_start.replace(tzinfo=None) if b_start.tzinfo else b_start
-    b_e = b_end.replace(tzinfo=None) if b_end.tzinfo else b_end
-    return a_s < b_e and b_s < a_e
+# Booking is serialized per service: MySQL locks the service row (SELECT ... FOR UPDATE).
+# SQLite ignores FOR UPDATE, so development setups fall back to striped in-process locks.
+# Every write touching a service's bookings and its provider's reputation locks in
+# the same order (service row, then booking rows, then the reputation row), so
+# creating, completing and deleting concurrently cannot deadlock.
+_SERVICE_LOCK_STRIPES = 64
+_service_locks = [threading.Lock() for _ in range(_SERVICE_LOCK_STRIPES)]
 
 
-def create(db: Session, seeker_id: int, data: BookingCreate) -> Booking:
-    svc = db.query(Service).filter(Service.id == data.service_id).first()
-    if not svc:
-        raise ValueError("Service not found")
-    if svc.status != "active":
-        raise ValueError("Service is not available for booking")
-    if svc.provider_id == seeker_id:
-        raise ValueError("You cannot book your own service")
-
-    for b in db.query(Booking).filter(
-        Booking.service_id == data.service_id,
+def _naive(value):
+    # MySQL DATETIME columns are stored and compared without a timezone
+    return value.replace(tzinfo=None) if value.tzinfo else value
+
+
+def _service_lock(db: Session, service_id: int):
+    if db.get_bind().dialect.name == "sqlite":
+        return _service_locks[service_id % _SERVICE_LOCK_STRIPES]
+    return nullcontext()
+
+
+def _find_overlap(db: Session, service_id: int, slot_start, slot_end) -> Booking | None:
+    """
+    First active booking of the service overlapping [slot_start, slot_end)
+
+    A range predicate on the (service_id, status, slot_start, slot_end) index.
+    slot_start has no lower bound (a stored booking may be arbitrarily long),
+    but the status prefix keeps the scan to the service's active bookings:
+    finished history is completed or cancelled and is neither read nor locked.
+    It is a locking read, so it sees bookings committed by transactions that
+    held the service lock before us, even under REPEATABLE READ.
+    """
+    return db.query(Booking).filter(
+        Booking.service_id == service_id,
         Booking.status.in_(["pending", "confirmed"]),
-    ).all():
-        if _overlaps(b.slot_start, b.slot_end, data.slot_start, data.slot_end):
-            raise ValueError("This slot overlaps with an existing booking")
-
-    bk = Booking(
-        service_id=data.service_id,
-        seeker_id=seeker_id,
-        slot_start=data.slot_start.replace(tzinfo=None) if data.slot_start.tzinfo else data.slot_start,
-        slot_end=data.slot_end.replace(tzinfo=None) if data.slot_end.tzinfo else data.slot_end,
-        status="pending",
-    )
-    db.add(bk)
-    db.commit()
+        Booking.slot_start < slot_end,
+        Booking.slot_end > slot_start,
+    ).with_for_update().first()
+
+
+def create(db: Session, seeker_id: int, data: BookingCreate) -> Booking:
+    slot_start, slot_end = _naive(data.slot_start), _naive(data.slot_end)
+
+    with _service_lock(db, data.service_id):
+        # Lock the service row: concurrent bookings of this service queue here until we commit
+        svc = db.query(Service).filter(Service.id == data.service_id).with_for_update().first()
+        try:
+            if not svc:
+                raise ValueError("Service not found")
+            if svc.status != "active":
+                raise ValueError("Service is not available for booking")
+            if svc.provider_id == seeker_id:
+                raise ValueError("You cannot book your own service")
+            if _find_overlap(db, data.service_id, slot_start, slot_end):
+                raise ValueError("This slot overlaps with an existing booking")
+        except ValueError:
+            db.rollback()  # release the lock right away
+            raise
+
+        # Count the booking in the provider's reputation in the same transaction
+        reputation_service.record_booking(db, svc.provider_id)
+        bk = Booking(
+            service_id=data.service_id,
+            seeker_id=seeker_id,
+            slot_start=slot_start,
+            slot_end=slot_end,
+            status="pending",
+        )
+        db.add(bk)
+        db.commit()
+
     db.refresh(bk)
+    leaderboard.update_provider(db, svc.provider_id)
     return get_by_id(db, bk.id)
 
 
@@ -83,7 +125,23 @@ def get_by_id(db: Session, booking_id: int) -> dict | None:
     }
 
 
-def list_for_user(db: Session, user_id: int, as_seeker: bool = True, as_provider: bool = True) -> list[dict]:
+def list_for_user(
+    db: Session,
+    user_id: int,
+    as_seeker: bool = True,
+    as_provider: bool = True,
+    limit: int = 100,
+    cursor: str | None = None,
+) -> tuple[list[dict], str | None]:
+    """
+    List a user's bookings, latest slot first, one keyset page at a time
+
+    Returns:
+        (bookings, next_cursor); next_cursor is None on the last page
+
+    Raises:
+        ValueError: The cursor is malformed
+    """
     qry = db.query(Booking).join(Service)
 
     if as_seeker and not as_provider:
@@ -95,7 +153,7 @@ def list_for_user(db: Session, user_id: int, as_seeker: bool = True, as_provider
             (Booking.seeker_id == user_id) | (Service.provider_id == user_id)
         )
 
-    bookings = qry.order_by(Booking.slot_start.desc()).all()
+    bookings, next_cursor = paginate(qry, Booking.slot_start, Booking.id, cursor, limit)
 
     # Convert to dict with nested service and seeker data
     result = []
@@ -127,7 +185,7 @@ def list_for_user(db: Session, user_id: int, as_seeker: bool = True, as_provider
             }
         }
         result.append(booking_dict)
-    return result
+    return result, next_cursor
 
 
 def update_status(db: Session, booking_id: int, user_id: int, status: str) -> dict | None:
@@ -147,22 +205,32 @@ def update_status(db: Session, booking_id: int, user_id: int, status: str) -> di
     if not is_seeker and not is_provider:
         return None
 
+    # Lock order as in create(): service row, booking row, then reputation row.
+    # Every transition re-reads the booking under the lock, so a cancel racing a
+    # completion cannot overwrite it after the reputation row counted it.
+    db.query(Service).filter(Service.id == svc.id).with_for_update().first()
+    db.refresh(bk, with_for_update=True)
+    if bk.status in ("cancelled", "completed"):
+        db.rollback()  # release the locks right away
+        raise ValueError(f"Cannot change status of a {bk.status} booking")
+
     # Update status based on permissions
     if status == "cancelled":
-        if is_seeker or is_provider:
-            bk.status = "cancelled"
-            db.commit()
-            db.refresh(bk)
-            return get_by_id(db, booking_id)
+        bk.status = "cancelled"
+        db.commit()
+        db.refresh(bk)
+        return get_by_id(db, booking_id)
     elif status == "confirmed" and is_provider:
         bk.status = "confirmed"
         db.commit()
         db.refresh(bk)
         return get_by_id(db, booking_id)
     elif status == "completed" and is_provider:
+        reputation_service.record_completion(db, svc.provider_id)
         bk.status = "completed"
         db.commit()
         db.refresh(bk)
+        leaderboard.update_provider(db, svc.provider_id)
 
         # Trigger payment processing when booking is completed
         try:
@@ -173,4 +241,5 @@ def update_status(db: Session, booking_id: int, user_id: int, status: str) -> di
 
         return get_by_id(db, booking_id)
 
+    db.rollback()
     return None
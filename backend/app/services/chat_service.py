@@ -3,6 +3,7 @@ from sqlalchemy import and_, or_
 from app.models.chat_message import ChatMessage
 from app.models.booking import Booking
 from app.models.service import Service
+from app.core.pagination import paginate
 
 
 def save_message(db: Session, booking_id: int, sender_id: int, recipient_id: int, message: str, message_type: str = "text"):
@@ -22,9 +23,14 @@ def save_message(db: Session, booking_id: int, sender_id: int, recipient_id: int
     return db_message
 
 
-def get_messages_for_booking(db: Session, booking_id: int, user_id: int, limit: int = 50, offset: int = 0):
+def get_messages_for_booking(db: Session, booking_id: int, user_id: int, limit: int = 50, offset: int = 0, cursor: str = None):
     """
     Get chat messages for a booking, ensuring user has access
+
+    Pages go back in time: the cursor of one page fetches the older messages before it.
+
+    Returns:
+        (messages in chronological order, cursor for older messages or None)
     """
     # Verify user is part of the booking
     booking = db.query(Booking).filter(Booking.id == booking_id).first()
@@ -34,12 +40,13 @@ def get_messages_for_booking(db: Session, booking_id: int, user_id: int, limit:
     if booking.seeker_id != user_id and booking.service.provider_id != user_id:
         raise ValueError("Access denied: User is not part of this booking")
 
-    # Get messages
-    messages = db.query(ChatMessage).filter(
-        ChatMessage.booking_id == booking_id
-    ).order_by(ChatMessage.created_at.desc()).limit(limit).offset(offset).all()
+    # Get messages, newest first, seeking past the cursor on (booking_id, created_at, id)
+    messages, next_cursor = paginate(
+        db.query(ChatMessage).filter(ChatMessage.booking_id == booking_id),
+        ChatMessage.created_at, ChatMessage.id, cursor, limit, offset=offset
+    )
 
-    return messages[::-1]  # Reverse to get chronological order
+    return messages[::-1], next_cursor  # Reverse to get chronological order
 
 
 def get_unread_count_for_user(db: Session, user_id: int) -> int:
@@ -0,0 +1,46 @@
+"""
+Embedding Queue Service
+Durable, deduplicated queue of services waiting for (re-)embedding
+"""
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.embedding_job import EmbeddingJob
+
+
+def enqueue_embedding(db: Session, service_id: int) -> EmbeddingJob:
+    """
+    Queue a service for embedding as part of the caller's transaction
+
+    A service has at most one job. Enqueueing again (e.g. several quick edits)
+    re-arms the existing row and bumps its version, so the worker embeds the
+    latest text once and never commits a result for an outdated version.
+    """
+    now = datetime.utcnow()
+    job = db.query(EmbeddingJob).filter(EmbeddingJob.service_id == service_id).first()
+    if job is None:
+        try:
+            with db.begin_nested():
+                job = EmbeddingJob(service_id=service_id, status="pending", version=1, attempts=0, available_at=now)
+                db.add(job)
+            return job
+        except IntegrityError:
+            # A concurrent request created the job first; fall through and re-arm it
+            job = db.query(EmbeddingJob).filter(EmbeddingJob.service_id == service_id).first()
+
+    job.status = "pending"
+    job.version = EmbeddingJob.version + 1
+    job.attempts = 0
+    job.last_error = None
+    job.available_at = now
+    return job
+
+
+def get_queue_stats(db: Session) -> dict:
+    """Count jobs per status"""
+    from sqlalchemy import func
+
+    rows = db.query(EmbeddingJob.status, func.count(EmbeddingJob.id)).group_by(EmbeddingJob.status).all()
+    return {status: count for status, count in rows}
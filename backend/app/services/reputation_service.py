@@ -1,17 +1,24 @@
 """
 Reputation Engine Service
 Implements weighted reputation scoring for providers based on reviews and reliability metrics
+
+Scores are materialized per provider in provider_reputation and updated
+incrementally by booking and review writes, so reads are single-row lookups.
 """
 import math
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import case, func
 
 from app.models.review import Review
 from app.models.booking import Booking
 from app.models.user import User
 from app.models.service import Service
+from app.models.provider_reputation import ProviderReputation
+from app.core.decay import rebased_add, decayed_value
+from app.core.leaderboard import leaderboard
 
 
 class ReputationService:
@@ -30,6 +37,11 @@ class ReputationService:
         """
         Calculate comprehensive reputation score for a provider
 
+        Served from the materialized provider_reputation row. Rows are created
+        by the provider's first booking (or by backfill_reputation.py, run from
+        migrate_db.py, for history from before the table existed), so a
+        provider without one has no bookings and scores zero.
+
         Returns:
             {
                 "overall_score": float (0-5),
@@ -40,70 +52,254 @@ class ReputationService:
                 "completed_bookings": int
             }
         """
-        # Get all bookings for this provider
-        bookings = db.query(Booking).filter(Booking.service.has(provider_id=provider_id)).all()
-
-        if not bookings:
-            return {
-                "overall_score": 0.0,
-                "review_score": 0.0,
-                "completion_rate": 0.0,
-                "total_reviews": 0,
-                "total_bookings": 0,
-                "completed_bookings": 0
-            }
+        reputation = db.query(ProviderReputation).filter(ProviderReputation.provider_id == provider_id).first()
+        if reputation is None:
+            return ReputationService._empty_score_data()
+        return ReputationService._score_data(reputation)
 
-        total_bookings = len(bookings)
-        completed_bookings = len([b for b in bookings if b.status == "completed"])
-        completion_rate = completed_bookings / total_bookings if total_bookings > 0 else 0.0
+    @staticmethod
+    def get_provider_scores(provider_ids: List[int], db: Session) -> Dict[int, Dict[str, float]]:
+        """
+        Reputation of many providers in one indexed read (e.g. badges for a page of search results)
 
-        # Get reviews for this provider
-        reviews = db.query(Review).filter(Review.provider_id == provider_id).all()
-        total_reviews = len(reviews)
+        Providers without a row (no bookings, or unknown ids) get the zero
+        score, as in calculate_provider_score().
 
-        if not reviews:
-            review_score = 0.0
-        else:
-            # Calculate time-weighted review score
-            review_score = ReputationService._calculate_weighted_review_score(reviews)
+        Returns:
+            {provider_id: score dict as returned by calculate_provider_score()}
+        """
+        ids = list(dict.fromkeys(provider_ids))
+        if not ids:
+            return {}
+        rows = db.query(ProviderReputation).filter(ProviderReputation.provider_id.in_(ids)).all()
+        by_id = {reputation.provider_id: reputation for reputation in rows}
+        return {
+            provider_id: ReputationService._score_data(by_id[provider_id])
+            if provider_id in by_id else ReputationService._empty_score_data()
+            for provider_id in ids
+        }
 
-        # Calculate overall score using weighted combination
-        overall_score = ReputationService._calculate_overall_score(
-            review_score, completion_rate, total_reviews
-        )
+    @staticmethod
+    def get_overall_scores(provider_ids: List[int], db: Session) -> Dict[int, float]:
+        """
+        Materialized overall scores of the given providers (one query, for ranking)
+
+        Providers without a materialized row or without bookings are left out.
+        """
+        ids = list(set(provider_ids))
+        if not ids:
+            return {}
+        rows = db.query(ProviderReputation.provider_id, ProviderReputation.overall_score).filter(
+            ProviderReputation.provider_id.in_(ids),
+            ProviderReputation.total_bookings > 0
+        ).all()
+        return {provider_id: score for provider_id, score in rows}
+
+    @staticmethod
+    def _empty_score_data() -> Dict[str, float]:
+        """Score dict of a provider without bookings"""
+        return {
+            "overall_score": 0.0,
+            "review_score": 0.0,
+            "completion_rate": 0.0,
+            "total_reviews": 0,
+            "total_bookings": 0,
+            "completed_bookings": 0
+        }
+
+    @staticmethod
+    def _score_data(reputation: ProviderReputation) -> Dict[str, float]:
+        """Public score dict for a reputation row"""
+        if not reputation.total_bookings:
+            return ReputationService._empty_score_data()
 
         return {
-            "overall_score": round(overall_score, 2),
-            "review_score": round(review_score, 2),
-            "completion_rate": round(completion_rate, 2),
-            "total_reviews": total_reviews,
-            "total_bookings": total_bookings,
-            "completed_bookings": completed_bookings
+            "overall_score": round(reputation.overall_score, 2),
+            "review_score": round(ReputationService._review_score(reputation), 2),
+            "completion_rate": round(reputation.completed_bookings / reputation.total_bookings, 2),
+            "total_reviews": reputation.total_reviews,
+            "total_bookings": reputation.total_bookings,
+            "completed_bookings": reputation.completed_bookings
         }
 
     @staticmethod
-    def _calculate_weighted_review_score(reviews: List[Review]) -> float:
+    def _review_score(reputation: ProviderReputation) -> float:
+        # Both sums share one epoch, so the decay factor cancels in their ratio
+        return reputation.rating_sum / reputation.rating_weight if reputation.rating_weight > 0 else 0.0
+
+    @staticmethod
+    def _refresh_overall_score(reputation: ProviderReputation) -> None:
+        completion_rate = (
+            reputation.completed_bookings / reputation.total_bookings if reputation.total_bookings else 0.0
+        )
+        reputation.overall_score = ReputationService._calculate_overall_score(
+            ReputationService._review_score(reputation), completion_rate, reputation.total_reviews
+        )
+
+    @staticmethod
+    def _build_from_history(provider_id: int, db: Session) -> ProviderReputation:
         """
-        Calculate time-weighted average of reviews
-        Recent reviews have higher weight
+        Aggregate a provider's raw bookings and reviews into an (unsaved) reputation row
         """
-        if not reviews:
-            return 0.0
+        total_bookings, completed_bookings = db.query(
+            func.count(Booking.id),
+            func.coalesce(func.sum(case((Booking.status == "completed", 1), else_=0)), 0)
+        ).join(Service, Booking.service_id == Service.id).filter(Service.provider_id == provider_id).one()
+
+        reputation = ProviderReputation(
+            provider_id=provider_id,
+            total_bookings=total_bookings,
+            completed_bookings=int(completed_bookings),
+            total_reviews=0,
+            rating_sum=0.0,
+            rating_weight=0.0,
+            rating_epoch=None,
+        )
+        # Replay reviews oldest first through the same accumulator as record_review()
+        reviews = db.query(Review.rating, Review.created_at).filter(
+            Review.provider_id == provider_id
+        ).order_by(Review.created_at, Review.id).all()
+        for rating, created_at in reviews:
+            ReputationService._add_rating(reputation, rating, created_at)
+        ReputationService._refresh_overall_score(reputation)
+        return reputation
 
-        now = datetime.utcnow()
-        total_weight = 0.0
-        weighted_sum = 0.0
+    @staticmethod
+    def _add_rating(reputation: ProviderReputation, rating: float, reviewed_at: datetime) -> None:
+        """O(1): one exp() for the new term, whatever the review history length"""
+        (reputation.rating_sum, reputation.rating_weight), reputation.rating_epoch = rebased_add(
+            (reputation.rating_sum, reputation.rating_weight),
+            reputation.rating_epoch,
+            (rating, 1.0),
+            reviewed_at,
+            ReputationService.DECAY_LAMBDA
+        )
+        reputation.total_reviews += 1
 
-        for review in reviews:
-            # Calculate days since review
-            days_old = (now - review.created_at).days
-            # Exponential decay: newer reviews have higher weight
-            weight = math.exp(-ReputationService.DECAY_LAMBDA * days_old)
+    @staticmethod
+    def _locked_reputation(db: Session, provider_id: int) -> ProviderReputation:
+        """
+        The provider's reputation row, locked for update within the caller's transaction
 
-            weighted_sum += review.rating * weight
-            total_weight += weight
+        A missing row is first built from the provider's history, so the
+        incremental updates always start from a complete aggregate.
+        """
+        reputation = db.query(ProviderReputation).filter(
+            ProviderReputation.provider_id == provider_id
+        ).with_for_update().first()
+        if reputation is not None:
+            return reputation
+
+        try:
+            with db.begin_nested():
+                reputation = ReputationService._build_from_history(provider_id, db)
+                db.add(reputation)
+            return reputation
+        except IntegrityError:
+            # A concurrent write created the row first; lock that one instead
+            return db.query(ProviderReputation).filter(
+                ProviderReputation.provider_id == provider_id
+            ).with_for_update().one()
 
-        return weighted_sum / total_weight if total_weight > 0 else 0.0
+    @staticmethod
+    def record_booking(db: Session, provider_id: int) -> None:
+        """
+        Count a new booking on one of the provider's services (caller commits)
+
+        Call before the booking is flushed: a missing row is built from the
+        history, which must not include the new booking yet.
+        """
+        reputation = ReputationService._locked_reputation(db, provider_id)
+        reputation.total_bookings += 1
+        ReputationService._refresh_overall_score(reputation)
+
+    @staticmethod
+    def record_completion(db: Session, provider_id: int) -> None:
+        """
+        Count a booking that moved to completed (caller commits; call before flushing the status)
+        """
+        reputation = ReputationService._locked_reputation(db, provider_id)
+        reputation.completed_bookings += 1
+        ReputationService._refresh_overall_score(reputation)
+
+    @staticmethod
+    def record_review(db: Session, provider_id: int, rating: float, reviewed_at: datetime) -> None:
+        """
+        Fold a new review into the rebased rating sums (caller commits; call before flushing the review)
+        """
+        reputation = ReputationService._locked_reputation(db, provider_id)
+        ReputationService._add_rating(reputation, rating, reviewed_at)
+        ReputationService._refresh_overall_score(reputation)
+
+    @staticmethod
+    def remove_bookings(db: Session, provider_id: int, total: int, completed: int) -> None:
+        """
+        Forget bookings deleted with a service (caller commits)
+        """
+        if not total:
+            return
+        reputation = ReputationService._locked_reputation(db, provider_id)
+        reputation.total_bookings = max(reputation.total_bookings - total, 0)
+        reputation.completed_bookings = max(reputation.completed_bookings - completed, 0)
+        ReputationService._refresh_overall_score(reputation)
+
+    @staticmethod
+    def rebuild(db: Session, provider_id: int) -> ProviderReputation:
+        """
+        Recompute a provider's row from raw bookings and reviews (caller commits)
+        """
+        # Lock first so no booking/review write lands between the scan and the save
+        reputation = db.query(ProviderReputation).filter(
+            ProviderReputation.provider_id == provider_id
+        ).with_for_update().first()
+        fresh = ReputationService._build_from_history(provider_id, db)
+        if reputation is None:
+            db.add(fresh)
+            return fresh
+
+        for column in ("total_bookings", "completed_bookings", "total_reviews",
+                       "rating_sum", "rating_weight", "rating_epoch", "overall_score"):
+            setattr(reputation, column, getattr(fresh, column))
+        return reputation
+
+    @staticmethod
+    def verify(db: Session, provider_id: int) -> Dict[str, float]:
+        """
+        Compare a provider's stored aggregate with a full recomputation from raw rows
+
+        Reviews are re-weighted one by one with exp(-lambda * age), independently
+        of the rebased accumulator, so arithmetic drift or missed updates show up.
+
+        Returns:
+            Stored vs recomputed counts, review score and decayed weight total,
+            plus "max_drift" (largest difference, relative to the recomputed
+            value once that exceeds 1, so large weight totals are not flagged
+            for rounding in their last digits)
+        """
+        stored = db.query(ProviderReputation).filter(ProviderReputation.provider_id == provider_id).first()
+        fresh = ReputationService._build_from_history(provider_id, db)
+
+        now = datetime.utcnow()
+        reviews = db.query(Review.rating, Review.created_at).filter(Review.provider_id == provider_id).all()
+        weights = [
+            math.exp(-ReputationService.DECAY_LAMBDA * (now - created_at).total_seconds() / 86400.0)
+            for _, created_at in reviews
+        ]
+        weight_total = sum(weights)
+        review_score = sum(rating * w for (rating, _), w in zip(reviews, weights)) / weight_total if weight_total else 0.0
+
+        stored_weight = decayed_value(stored.rating_weight, stored.rating_epoch, now, ReputationService.DECAY_LAMBDA) if stored else 0.0
+        stored_score = ReputationService._review_score(stored) if stored else 0.0
+        comparisons = {
+            "total_bookings": (stored.total_bookings if stored else 0, fresh.total_bookings),
+            "completed_bookings": (stored.completed_bookings if stored else 0, fresh.completed_bookings),
+            "total_reviews": (stored.total_reviews if stored else 0, len(reviews)),
+            "review_score": (stored_score, review_score),
+            "decayed_weight": (stored_weight, weight_total),
+        }
+        report = {"provider_id": provider_id, "materialized": stored is not None, **comparisons}
+        report["max_drift"] = max(abs(a - b) / max(abs(b), 1.0) for a, b in comparisons.values())
+        return report
 
     @staticmethod
     def _calculate_overall_score(review_score: float, completion_rate: float, total_reviews: int) -> float:
@@ -126,26 +322,50 @@ class ReputationService:
         return min(max(adjusted_score, 0.0), 5.0)
 
     @staticmethod
-    def get_top_providers(db: Session, limit: int = 10) -> List[Dict]:
+    def get_top_providers(
+        db: Session,
+        limit: int = 10,
+        offset: int = 0,
+        category: Optional[str] = None,
+        lat: Optional[float] = None,
+        lng: Optional[float] = None
+    ) -> List[Dict]:
         """
         Get top-rated providers with their scores
-        """
-        providers = db.query(User).join(Service, User.id == Service.provider_id).distinct().all()
-
-        provider_scores = []
-        for provider in providers:
-            score_data = ReputationService.calculate_provider_score(provider.id, db)
-            if score_data["total_bookings"] > 0:  # Only include active providers
-                provider_scores.append({
-                    "provider_id": provider.id,
-                    "provider_name": provider.name,
-                    "score_data": score_data
-                })
-
-        # Sort by overall score descending
-        provider_scores.sort(key=lambda x: x["score_data"]["overall_score"], reverse=True)
 
-        return provider_scores[:limit]
+        Without filters this is one indexed read of the materialized scores
+        (migrate_db.py materializes providers with history from before the
+        table existed). With a category and/or location the page comes
+        from the matching leaderboard (see app/core/leaderboard.py).
+        """
+        if category or (lat is not None and lng is not None):
+            ranked, _ = leaderboard.top(db, category=category, lat=lat, lng=lng, offset=offset, limit=limit)
+            if not ranked:
+                return []
+            rows = db.query(ProviderReputation, User.name).join(
+                User, User.id == ProviderReputation.provider_id
+            ).filter(
+                ProviderReputation.provider_id.in_([provider_id for provider_id, _ in ranked])
+            ).all()
+            by_id = {reputation.provider_id: (reputation, name) for reputation, name in rows}
+            rows = [by_id[provider_id] for provider_id, _ in ranked if provider_id in by_id]
+        else:
+            rows = db.query(ProviderReputation, User.name).join(
+                User, User.id == ProviderReputation.provider_id
+            ).filter(
+                ProviderReputation.total_bookings > 0  # Only include active providers
+            ).order_by(
+                ProviderReputation.overall_score.desc(), ProviderReputation.provider_id
+            ).offset(offset).limit(limit).all()
+
+        return [
+            {
+                "provider_id": reputation.provider_id,
+                "provider_name": name,
+                "score_data": ReputationService._score_data(reputation)
+            }
+            for reputation, name in rows
+        ]
 
     @staticmethod
     def add_review(db: Session, booking_id: int, seeker_id: int, rating: float, comment: str = None) -> Review:
@@ -167,17 +387,24 @@ class ReputationService:
             raise ValueError("Review already exists for this booking")
 
         # Create review
+        rating = max(1.0, min(5.0, rating))  # Clamp to 1-5 range
+        provider_id = booking.service.provider_id
+        # The aggregate and the stored review share one timestamp, so verify() can replay it exactly
+        reviewed_at = datetime.utcnow()
+        ReputationService.record_review(db, provider_id, rating, reviewed_at)
         review = Review(
             booking_id=booking_id,
-            provider_id=booking.service.provider_id,
+            provider_id=provider_id,
             seeker_id=seeker_id,
-            rating=max(1.0, min(5.0, rating)),  # Clamp to 1-5 range
-            comment=comment
+            rating=rating,
+            comment=comment,
+            created_at=reviewed_at
         )
 
         db.add(review)
         db.commit()
         db.refresh(review)
+        leaderboard.update_provider(db, provider_id)
 
         return review
 
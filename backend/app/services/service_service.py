@@ -1,41 +1,75 @@
 from sqlalchemy.orm import Session
+from sqlalchemy.dialects.mysql import match
 from sqlalchemy import or_
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
 from app.models.service import Service
+from app.models.booking import Booking
 from app.schemas.service import ServiceCreate, ServiceUpdate
-from app.core.location_engine import get_h3_index
-from app.core.search_engine import search_engine
+from app.core.location_engine import get_h3_indexes
+from app.core.vector_index import vector_index
+from app.core.ann_index import ann_index
+from app.core.text_index import text_index, tokenize
+from app.core.embedding_worker import embedding_worker
+from app.core.cache import cache_manager
+from app.services.embedding_service import enqueue_embedding
+from app.services.reputation_service import reputation_service
+from app.core.leaderboard import leaderboard
+from app.core.pagination import paginate
+
+# innodb_ft_min_token_size of the MySQL server: shorter words are not in the FULLTEXT index
+FT_MIN_TOKEN_SIZE = int(os.getenv("FT_MIN_TOKEN_SIZE", 3))
+# InnoDB's default full-text stopwords (INFORMATION_SCHEMA.INNODB_FT_DEFAULT_STOPWORD):
+# never indexed, so MATCH cannot find them either
+INNODB_FT_STOPWORDS = frozenset({
+    "a", "about", "an", "are", "as", "at", "be", "by", "com", "de", "en", "for", "from", "how", "i",
+    "in", "is", "it", "la", "of", "on", "or", "that", "the", "this", "to", "was", "what", "when",
+    "where", "who", "will", "with", "und", "www",
+})
+
+
+def _set_location(svc: Service, latitude: float | None, longitude: float | None) -> None:
+    """Store coordinates together with their H3 cells at every search resolution"""
+    svc.latitude = latitude
+    svc.longitude = longitude
+    if latitude is not None and longitude is not None:
+        cells = get_h3_indexes(latitude, longitude)
+        svc.h3_index, svc.h3_res7, svc.h3_res5 = cells[9], cells[7], cells[5]
+    else:
+        svc.h3_index = svc.h3_res7 = svc.h3_res5 = None
+
+
+def _invalidate_search_cache(*cells: str | None) -> None:
+    """Drop cached searches covering the given res-5 cells (old and new location of a service)"""
+    cache_manager.invalidate_tags([cell for cell in cells if cell])
 
 
 def create(db: Session, provider_id: int, data: ServiceCreate) -> Service:
     logger.info(f"Creating service for provider {provider_id} with data: {data.dict()}")
-    # Generate H3 index if location provided
-    h3_index = None
-    if data.latitude is not None and data.longitude is not None:
-        h3_index = get_h3_index(data.latitude, data.longitude)
-    
-    # Generate semantic embedding
-    search_text = f"{data.title} {data.description or ''}"
-    embedding = search_engine.generate_embedding(search_text)
-    
     svc = Service(
         provider_id=provider_id,
         title=data.title.strip(),
         description=data.description.strip() if data.description else None,
         category=data.category.strip() if data.category else None,
-        latitude=data.latitude,
-        longitude=data.longitude,
         price=data.price,
-        h3_index=h3_index,
-        embedding=embedding,
         status="active",
+        embedding_status="pending",
     )
+    # Generate H3 indexes if location provided
+    _set_location(svc, data.latitude, data.longitude)
     db.add(svc)
+    db.flush()
+    # The embedding is computed by the background worker, not inside this request
+    enqueue_embedding(db, svc.id)
     db.commit()
     db.refresh(svc)
+    embedding_worker.notify()
+    text_index.upsert(svc.id, svc.title, svc.description, svc.category)
+    _invalidate_search_cache(svc.h3_res5)
+    leaderboard.update_provider(db, provider_id)
     return svc
 
 
@@ -47,25 +81,95 @@ def list_services(
     provider_id: int | None = None,
     skip: int = 0,
     limit: int = 100,
-) -> list[Service]:
+    cursor: str | None = None,
+) -> tuple[list[Service], str | None]:
+    """
+    List active services, newest first, or by keyword relevance when q is given
+
+    Keyword matching uses the MySQL FULLTEXT index on title, description and
+    category; other databases (SQLite in development) use the in-process
+    BM25 text index. Query words also match as prefixes ("plumb" finds
+    "plumber"). A q made only of stopwords or punctuation matches nothing.
+
+    InnoDB does not index words shorter than innodb_ft_min_token_size
+    (FT_MIN_TOKEN_SIZE here, default 3) nor its stopwords, so on MySQL such
+    query words ("tv", "ac", "www") fall back to a substring LIKE match, OR-ed
+    with the full-text match of the other words. Only those queries scan with a
+    leading wildcard. A server with a custom stopword table needs
+    INNODB_FT_STOPWORDS to match it.
+
+    The newest-first listing is keyset-paginated with cursor; relevance-ordered
+    keyword results page with skip.
+
+    Returns:
+        (services, next_cursor); next_cursor is None on the last page or for keyword results
+
+    Raises:
+        ValueError: The cursor is malformed
+    """
     qry = db.query(Service).filter(Service.status == "active")
-    if q:
-        term = f"%{q.strip()}%"
-        qry = qry.filter(
-            or_(
-                Service.title.ilike(term),
-                (Service.description.isnot(None)) & (Service.description.ilike(term)),
-                (Service.category.isnot(None)) & (Service.category.ilike(term)),
-            )
-        )
     if category:
         qry = qry.filter(Service.category.ilike(category.strip()))
     if provider_id is not None:
         qry = qry.filter(Service.provider_id == provider_id)
-    qry = qry.order_by(Service.created_at.desc())
+
+    # Tokenizing also strips full-text operators (+, -, ", *) from user input
+    tokens = tokenize(q)
+    if not tokens:
+        if q and q.strip():
+            return [], None  # nothing searchable in q, e.g. only stopwords
+        return paginate(qry, Service.created_at, Service.id, cursor, limit, offset=skip)
+
+    if db.get_bind().dialect.name == "mysql":
+        return _list_by_fulltext(qry, tokens, skip, limit), None
+
+    return _list_by_text_index(db, qry, " ".join(tokens), skip, limit), None
+
+
+def _ft_indexed(token: str) -> bool:
+    return len(token) >= FT_MIN_TOKEN_SIZE and token not in INNODB_FT_STOPWORDS
+
+
+def _list_by_fulltext(qry, tokens: list[str], skip: int, limit: int) -> list[Service]:
+    """Keyword listing on MySQL: FULLTEXT prefix match, LIKE for words InnoDB does not index"""
+    indexed = [token for token in tokens if _ft_indexed(token)]
+    conditions = []
+    order_by = []
+    if indexed:
+        against = " ".join(f"{token}*" for token in indexed)
+        relevance = match(Service.title, Service.description, Service.category, against=against).in_boolean_mode()
+        conditions.append(relevance)
+        order_by.append(relevance.desc())
+    for token in tokens:
+        if not _ft_indexed(token):
+            term = f"%{token}%"  # tokens are alphanumeric, so no LIKE wildcards slip through
+            conditions.append(or_(
+                Service.title.ilike(term),
+                Service.description.ilike(term),
+                Service.category.ilike(term),
+            ))
+    qry = qry.filter(or_(*conditions)).order_by(*order_by, Service.created_at.desc())
     return qry.offset(skip).limit(limit).all()
 
 
+def _list_by_text_index(db: Session, qry, term: str, skip: int, limit: int) -> list[Service]:
+    """Keyword listing for databases without a full-text index: BM25 hits, filtered in SQL"""
+    text_index.ensure_loaded(db)
+    hits = dict(text_index.search(term, len(text_index), prefix=True))
+    if not hits:
+        return []
+
+    # Apply the remaining filters to the matching ids only, then page by relevance
+    ids = [service_id for (service_id,) in qry.with_entities(Service.id).filter(Service.id.in_(hits)).all()]
+    ids.sort(key=lambda service_id: hits[service_id], reverse=True)
+    page = ids[skip:skip + limit]
+    if not page:
+        return []
+
+    by_id = {svc.id: svc for svc in db.query(Service).filter(Service.id.in_(page)).all()}
+    return [by_id[service_id] for service_id in page if service_id in by_id]
+
+
 def get_by_id(db: Session, service_id: int) -> Service | None:
     return db.query(Service).filter(Service.id == service_id).first()
 
@@ -76,6 +180,7 @@ def update(db: Session, service_id: int, user_id: int, data: ServiceUpdate) -> S
         return None
     
     content_changed = False
+    previous_cell = svc.h3_res5
     
     if data.title is not None:
         svc.title = data.title.strip()
@@ -87,26 +192,56 @@ def update(db: Session, service_id: int, user_id: int, data: ServiceUpdate) -> S
         svc.category = data.category.strip() if data.category else None
     if data.status is not None:
         svc.status = data.status
+    if data.latitude is not None or data.longitude is not None:
+        _set_location(
+            svc,
+            data.latitude if data.latitude is not None else svc.latitude,
+            data.longitude if data.longitude is not None else svc.longitude,
+        )
     
-    # Regenerate embedding if content changed
+    # Queue re-embedding if content changed; the old vector keeps serving until it is replaced
     if content_changed:
-        search_text = f"{svc.title} {svc.description or ''}"
-        svc.embedding = search_engine.generate_embedding(search_text)
+        svc.embedding_status = "pending"
+        enqueue_embedding(db, svc.id)
     
     db.commit()
     db.refresh(svc)
+    if content_changed:
+        embedding_worker.notify()
+    if svc.status == "active":
+        ann_index.add(svc.id)
+        text_index.upsert(svc.id, svc.title, svc.description, svc.category)
+    else:
+        ann_index.remove(svc.id)
+        text_index.remove(svc.id)
+    _invalidate_search_cache(previous_cell, svc.h3_res5)
+    # Category, location or status changes move the provider between leaderboards
+    leaderboard.update_provider(db, user_id)
     return svc
 
 
 def delete(db: Session, service_id: int, user_id: int) -> bool:
-    svc = get_by_id(db, service_id)
+    # Lock the service row before the reputation row, in the same order as booking_service
+    svc = db.query(Service).filter(Service.id == service_id).with_for_update().first()
     if not svc or svc.provider_id != user_id:
+        db.rollback()
         return False
+    cell = svc.h3_res5
+    # The service's bookings are deleted with it; take them out of the provider's reputation
+    statuses = [status for (status,) in db.query(Booking.status).filter(Booking.service_id == service_id).all()]
+    reputation_service.remove_bookings(db, user_id, len(statuses), statuses.count("completed"))
     db.delete(svc)
     db.commit()
+    vector_index.remove(service_id)
+    ann_index.remove(service_id)
+    text_index.remove(service_id)
+    _invalidate_search_cache(cell)
+    leaderboard.update_provider(db, user_id)
     return True
 
 
-def get_all_services(db: Session, skip: int = 0, limit: int = 100) -> list[Service]:
-    """Fetches all services with no filters, used for admin or full list views."""
-    return db.query(Service).order_by(Service.created_at.desc()).offset(skip).limit(limit).all()
+def get_all_services(
+    db: Session, skip: int = 0, limit: int = 100, cursor: str | None = None
+) -> tuple[list[Service], str | None]:
+    """Fetches all services with no filters, used for admin or full list views. Newest first, keyset-paginated."""
+    return paginate(db.query(Service), Service.created_at, Service.id, cursor, limit, offset=skip)
@@ -1,52 +1,219 @@
 """
 Backfill script to generate embeddings for existing services
 Run this after migration to populate embeddings for all existing services
+
+Streams the services table in id order, embeds rows in batched API calls with a
+bounded number of concurrent requests, commits after every chunk and records a
+checkpoint, so an interrupted run resumes where it stopped:
+
+    python backfill_embeddings.py                   # embed rows that have no embedding
+    python backfill_embeddings.py --all --reset     # re-embed everything
+
+Rows embedded by a different model than the configured EMBEDDING_BACKEND count
+as missing, so switching backends only needs a normal run.
 """
-from sqlalchemy.orm import Session
+import argparse
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from sqlalchemy import or_, and_
+from sqlalchemy.orm import Session, defer
+
 from app.db.database import SessionLocal
 from app.models.service import Service
+from app.models import user, booking, review, chat_message, payment  # noqa: F401 - register related mappers
 from app.core.search_engine import search_engine
-from app.core.location_engine import get_h3_index
-import logging
+from app.core.location_engine import get_h3_indexes
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DEFAULT_CHECKPOINT = ".backfill_checkpoint.json"
+
+
+class RateLimiter:
+    """Spaces API calls across all worker threads to at most `rate` per second"""
+
+    def __init__(self, rate: float):
+        self._interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self._interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self._interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def load_checkpoint(path: str) -> dict:
+    if not os.path.exists(path):
+        return {"last_id": 0, "processed": 0, "embedded": 0}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    """Write the checkpoint atomically so a crash never leaves a torn file"""
+    checkpoint["updated_at"] = datetime.now(timezone.utc).isoformat()
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
 
-def backfill_embeddings():
-    """Generate embeddings for all existing services"""
+
+def embed_with_retry(texts: list[str], limiter: RateLimiter, max_retries: int) -> list[list[float]]:
+    """Embed one batch, retrying transient failures with exponential backoff and jitter"""
+    for attempt in range(max_retries + 1):
+        limiter.wait()
+        try:
+            return search_engine.embed_documents(texts)
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = min(60.0, 2 ** attempt) * (0.5 + random.random())
+            logger.warning(f"Embedding batch failed ({e}); retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def backfill_embeddings(
+    batch_size: int = 50,
+    concurrency: int = 4,
+    chunk_size: int = 500,
+    rate: float = 10.0,
+    max_retries: int = 5,
+    checkpoint_path: str = DEFAULT_CHECKPOINT,
+    reembed_all: bool = False,
+    reset: bool = False,
+):
+    """
+    Generate embeddings (and missing H3 indexes) for existing services
+
+    Args:
+        batch_size: Texts per embedding API call
+        concurrency: Embedding calls in flight at once
+        chunk_size: Rows fetched, embedded and committed per step
+        rate: Max embedding API calls per second (0 = unlimited)
+        max_retries: Retries per batch before the run stops (it can then be resumed)
+        checkpoint_path: File recording the last committed service id
+        reembed_all: Re-embed every service, not only those without an embedding
+        reset: Ignore an existing checkpoint and start from the first row
+    """
     db: Session = SessionLocal()
-    
+    checkpoint = {"last_id": 0, "processed": 0, "embedded": 0} if reset else load_checkpoint(checkpoint_path)
+    if checkpoint["last_id"]:
+        logger.info(f"Resuming after service #{checkpoint['last_id']}")
+
+    # Vectors from another model are as good as missing: they are never compared with this model's queries
+    stale = or_(
+        Service.embedding.is_(None),
+        Service.embedding_model.is_(None),
+        Service.embedding_model != search_engine.model_id,
+    )
+    needs_work = or_(
+        stale,
+        and_(Service.latitude.isnot(None), Service.longitude.isnot(None),
+             or_(Service.h3_index.is_(None), Service.h3_res7.is_(None), Service.h3_res5.is_(None))),
+    )
+    # Only the staleness check is needed, so leave the embedding blob itself unloaded
+    base_query = db.query(Service, stale.label("missing")).options(defer(Service.embedding))
+    if not reembed_all:
+        base_query = base_query.filter(needs_work)
+
+    remaining = base_query.filter(Service.id > checkpoint["last_id"]).count()
+    logger.info(f"Found {remaining} services to process")
+
+    limiter = RateLimiter(rate)
+    started = time.monotonic()
+    run_processed = 0
+    run_embedded = 0
+
     try:
-        # Get all services
-        services = db.query(Service).all()
-        logger.info(f"Found {len(services)} services to process")
-        
-        updated_count = 0
-        for service in services:
-            # Generate embedding if missing
-            if not service.embedding:
-                search_text = f"{service.title} {service.description or ''}"
-                service.embedding = search_engine.generate_embedding(search_text)
-                updated_count += 1
-                logger.info(f"Generated embedding for service #{service.id}: {service.title}")
-            
-            # Generate H3 index if location exists but H3 missing
-            if service.latitude and service.longitude and not service.h3_index:
-                service.h3_index = get_h3_index(service.latitude, service.longitude)
-                logger.info(f"Generated H3 index for service #{service.id}")
-        
-        # Commit all changes
-        db.commit()
-        logger.info(f"✅ Backfill complete! Updated {updated_count} services")
-        
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            while True:
+                # Keyset pagination: constant cost per page, unaffected by rows updated behind us
+                rows = base_query.filter(Service.id > checkpoint["last_id"]).order_by(Service.id).limit(chunk_size).all()
+                if not rows:
+                    break
+
+                services = [service for service, _ in rows]
+                to_embed = [service for service, missing in rows if missing or reembed_all]
+                texts = [f"{s.title} {s.description or ''}" for s in to_embed]
+                batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+                vectors = [v for batch in pool.map(lambda b: embed_with_retry(b, limiter, max_retries), batches) for v in batch]
+                for service, vector in zip(to_embed, vectors):
+                    service.embedding = vector
+                    service.embedding_model = search_engine.model_id
+                    service.embedding_status = "ready"
+
+                # Generate H3 indexes if location exists but any resolution is missing
+                for service in services:
+                    has_location = service.latitude is not None and service.longitude is not None
+                    if has_location and not (service.h3_index and service.h3_res7 and service.h3_res5):
+                        cells = get_h3_indexes(service.latitude, service.longitude)
+                        service.h3_index, service.h3_res7, service.h3_res5 = cells[9], cells[7], cells[5]
+
+                # Commit the chunk before advancing the checkpoint past it
+                db.commit()
+                checkpoint["last_id"] = services[-1].id
+                checkpoint["processed"] += len(services)
+                checkpoint["embedded"] += len(to_embed)
+                save_checkpoint(checkpoint_path, checkpoint)
+                db.expunge_all()
+
+                run_processed += len(services)
+                run_embedded += len(to_embed)
+                elapsed = max(time.monotonic() - started, 1e-9)
+                rate_now = run_processed / elapsed
+                eta = (remaining - run_processed) / rate_now if rate_now else 0
+                logger.info(
+                    f"Committed through service #{checkpoint['last_id']}: "
+                    f"{run_processed}/{remaining} rows, {run_embedded / elapsed:.1f} embeddings/s, "
+                    f"ETA {eta:.0f}s"
+                )
+
+        logger.info(f"✅ Backfill complete! Updated {run_embedded} embeddings in {time.monotonic() - started:.1f}s")
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
     except Exception as e:
         logger.error(f"❌ Error during backfill: {e}")
+        logger.error(f"Progress is saved through service #{checkpoint['last_id']}; re-run to resume")
         db.rollback()
     finally:
         db.close()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill service embeddings and H3 indexes")
+    parser.add_argument("--batch-size", type=int, default=50, help="Texts per embedding API call (max 100)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Embedding calls in flight at once")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Rows committed per checkpoint")
+    parser.add_argument("--rate", type=float, default=10.0, help="Max embedding calls per second (0 = unlimited)")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries per batch before stopping")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="Checkpoint file path")
+    parser.add_argument("--all", action="store_true", help="Re-embed every service, even if already embedded by the current model")
+    parser.add_argument("--reset", action="store_true", help="Ignore the checkpoint and start over")
+    args = parser.parse_args()
+
     logger.info("🚀 Starting embedding backfill...")
-    backfill_embeddings()
+    backfill_embeddings(
+        batch_size=min(args.batch_size, 100),
+        concurrency=args.concurrency,
+        chunk_size=args.chunk_size,
+        rate=args.rate,
+        max_retries=args.max_retries,
+        checkpoint_path=args.checkpoint,
+        reembed_all=args.all,
+        reset=args.reset,
+    )
@@ -0,0 +1,59 @@
+"""
+Backfill script to materialize provider reputation scores
+migrate_db.py runs it for providers without a row yet, so providers with
+bookings from before the provider_reputation table existed show up in /reviews/top
+
+Afterwards the rows are kept current by booking and review writes; rerun to
+rebuild everything (scores and leaderboards) from the raw bookings and reviews:
+
+    python backfill_reputation.py
+"""
+import logging
+
+from app.db.database import SessionLocal, engine
+from app.models.service import Service
+from app.models.provider_reputation import ProviderReputation
+from app.models import user, booking, review, chat_message, payment, provider_reputation  # noqa: F401 - register related mappers
+from app.services.reputation_service import reputation_service
+from app.core.leaderboard import leaderboard
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def backfill_reputation(chunk_size: int = 200, missing_only: bool = False):
+    """
+    Rebuild the reputation row of every provider with a service, committing per chunk
+
+    Args:
+        missing_only: Only materialize providers that have no row yet
+    """
+    provider_reputation.Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        query = db.query(Service.provider_id).distinct().order_by(Service.provider_id)
+        if missing_only:
+            query = query.outerjoin(
+                ProviderReputation, ProviderReputation.provider_id == Service.provider_id
+            ).filter(ProviderReputation.provider_id.is_(None))
+        provider_ids = [provider_id for (provider_id,) in query]
+        logger.info(f"Rebuilding reputation for {len(provider_ids)} providers")
+        if missing_only and not provider_ids:
+            return
+
+        for i in range(0, len(provider_ids), chunk_size):
+            for provider_id in provider_ids[i:i + chunk_size]:
+                reputation_service.rebuild(db, provider_id)
+            db.commit()
+            logger.info(f"✅ {min(i + chunk_size, len(provider_ids))}/{len(provider_ids)} providers")
+
+        leaderboard.rebuild(db)
+    finally:
+        db.close()
+
+    logger.info("🎉 Reputation backfill complete!")
+
+
+if __name__ == "__main__":
+    backfill_reputation()
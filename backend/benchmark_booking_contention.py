@@ -0,0 +1,151 @@
+"""
+Contention benchmark for booking creation
+Fires many concurrent booking requests at one service, every one of them
+overlapping the others, and checks that the database ends up with no two
+active bookings of the service overlapping in time
+
+    python benchmark_booking_contention.py                       # 50 threads, 200 requests
+    python benchmark_booking_contention.py --threads 100 --requests 1000 --slots 20
+
+Runs against DATABASE_URL and leaves its benchmark users, service and
+bookings behind (all named bench-<run id>). Exits with status 1 when a
+double booking was found or a request failed with an unexpected error.
+"""
+import argparse
+import logging
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_
+from sqlalchemy.orm import aliased
+
+from app.db.database import Base, SessionLocal, engine
+from app.models.booking import Booking
+from app.models.service import Service
+from app.models.user import User
+from app.models import review, chat_message, payment, provider_reputation  # noqa: F401 - register related mappers
+from app.schemas.booking import BookingCreate
+from app.services import booking_service
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def setup(run_id: str, seekers: int):
+    """Create a provider, `seekers` seekers and one active service"""
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        provider = User(username=f"bench-{run_id}-p", name="Benchmark provider", email=f"bench-{run_id}-p@example.com", hashed_password="-")
+        seeker_users = [
+            User(username=f"bench-{run_id}-s{i}", name="Benchmark seeker", email=f"bench-{run_id}-s{i}@example.com", hashed_password="-")
+            for i in range(seekers)
+        ]
+        db.add(provider)
+        db.add_all(seeker_users)
+        db.flush()
+        service = Service(provider_id=provider.id, title=f"bench-{run_id}", category="Benchmark", price=10.0, status="active")
+        db.add(service)
+        db.commit()
+        return service.id, [seeker.id for seeker in seeker_users]
+    finally:
+        db.close()
+
+
+def book(service_id: int, seeker_id: int, slot_start: datetime, slot_end: datetime):
+    """One booking request in its own session, as the API would run it: (outcome, seconds)"""
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        booking_service.create(db, seeker_id, BookingCreate(service_id=service_id, slot_start=slot_start, slot_end=slot_end))
+        return "accepted", time.perf_counter() - started
+    except ValueError:
+        return "rejected", time.perf_counter() - started
+    except Exception as e:
+        logger.error(f"Booking request failed: {e}")
+        db.rollback()
+        return "failed", time.perf_counter() - started
+    finally:
+        db.close()
+
+
+def count_double_bookings(service_id: int) -> int:
+    """Pairs of active bookings of the service that overlap in time"""
+    other = aliased(Booking)
+    active = ["pending", "confirmed"]
+    db = SessionLocal()
+    try:
+        return db.query(Booking).join(other, and_(
+            other.service_id == Booking.service_id,
+            other.id > Booking.id,
+            other.status.in_(active),
+            other.slot_start < Booking.slot_end,
+            other.slot_end > Booking.slot_start,
+        )).filter(
+            Booking.service_id == service_id,
+            Booking.status.in_(active),
+        ).count()
+    finally:
+        db.close()
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+def run(threads: int, requests: int, slots: int) -> int:
+    """
+    Run the benchmark
+
+    Requests pick one of `slots` hour-long slots, shifted by a random 0-59
+    minutes, so each request overlaps its own slot and usually a neighbour.
+
+    Returns:
+        Number of double bookings found plus failed requests
+    """
+    run_id = uuid.uuid4().hex[:8]
+    service_id, seeker_ids = setup(run_id, seekers=min(threads, 20))
+    logger.info(f"Run {run_id}: {requests} requests from {threads} threads on service {service_id}")
+
+    base = datetime.utcnow().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+    jobs = []
+    for _ in range(requests):
+        slot_start = base + timedelta(hours=random.randrange(slots), minutes=random.randrange(60))
+        jobs.append((service_id, random.choice(seeker_ids), slot_start, slot_start + timedelta(hours=1)))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(lambda job: book(*job), jobs))
+    elapsed = time.perf_counter() - started
+
+    latencies = [seconds for _, seconds in results]
+    outcomes = Counter(outcome for outcome, _ in results)
+    logger.info(
+        f"✅ {outcomes['accepted']} accepted, {outcomes['rejected']} rejected as overlapping, "
+        f"{outcomes['failed']} failed in {elapsed:.2f}s ({len(results) / elapsed:.0f} req/s)"
+    )
+    logger.info(f"Latency p50 {percentile(latencies, 50) * 1000:.1f} ms, p95 {percentile(latencies, 95) * 1000:.1f} ms, max {max(latencies) * 1000:.1f} ms")
+
+    double_bookings = count_double_bookings(service_id)
+    if double_bookings:
+        logger.error(f"❌ {double_bookings} overlapping pairs of active bookings")
+    else:
+        logger.info("🎉 No double bookings")
+    return double_bookings + outcomes["failed"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=50, help="Concurrent booking requests")
+    parser.add_argument("--requests", type=int, default=200, help="Total booking requests")
+    parser.add_argument("--slots", type=int, default=10, help="Distinct hour-long slots requested")
+    args = parser.parse_args()
+
+    sys.exit(1 if run(args.threads, args.requests, args.slots) else 0)
@@ -4,6 +4,8 @@ Run this after updating the codebase to add new fields to existing services tabl
 """
 from sqlalchemy import text
 from app.db.database import engine
+from app.core.embedding_codec import encode_embedding, decode_embedding, is_packed
+from backfill_reputation import backfill_reputation
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -16,7 +18,9 @@ def migrate_database():
     with engine.connect() as conn:
         # Check existing columns
         result = conn.execute(text("DESCRIBE services"))
-        existing_columns = [row[0] for row in result.fetchall()]
+        column_rows = result.fetchall()
+        existing_columns = [row[0] for row in column_rows]
+        column_types = {row[0]: str(row[1]).lower() for row in column_rows}
         logger.info(f"Existing columns: {existing_columns}")
 
         # Check existing indexes
@@ -37,14 +41,39 @@ def migrate_database():
             migrations.append("ALTER TABLE services ADD COLUMN longitude DOUBLE")
         if 'h3_index' not in existing_columns:
             migrations.append("ALTER TABLE services ADD COLUMN h3_index VARCHAR(20)")
+        if 'h3_res7' not in existing_columns:
+            migrations.append("ALTER TABLE services ADD COLUMN h3_res7 VARCHAR(20)")
+        if 'h3_res5' not in existing_columns:
+            migrations.append("ALTER TABLE services ADD COLUMN h3_res5 VARCHAR(20)")
 
-        # Add embedding column if not exists
+        # Add embedding column if not exists, or convert the legacy JSON column to a blob
+        # (existing JSON values survive as text and are repacked below)
         if 'embedding' not in existing_columns:
-            migrations.append("ALTER TABLE services ADD COLUMN embedding JSON")
+            migrations.append("ALTER TABLE services ADD COLUMN embedding BLOB")
+        elif column_types['embedding'] == 'json':
+            migrations.append("ALTER TABLE services MODIFY COLUMN embedding BLOB")
+
+        # Tag existing vectors with the model that produced them (Gemini was the only one)
+        if 'embedding_model' not in existing_columns:
+            migrations.append("ALTER TABLE services ADD COLUMN embedding_model VARCHAR(100)")
+            migrations.append("UPDATE services SET embedding_model = 'models/text-embedding-004' WHERE embedding IS NOT NULL")
+
+        # Embeddings are computed by the background worker; rows embedded so far are ready
+        if 'embedding_status' not in existing_columns:
+            migrations.append("ALTER TABLE services ADD COLUMN embedding_status VARCHAR(20) NOT NULL DEFAULT 'pending'")
+            migrations.append("UPDATE services SET embedding_status = 'ready' WHERE embedding IS NOT NULL")
 
         # Add index on h3_index if not exists
         if 'idx_h3_index' not in existing_indexes:
             migrations.append("CREATE INDEX idx_h3_index ON services(h3_index)")
+        if 'idx_h3_res7' not in existing_indexes:
+            migrations.append("CREATE INDEX idx_h3_res7 ON services(h3_res7)")
+        if 'idx_h3_res5' not in existing_indexes:
+            migrations.append("CREATE INDEX idx_h3_res5 ON services(h3_res5)")
+
+        # Full-text index for keyword listing (replaces leading-wildcard LIKE scans)
+        if 'ft_services_text' not in existing_indexes:
+            migrations.append("CREATE FULLTEXT INDEX ft_services_text ON services(title, description, category)")
 
         for migration_sql in migrations:
             try:
@@ -56,8 +85,75 @@ def migrate_database():
                 logger.error(f"❌ Error: {e}")
                 # Continue with other migrations
 
+        add_pagination_indexes(conn)
+        repack_embeddings(conn)
+
+    # Materialize reputation for providers with history from before provider_reputation existed
+    backfill_reputation(missing_only=True)
+
     logger.info("🎉 Migration complete!")
 
 
+# Composite indexes backing keyset (cursor) pagination and the booking overlap check:
+# table -> {index name: columns}
+PAGINATION_INDEXES = {
+    "services": {
+        "ix_services_created_id": "created_at, id",
+        "ix_services_status_created_id": "status, created_at, id",
+    },
+    "bookings": {
+        "ix_bookings_seeker_slot_id": "seeker_id, slot_start, id",
+        "ix_bookings_service_slot_id": "service_id, slot_start, id",
+        # Not for pagination: backs the overlap check when booking a slot
+        "ix_bookings_service_status_slot": "service_id, status, slot_start, slot_end",
+    },
+    "chat_messages": {
+        "ix_chat_messages_booking_created_id": "booking_id, created_at, id",
+    },
+}
+
+
+def add_pagination_indexes(conn):
+    """Create the composite (filter, sort key, id) indexes used by cursor pagination and booking"""
+    for table, indexes in PAGINATION_INDEXES.items():
+        existing_indexes = {row[2] for row in conn.execute(text(f"SHOW INDEX FROM {table}")).fetchall()}
+        for name, columns in indexes.items():
+            if name in existing_indexes:
+                continue
+            migration_sql = f"CREATE INDEX {name} ON {table}({columns})"
+            try:
+                logger.info(f"Executing: {migration_sql}")
+                conn.execute(text(migration_sql))
+                conn.commit()
+                logger.info("✅ Success")
+            except Exception as e:
+                logger.error(f"❌ Error: {e}")
+
+
+def repack_embeddings(conn, chunk_size: int = 500):
+    """Rewrite embeddings still stored as JSON text into the packed binary format, one chunk at a time"""
+    last_id = 0
+    repacked = 0
+    while True:
+        rows = conn.execute(
+            text("SELECT id, embedding FROM services WHERE id > :last_id AND embedding IS NOT NULL ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": chunk_size}
+        ).fetchall()
+        if not rows:
+            break
+
+        for service_id, raw in rows:
+            if not is_packed(raw):
+                conn.execute(
+                    text("UPDATE services SET embedding = :embedding WHERE id = :id"),
+                    {"embedding": encode_embedding(decode_embedding(raw)), "id": service_id}
+                )
+                repacked += 1
+        conn.commit()
+        last_id = rows[-1][0]
+
+    logger.info(f"Repacked {repacked} JSON embeddings into binary")
+
+
 if __name__ == "__main__":
     migrate_database()
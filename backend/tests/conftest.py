@@ -0,0 +1,48 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.cache import CacheManager
+from app.db.database import Base
+from app.models import user, service, booking, review, audit_log, chat_message, payment, embedding_job, provider_reputation  # noqa: F401 - register every table
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """Sessions on a fresh SQLite file, so separate sessions get separate connections like in production"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def fake_redis_server():
+    fakeredis = pytest.importorskip("fakeredis")
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def cache_factory(fake_redis_server):
+    """Build CacheManagers of their own (not the process-wide singleton) sharing one fake Redis"""
+    import fakeredis
+
+    server = fake_redis_server
+    managers = []
+
+    def make():
+        manager = object.__new__(CacheManager)
+        manager.__init__()
+        manager._redis_client = fakeredis.FakeRedis(server=server)
+        manager._async_client = fakeredis.FakeAsyncRedis(server=server)
+        managers.append(manager)
+        return manager
+
+    yield make
+    for manager in managers:
+        manager.stop()
+
+
+@pytest.fixture
+def cache(cache_factory):
+    return cache_factory()
@@ -0,0 +1,166 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.core.ann_index import ANNIndex
+from app.core.vector_index import vector_index
+
+# Far from the ids other tests put in the shared vector index
+BASE_ID = 1_000_000
+
+
+@pytest.fixture
+def vectors():
+    """Clustered vectors registered in the shared vector index, by service id"""
+    rng = np.random.default_rng(7)
+    centers = rng.normal(size=(30, vector_index.dimension))
+    data = {}
+    for i in range(1500):
+        service_id = BASE_ID + i
+        data[service_id] = centers[i % len(centers)] + 0.3 * rng.normal(size=vector_index.dimension)
+        vector_index.upsert(service_id, data[service_id])
+    yield data
+    for service_id in data:
+        vector_index.remove(service_id)
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.setenv("ANN_INDEX_PATH", str(tmp_path / "ann.npz"))
+    ann = object.__new__(ANNIndex)
+    ann.__init__()
+    ann.EXACT_SCAN_THRESHOLD = 200
+    return ann
+
+
+def trained(index, ids):
+    index._retrain(list(ids))
+    index._built = True
+    return index
+
+
+def assert_consistent(index):
+    assert sum(len(members) for members in index._lists) == len(index._assignment)
+    for service_id, label in index._assignment.items():
+        assert service_id in index._lists[label]
+
+
+def exact_top(query, ids, k):
+    scores = vector_index.scores(query, ids)
+    return {ids[i] for i in np.argsort(-scores)[:k]}
+
+
+def test_search_recall_against_exact_scan(index, vectors):
+    ids = list(vectors)
+    trained(index, ids)
+    assert_consistent(index)
+    assert len(index._centroids) > 1
+
+    rng = np.random.default_rng(11)
+    recalls = []
+    for service_id in rng.choice(ids, 50, replace=False):
+        query = vectors[int(service_id)]
+        found = index.search(query, 10)
+        assert found[0][0] == service_id
+        assert [score for _, score in found] == sorted((score for _, score in found), reverse=True)
+        recalls.append(len({sid for sid, _ in found} & exact_top(query, ids, 10)) / 10)
+    assert np.mean(recalls) >= 0.9
+
+
+def test_small_index_scans_exactly(index, vectors):
+    ids = list(vectors)[:100]
+    trained(index, ids)
+    query = vectors[ids[0]]
+    assert {sid for sid, _ in index.search(query, 10)} == exact_top(query, ids, 10)
+
+
+def test_growth_retrains_in_background_and_keeps_concurrent_changes(index, vectors, monkeypatch):
+    ids = list(vectors)
+    trained(index, ids[:400])
+    fit = index._fit
+    fitting = threading.Event()
+
+    def slow_fit(fit_ids):
+        fitting.set()
+        time.sleep(0.5)
+        return fit(fit_ids)
+
+    monkeypatch.setattr(index, "_fit", slow_fit)
+    for service_id in ids[400:]:
+        index.add(service_id)  # passing 2x the trained size starts the retrain
+    assert fitting.wait(5)
+
+    # Searches and writes go on against the old clusters while k-means runs
+    started = time.monotonic()
+    assert index.search(vectors[ids[0]], 5)
+    assert time.monotonic() - started < 0.25
+    removed, moved = ids[:50], ids[50:60]
+    for service_id in removed:
+        index.remove(service_id)
+    rng = np.random.default_rng(3)
+    for service_id in moved:
+        vector_index.upsert(service_id, rng.normal(size=vector_index.dimension))
+        index.add(service_id)
+
+    deadline = time.monotonic() + 10
+    while index._retrain_pending and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+    assert not index._retrain_pending
+    assert index._trained_size > 400
+    assert set(index._assignment) == set(ids[50:])
+    assert_consistent(index)
+    # Services changed while fitting are placed against the new centroids
+    for service_id in moved:
+        assert index._assignment[service_id] == int(np.argmax(index._centroids @ vector_index.get(service_id)))
+
+
+def test_saved_index_is_reconciled_with_the_database(index, vectors):
+    ids = list(vectors)
+    trained(index, ids[:1000])
+    assert index.save()
+
+    reloaded = object.__new__(ANNIndex)
+    reloaded.__init__()
+    active = ids[100:1200]  # some removed, some new since the save
+    centroids, assignment, trained_size = reloaded._read_saved(active)
+
+    assert np.array_equal(centroids, index._centroids)
+    assert set(assignment) == set(active)
+    assert trained_size == 1000
+    for service_id in ids[100:1000]:
+        assert assignment[service_id] == index._assignment[service_id]
+    for service_id in ids[1000:1200]:
+        assert assignment[service_id] == int(np.argmax(centroids @ vector_index.get(service_id)))
+
+
+def test_saved_index_for_another_model_is_ignored(index, vectors, monkeypatch):
+    trained(index, list(vectors)[:300])
+    assert index.save()
+    monkeypatch.setattr(type(vector_index), "model_id", property(lambda self: "another-model"))
+    assert index._read_saved(list(vectors)) is None
+
+
+def test_sync_does_not_block_searches(index, vectors, monkeypatch):
+    ids = list(vectors)
+    trained(index, ids)
+    monkeypatch.setattr(vector_index, "ensure_loaded", lambda db: None)
+    syncing = threading.Event()
+
+    def slow_sync(db):
+        syncing.set()
+        time.sleep(0.5)
+
+    monkeypatch.setattr(index, "_sync", slow_sync)
+    worker = threading.Thread(target=index.ensure_built, args=(None,))
+    worker.start()
+    assert syncing.wait(5)
+
+    started = time.monotonic()
+    index.ensure_built(None)  # another request: keeps the current index instead of waiting
+    assert index.search(vectors[ids[0]], 5)
+    assert time.monotonic() - started < 0.25
+    worker.join()
+    assert index._last_sync > 0
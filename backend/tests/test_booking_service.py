@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event
+
+from app.core.leaderboard import leaderboard
+from app.models.booking import Booking
+from app.models.provider_reputation import ProviderReputation
+from app.models.service import Service
+from app.models.user import User
+from app.schemas.booking import BookingCreate
+from app.services import booking_service, service_service
+
+T0 = datetime(2030, 1, 1, 10, 0, 0)
+HOUR = timedelta(hours=1)
+
+
+@pytest.fixture
+def db(session_factory, monkeypatch):
+    monkeypatch.setattr(leaderboard, "_use_redis", False)
+    session = session_factory()
+    session.add_all([
+        User(id=1, username="provider", name="Provider", email="provider@example.com", hashed_password="-"),
+        User(id=2, username="seeker", name="Seeker", email="seeker@example.com", hashed_password="-"),
+        Service(id=1, provider_id=1, title="Plumber", price=10.0, status="active"),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+def book(db, start, end, seeker_id=2):
+    return booking_service.create(db, seeker_id, BookingCreate(service_id=1, slot_start=start, slot_end=end))
+
+
+@pytest.mark.parametrize("start, end", [
+    (T0 + HOUR, T0 + 2 * HOUR),   # starts exactly when the booking ends
+    (T0 - HOUR, T0),              # ends exactly when the booking starts
+    (T0 + 3 * HOUR, T0 + 4 * HOUR),
+])
+def test_adjacent_and_disjoint_slots_are_accepted(db, start, end):
+    book(db, T0, T0 + HOUR)
+    assert book(db, start, end)["status"] == "pending"
+
+
+@pytest.mark.parametrize("start, end", [
+    (T0, T0 + HOUR),                                   # same slot
+    (T0 + HOUR - timedelta(minutes=1), T0 + 2 * HOUR), # one minute over the end
+    (T0 - HOUR, T0 + timedelta(minutes=1)),            # one minute over the start
+    (T0 + timedelta(minutes=15), T0 + timedelta(minutes=45)),
+    (T0 - HOUR, T0 + 2 * HOUR),
+])
+def test_overlapping_slots_are_rejected(db, start, end):
+    book(db, T0, T0 + HOUR)
+    with pytest.raises(ValueError, match="overlaps"):
+        book(db, start, end)
+
+
+def test_long_booking_blocks_a_slot_far_after_its_start(db):
+    # No lower bound on slot_start: a week-long booking still blocks its last day
+    book(db, T0, T0 + timedelta(days=7))
+    with pytest.raises(ValueError, match="overlaps"):
+        book(db, T0 + timedelta(days=6), T0 + timedelta(days=6) + HOUR)
+
+
+def test_timezone_aware_slots_compare_with_stored_ones(db):
+    book(db, T0, T0 + HOUR)
+    with pytest.raises(ValueError, match="overlaps"):
+        book(db, (T0 + timedelta(minutes=30)).replace(tzinfo=timezone.utc), (T0 + 2 * HOUR).replace(tzinfo=timezone.utc))
+    assert book(db, (T0 + HOUR).replace(tzinfo=timezone.utc), (T0 + 2 * HOUR).replace(tzinfo=timezone.utc))
+
+
+@pytest.mark.parametrize("status", ["cancelled", "completed"])
+def test_finished_bookings_do_not_block(db, status):
+    bk = book(db, T0, T0 + HOUR)
+    booking_service.update_status(db, bk["id"], 1, status)
+    assert book(db, T0, T0 + HOUR)["status"] == "pending"
+
+
+def test_cancel_after_completion_is_rejected(db):
+    bk = book(db, T0, T0 + HOUR)
+    booking_service.update_status(db, bk["id"], 1, "completed")
+    with pytest.raises(ValueError, match="completed"):
+        booking_service.update_status(db, bk["id"], 2, "cancelled")
+    assert db.query(ProviderReputation).filter_by(provider_id=1).one().completed_bookings == 1
+
+
+LOCK_ORDER = {"services": 0, "bookings": 1, "provider_reputation": 2}
+
+
+@pytest.fixture
+def locked_tables(db):
+    """Tables read with FOR UPDATE, in order (SQLite drops the clause, so record it from the ORM)"""
+    tables = []
+
+    def record(state):
+        if state.is_select and getattr(state.statement, "_for_update_arg", None) is not None:
+            tables.extend(mapper.local_table.name for mapper in state.all_mappers)
+
+    event.listen(db, "do_orm_execute", record)
+    yield tables
+    event.remove(db, "do_orm_execute", record)
+
+
+def assert_lock_order(tables):
+    ranks = [LOCK_ORDER[table] for table in tables]
+    assert ranks == sorted(ranks), tables
+
+
+def test_create_locks_service_then_bookings_then_reputation(db, locked_tables):
+    book(db, T0, T0 + HOUR)
+    assert_lock_order(locked_tables)
+    assert locked_tables[0] == "services"
+    assert {"bookings", "provider_reputation"} <= set(locked_tables)
+
+
+def test_completion_locks_service_then_booking_then_reputation(db, locked_tables):
+    bk = book(db, T0, T0 + HOUR)
+    del locked_tables[:]
+    booking_service.update_status(db, bk["id"], 1, "completed")
+    assert_lock_order(locked_tables)
+    assert locked_tables[:2] == ["services", "bookings"]
+    assert "provider_reputation" in locked_tables
+
+
+def test_delete_locks_the_service_first(db, locked_tables):
+    book(db, T0, T0 + HOUR)
+    del locked_tables[:]
+    assert service_service.delete(db, 1, 1)
+    assert_lock_order(locked_tables)
+    assert locked_tables[0] == "services"
+    assert db.query(Booking).count() == 0
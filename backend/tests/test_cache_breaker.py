@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.cache import CircuitBreaker
+
+CELL = "87283472bffffff"
+TAG = "85283473fffffff"
+
+
+class Computation:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return {"results": self.calls}
+
+
+def search(cache, compute):
+    return asyncio.run(cache.aget_or_compute("plumber", CELL, 5, compute, tags=[TAG]))
+
+
+@pytest.fixture
+def redis_down(cache, fake_redis_server):
+    """The cache with its Redis unreachable (every command raises ConnectionError)"""
+    fake_redis_server.connected = False
+    return cache
+
+
+def test_breaker_trips_after_threshold_failures_in_window(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("app.core.cache.time.monotonic", lambda: now[0])
+    breaker = CircuitBreaker(threshold=3, window=10)
+
+    breaker.record_failure()
+    now[0] = 11  # the first failure falls out of the window
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert not breaker.allow()
+    assert breaker.get_stats()["trips"] == 1
+
+    breaker.close()
+    assert breaker.allow()
+    assert breaker.get_stats()["recent_failures"] == 0
+
+
+def test_redis_failures_open_the_breaker_and_searches_keep_working(redis_down):
+    cache = redis_down
+    compute = Computation()
+
+    for _ in range(3):
+        assert search(cache, compute) == {"results": 1}
+
+    assert cache._breaker.is_open
+    # Computed once, then served from this process's L1 only
+    assert compute.calls == 1
+
+
+def test_open_breaker_skips_redis_entirely(cache):
+    cache._breaker._open = True
+    compute = Computation()
+
+    assert search(cache, compute) == {"results": 1}
+    assert search(cache, compute) == {"results": 1}
+    assert compute.calls == 1
+    assert cache._redis_client.dbsize() == 0
+    assert cache.get_raw("embedding:x") is None
+    assert cache.set_raw("embedding:x", "1") is False
+
+
+def test_open_breaker_recomputes_after_soft_expiry(cache):
+    cache._breaker._open = True
+    compute = Computation()
+
+    async def scenario():
+        first = await cache.aget_or_compute("plumber", CELL, 5, compute, ttl=0)
+        return first, await cache.aget_or_compute("plumber", CELL, 5, compute, ttl=0)
+
+    # ttl=0 entries are not kept at all
+    assert asyncio.run(scenario()) == ({"results": 1}, {"results": 2})
+
+
+def test_writes_clear_l1_while_the_breaker_is_open(cache):
+    cache._breaker._open = True
+    compute = Computation()
+    search(cache, compute)
+
+    assert cache.invalidate_tags([TAG]) == 0
+    assert len(cache._l1) == 0
+    assert search(cache, compute) == {"results": 2}
+
+
+def test_probe_closes_the_breaker_once_redis_answers(redis_down, fake_redis_server):
+    cache = redis_down
+    compute = Computation()
+    for _ in range(3):
+        search(cache, compute)
+    assert cache._breaker.is_open
+    assert len(cache._l1) == 1
+
+    cache._probe_interval = 0.05
+    cache.start()
+    time.sleep(0.2)
+    assert cache._breaker.is_open  # still unreachable
+
+    fake_redis_server.connected = True
+    deadline = time.monotonic() + 5
+    while cache._breaker.is_open and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+    assert not cache._breaker.is_open
+    # Invalidations may have been missed while Redis was down
+    assert len(cache._l1) == 0
+    assert search(cache, compute) == {"results": 2}
+    assert cache._redis_client.dbsize() > 0
@@ -0,0 +1,63 @@
+import json
+import zlib
+
+import pytest
+
+from app.core import cache_codec
+from app.core.cache_codec import (
+    COMPRESS_THRESHOLD,
+    COMPRESSION_NONE,
+    COMPRESSION_ZLIB,
+    COMPRESSION_ZSTD,
+    PAYLOAD_VERSION,
+    decode_payload,
+    encode_payload,
+)
+
+SMALL = {"services": [{"id": 1, "title": "Plumber", "price": 25.5, "distance_km": None}], "total": 1}
+LARGE = {
+    "services": [{"id": i, "title": f"Service {i}", "description": "Fixes pipes " * 5} for i in range(100)],
+    "total": 100,
+}
+
+
+def test_small_payload_round_trips_uncompressed():
+    raw = encode_payload(SMALL)
+    assert raw[0] == PAYLOAD_VERSION
+    assert raw[1] == COMPRESSION_NONE
+    assert decode_payload(raw) == SMALL
+
+
+def test_large_payload_round_trips_compressed():
+    raw = encode_payload(LARGE)
+    assert len(json.dumps(LARGE)) >= COMPRESS_THRESHOLD
+    assert raw[1] in (COMPRESSION_ZLIB, COMPRESSION_ZSTD)
+    assert len(raw) < len(json.dumps(LARGE))
+    assert decode_payload(raw) == LARGE
+
+
+def test_zlib_payload_decodes_without_zstandard(monkeypatch):
+    monkeypatch.setattr(cache_codec, "_zstd_compressor", None)
+    raw = encode_payload(LARGE)
+    assert raw[1] == COMPRESSION_ZLIB
+    assert decode_payload(raw) == LARGE
+
+
+def test_legacy_json_text_is_accepted():
+    assert decode_payload(json.dumps(SMALL)) == SMALL
+    assert decode_payload(json.dumps([1, 2]).encode()) == [1, 2]
+
+
+@pytest.mark.parametrize("raw", [
+    bytes((PAYLOAD_VERSION + 1, COMPRESSION_NONE)) + b"{}",
+    bytes((PAYLOAD_VERSION, 0x7F)) + b"{}",
+    bytes((PAYLOAD_VERSION,)),
+])
+def test_unknown_layout_raises_value_error(raw):
+    with pytest.raises(ValueError):
+        decode_payload(raw)
+
+
+def test_zlib_body_is_plain_deflate():
+    raw = bytes((PAYLOAD_VERSION, COMPRESSION_ZLIB)) + zlib.compress(json.dumps(SMALL).encode())
+    assert decode_payload(raw) == SMALL
@@ -0,0 +1,112 @@
+import asyncio
+import time
+
+from app.core.cache import LocalCache
+
+CELL = "87283472bffffff"
+TAG = "85283473fffffff"
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_local_cache_expires_entries(monkeypatch):
+    l1 = LocalCache(max_size=10, ttl=30)
+    now = [100.0]
+    monkeypatch.setattr("app.core.cache.time.monotonic", lambda: now[0])
+    l1.put("a", 1)
+    l1.put("b", 2, ttl=5)
+    l1.put("c", 3, ttl=0)
+
+    now[0] += 6
+    assert (l1.get("a"), l1.get("b"), l1.get("c")) == (1, None, None)
+    now[0] += 30
+    assert l1.get("a") is None
+
+
+def test_local_cache_evicts_least_recently_used():
+    l1 = LocalCache(max_size=2, ttl=30)
+    l1.put("a", 1)
+    l1.put("b", 2)
+    l1.get("a")
+    l1.put("c", 3)
+    assert (l1.get("a"), l1.get("b"), l1.get("c")) == (1, None, 3)
+
+
+def test_local_cache_discards_keys_and_patterns():
+    l1 = LocalCache(max_size=10, ttl=30)
+    for key in ("search:plumber:x:5", "search:plumber:y:5", "search:tutor:x:5"):
+        l1.put(key, key)
+    l1.discard(["search:tutor:x:5"])
+    l1.discard_pattern("search:plumber:x:*")
+    assert len(l1) == 1
+    assert l1.get("search:plumber:y:5") == "search:plumber:y:5"
+
+
+def _value(value):
+    async def compute():
+        return value
+
+    return compute
+
+
+def cached_search(cache, value, cell=CELL, tag=TAG):
+    return asyncio.run(cache.aget_or_compute("plumber", cell, 5, _value(value), tags=[tag]))
+
+
+def test_second_read_is_served_from_l1(cache):
+    cached_search(cache, "first")
+    l2_reads = cache._stats["l2_hits"] + cache._stats["l2_misses"]
+    assert cached_search(cache, "second") == "first"
+    assert cache._stats["l1_hits"] == 1
+    assert cache._stats["l2_hits"] + cache._stats["l2_misses"] == l2_reads
+
+
+def test_l2_hit_is_promoted_to_l1(cache_factory):
+    writer, reader = cache_factory(), cache_factory()
+    cached_search(writer, "shared")
+    assert cached_search(reader, "recomputed") == "shared"
+    key = reader._generate_key("plumber", CELL, 5)
+    assert reader._l1.get(key)["value"] == "shared"
+
+
+def test_invalidation_reaches_other_processes(cache_factory):
+    writer, reader = cache_factory(), cache_factory()
+    reader._probe_interval = 0.05
+    reader.start()
+    key = reader._generate_key("plumber", CELL, 5)
+    # The listener clears the L1 when it (re)subscribes; cache only after that
+    assert wait_until(lambda: reader._redis_client.pubsub_numsub(writer.INVALIDATION_CHANNEL)[0][1] == 1)
+    cached_search(writer, "old")
+    assert cached_search(reader, "unused") == "old"
+
+    assert writer.invalidate_tags([TAG]) == 1
+
+    assert wait_until(lambda: reader._l1.get(key) is None)
+    assert not writer._redis_client.exists(key)
+    assert writer._l1.get(key) is None
+    assert cached_search(reader, "new") == "new"
+
+
+def test_invalidation_leaves_other_cells_alone(cache):
+    cached_search(cache, "plumber here")
+    other = cache._generate_key("plumber", "872834729ffffff", 5)
+    cached_search(cache, "plumber there", cell="872834729ffffff", tag="852834cbfffffff")
+
+    cache.invalidate_tags([TAG])
+
+    assert cache._l1.get(other)["value"] == "plumber there"
+    assert cache._redis_client.exists(other)
+
+
+def test_clear_pattern_drops_l1_entries(cache):
+    cached_search(cache, "plumber")
+    assert cache.clear_pattern("search:plumber:*") == 1
+    assert len(cache._l1) == 0
+
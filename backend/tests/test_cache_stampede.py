@@ -0,0 +1,100 @@
+import asyncio
+import math
+import time
+
+import pytest
+
+from app.core.cache_codec import encode_payload
+
+
+class Computation:
+    """Counts calls; each takes `seconds` and returns the call number"""
+
+    def __init__(self, seconds=0.0):
+        self.seconds = seconds
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        call = self.calls
+        await asyncio.sleep(self.seconds)
+        return {"results": call}
+
+
+def search(cache, compute, **kwargs):
+    return cache.aget_or_compute("plumber", "87283472bffffff", 5, compute, **kwargs)
+
+
+def test_miss_computes_once_then_hits(cache):
+    compute = Computation()
+
+    async def scenario():
+        first = await search(cache, compute, tags=["85283473fffffff"])
+        second = await search(cache, compute)
+        return first, second
+
+    assert asyncio.run(scenario()) == ({"results": 1}, {"results": 1})
+    assert compute.calls == 1
+    key = cache._generate_key("plumber", "87283472bffffff", 5)
+    assert cache._redis_client.exists(key)
+    assert cache._redis_client.sismember(cache._tag_key("85283473fffffff"), key)
+    assert not cache._redis_client.exists(f"lock:{key}")
+
+
+def test_concurrent_misses_share_one_computation(cache):
+    compute = Computation(seconds=0.2)
+
+    async def scenario():
+        return await asyncio.gather(*(search(cache, compute) for _ in range(20)))
+
+    results = asyncio.run(scenario())
+    assert compute.calls == 1
+    assert results == [{"results": 1}] * 20
+    assert cache._stats["lock_waits"] == 19
+
+
+def test_stale_entry_is_served_while_one_refresh_runs(cache):
+    key = cache._generate_key("plumber", "87283472bffffff", 5)
+    stale = {"value": {"results": "old"}, "soft_expiry": time.time() - 1, "delta": 0.0}
+    cache._redis_client.setex(key, 60, encode_payload(stale))
+    compute = Computation(seconds=0.1)
+
+    async def scenario():
+        served = await asyncio.gather(*(search(cache, compute) for _ in range(10)))
+        await asyncio.gather(*cache._refresh_tasks)
+        return served, await search(cache, compute)
+
+    served, after = asyncio.run(scenario())
+    assert served == [{"results": "old"}] * 10
+    assert compute.calls == 1
+    assert after == {"results": 1}
+    assert not cache._redis_client.exists(f"lock:{key}")
+
+
+def test_legacy_entry_without_expiry_is_fresh(cache):
+    key = cache._generate_key("plumber", "87283472bffffff", 5)
+    cache._redis_client.setex(key, 60, encode_payload({"results": "legacy"}))
+    compute = Computation()
+
+    assert asyncio.run(search(cache, compute)) == {"results": "legacy"}
+    assert compute.calls == 0
+
+
+def test_xfetch_refreshes_early_in_proportion_to_compute_time(cache, monkeypatch):
+    now = time.time()
+    cheap = {"soft_expiry": now + 10, "delta": 0.0}
+    expensive = {"soft_expiry": now + 10, "delta": 5.0}
+    # U = 1 - e^-2: the early margin is delta * beta * 2
+    monkeypatch.setattr("app.core.cache.random.random", lambda: 1 - math.exp(-2))
+
+    assert not cache._should_refresh(cheap)
+    assert cache._should_refresh(expensive)
+    cache._early_beta = 0.0
+    assert not cache._should_refresh(expensive)
+    assert cache._should_refresh({"soft_expiry": now - 1, "delta": 0.0})
+
+
+@pytest.mark.parametrize("random_value", [0.0, 0.5, 0.999999])
+def test_xfetch_never_refreshes_a_fresh_entry_with_no_compute_time(cache, monkeypatch, random_value):
+    monkeypatch.setattr("app.core.cache.random.random", lambda: random_value)
+    assert not cache._should_refresh({"soft_expiry": time.time() + 60, "delta": 0.0})
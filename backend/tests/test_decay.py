@@ -0,0 +1,61 @@
+import math
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.decay import MAX_EXPONENT, SECONDS_PER_DAY, decayed_value, rebased_add
+
+DECAY = 0.01
+START = datetime(2024, 1, 1)
+
+
+def direct_sum(values, now, decay=DECAY):
+    return sum(v * math.exp(-decay * (now - t).total_seconds() / SECONDS_PER_DAY) for v, t in values)
+
+
+def accumulate(values, decay=DECAY):
+    totals, epoch = (0.0, 0.0), None
+    for value, at in values:
+        totals, epoch = rebased_add(totals, epoch, (value, 1.0), at, decay)
+    return totals, epoch
+
+
+def test_empty_sum_decays_to_zero():
+    assert decayed_value(0.0, None, START, DECAY) == 0.0
+
+
+def test_first_value_sets_the_epoch():
+    totals, epoch = rebased_add((0.0, 0.0), None, (4.0, 1.0), START, DECAY)
+    assert totals == (4.0, 1.0)
+    assert epoch == START
+
+
+def test_matches_direct_summation():
+    values = [(1 + (i * 7) % 5, START + timedelta(days=i * 3, hours=i)) for i in range(200)]
+    (rating_sum, weight), epoch = accumulate(values)
+    now = START + timedelta(days=700)
+
+    assert decayed_value(rating_sum, epoch, now, DECAY) == pytest.approx(direct_sum(values, now), rel=1e-12)
+    assert decayed_value(weight, epoch, now, DECAY) == pytest.approx(
+        direct_sum([(1.0, t) for _, t in values], now), rel=1e-12
+    )
+    # The ratio needs no rescaling: the decay factor cancels
+    assert rating_sum / weight == pytest.approx(direct_sum(values, now) / direct_sum([(1.0, t) for _, t in values], now))
+
+
+def test_rebases_once_terms_would_grow_too_large():
+    step = timedelta(days=MAX_EXPONENT / DECAY / 2)
+    values = [(5.0, START), (3.0, START + step), (1.0, START + 3 * step)]
+    totals, epoch = (0.0, 0.0), None
+    epochs = []
+    for value, at in values:
+        totals, epoch = rebased_add(totals, epoch, (value, 1.0), at, DECAY)
+        epochs.append(epoch)
+
+    # The second term stays within MAX_EXPONENT of the epoch; the third moves it
+    assert epochs == [START, START, START + 3 * step]
+    now = START + 4 * step
+    assert decayed_value(totals[0], epoch, now, DECAY) == pytest.approx(direct_sum(values, now), rel=1e-12)
+    assert decayed_value(totals[1], epoch, now, DECAY) == pytest.approx(
+        direct_sum([(1.0, t) for _, t in values], now), rel=1e-12
+    )
@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.core import embedding_worker as worker_module
+from app.core.embedding_worker import EmbeddingWorker
+from app.core.search_engine import search_engine
+from app.core.vector_index import vector_index
+from app.models.embedding_job import EmbeddingJob
+from app.models.service import Service
+from app.models.user import User
+from app.services.embedding_service import enqueue_embedding
+
+
+@pytest.fixture
+def worker(session_factory, monkeypatch):
+    monkeypatch.setattr(worker_module, "SessionLocal", session_factory)
+    invalidated = []
+    monkeypatch.setattr(worker_module.cache_manager, "invalidate_tags", invalidated.extend)
+    w = EmbeddingWorker()
+    w.invalidated = invalidated
+    return w
+
+
+@pytest.fixture
+def service_id(session_factory):
+    db = session_factory()
+    provider = User(username="p", name="Provider", email="p@example.com", hashed_password="-")
+    db.add(provider)
+    db.flush()
+    svc = Service(provider_id=provider.id, title="Plumber", description="Fixes pipes", price=10.0, h3_res5="85283473fffffff")
+    db.add(svc)
+    db.flush()
+    enqueue_embedding(db, svc.id)
+    db.commit()
+    sid = svc.id
+    db.close()
+    yield sid
+    vector_index.remove(sid)
+
+
+def fake_vectors(texts):
+    return [np.full(vector_index.dimension, 1.0 / (i + 1), dtype=np.float32) for i in range(len(texts))]
+
+
+def load(session_factory, model, **filters):
+    db = session_factory()
+    try:
+        return db.query(model).filter_by(**filters).first()
+    finally:
+        db.close()
+
+
+def test_embeds_and_finishes_the_job(session_factory, worker, service_id, monkeypatch):
+    monkeypatch.setattr(search_engine, "embed_documents", fake_vectors)
+
+    assert worker.process_batch() == 1
+
+    svc = load(session_factory, Service, id=service_id)
+    assert svc.embedding_status == "ready"
+    assert svc.embedding is not None
+    assert load(session_factory, EmbeddingJob, service_id=service_id) is None
+    assert vector_index.contains(service_id)
+    assert worker.invalidated == ["85283473fffffff"]
+    assert worker.process_batch() == 0
+
+
+def test_stale_version_is_not_written(session_factory, worker, service_id, monkeypatch):
+    def reenqueue_while_embedding(texts):
+        # The service is edited after the job was claimed: its job moves to version 2
+        db = session_factory()
+        enqueue_embedding(db, service_id)
+        db.commit()
+        db.close()
+        return fake_vectors(texts)
+
+    monkeypatch.setattr(search_engine, "embed_documents", reenqueue_while_embedding)
+    assert worker.process_batch() == 1
+
+    svc = load(session_factory, Service, id=service_id)
+    assert svc.embedding is None
+    assert svc.embedding_status == "pending"
+    assert not vector_index.contains(service_id)
+    assert worker.invalidated == []
+    job = load(session_factory, EmbeddingJob, service_id=service_id)
+    assert (job.version, job.status) == (2, "pending")
+
+    # The newer job is picked up and finished on the next pass
+    monkeypatch.setattr(search_engine, "embed_documents", fake_vectors)
+    assert worker.process_batch() == 1
+    assert load(session_factory, Service, id=service_id).embedding_status == "ready"
+    assert load(session_factory, EmbeddingJob, service_id=service_id) is None
+
+
+@pytest.mark.parametrize("claimed_ago, reclaimed", [
+    (timedelta(seconds=10), False),
+    (timedelta(seconds=EmbeddingWorker.LEASE_SECONDS + 10), True),
+])
+def test_processing_job_is_reclaimed_only_after_its_lease(session_factory, worker, service_id, claimed_ago, reclaimed):
+    db = session_factory()
+    job = db.query(EmbeddingJob).filter_by(service_id=service_id).one()
+    job.status = "processing"
+    job.attempts = 1
+    job.available_at = datetime.utcnow() - claimed_ago
+    db.commit()
+
+    claimed = worker._claim(db)
+    db.close()
+
+    assert claimed == ([(service_id, 1)] if reclaimed else [])
+    assert load(session_factory, EmbeddingJob, service_id=service_id).attempts == (2 if reclaimed else 1)
+
+
+def test_failed_batch_backs_off(session_factory, worker, service_id, monkeypatch):
+    def broken(texts):
+        raise RuntimeError("quota exceeded")
+
+    monkeypatch.setattr(search_engine, "embed_documents", broken)
+    assert worker.process_batch() == 1
+
+    job = load(session_factory, EmbeddingJob, service_id=service_id)
+    assert job.status == "pending"
+    assert job.available_at > datetime.utcnow()
+    assert job.last_error == "quota exceeded"
+    assert worker.process_batch() == 0
@@ -0,0 +1,161 @@
+import pytest
+
+from app.core import leaderboard as leaderboard_module
+from app.core.leaderboard import Leaderboard, MemoryBoards, board_key, boards_for
+from app.core.location_engine import get_h3_indexes
+from app.models.provider_reputation import ProviderReputation
+from app.models.service import Service
+from app.models.user import User
+
+NYC = (40.7128, -74.0060)
+LONDON = (51.5074, -0.1278)
+
+
+def region(point):
+    return get_h3_indexes(*point)[5]
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    for provider_id, score in ((1, 4.5), (2, 3.0), (3, 4.0)):
+        session.add(User(id=provider_id, username=f"p{provider_id}", name=f"P{provider_id}", email=f"p{provider_id}@example.com", hashed_password="-"))
+        session.add(ProviderReputation(provider_id=provider_id, total_bookings=1, overall_score=score))
+    session.flush()
+    for service_id, provider_id, category, point in (
+        (1, 1, "Plumbing", NYC),
+        (2, 2, "plumbing ", NYC),
+        (3, 3, "Plumbing", LONDON),
+        (4, 3, "Tutoring", NYC),
+    ):
+        session.add(Service(id=service_id, provider_id=provider_id, title="s", price=1.0, category=category, h3_res5=region(point)))
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.fixture(params=["redis", "memory"])
+def board(request, cache, monkeypatch):
+    monkeypatch.setattr(leaderboard_module, "cache_manager", cache)
+    lb = object.__new__(Leaderboard)
+    lb.__init__()
+    lb._use_redis = request.param == "redis"
+    return lb
+
+
+def ids(page):
+    entries, _ = page
+    return [provider_id for provider_id, _ in entries]
+
+
+def test_boards_for_categories_and_regions():
+    assert boards_for([("Plumbing", "r1"), ("Tutoring", None)]) == {
+        "leaderboard:category:plumbing",
+        "leaderboard:region:r1",
+        "leaderboard:region:r1:category:plumbing",
+        "leaderboard:category:tutoring",
+    }
+    assert board_key(category="  Home   Repair ") == "leaderboard:category:home repair"
+
+
+def test_memory_boards_page_and_move():
+    boards = MemoryBoards()
+    boards.set_provider(1, 2.0, {"a", "b"})
+    boards.set_provider(2, 3.0, {"a"})
+    assert boards.page("a", 0, 10) == ([(2, 3.0), (1, 2.0)], 2)
+    boards.set_provider(1, 5.0, {"b"})
+    assert boards.page("a", 0, 10) == ([(2, 3.0)], 1)
+    assert boards.page("b", 0, 10) == ([(1, 5.0)], 1)
+    boards.set_provider(1, 0.0, set())
+    assert boards.page("b", 0, 10) == ([], 0)
+    assert len(boards) == 1
+
+
+def test_category_board_ranks_by_score(board, db):
+    entries, total = board.top(db, category="PLUMBING")
+    assert entries == [(1, 4.5), (3, 4.0), (2, 3.0)]
+    assert total == 3
+    assert ids(board.top(db, category="plumbing", offset=1, limit=1)) == [3]
+
+
+def test_region_board_is_the_cell_of_the_point(board, db):
+    # London's res-5 cell is not the parent of its res-9 cell; the board follows h3_res5
+    assert ids(board.top(db, lat=NYC[0], lng=NYC[1])) == [1, 3, 2]
+    assert ids(board.top(db, category="plumbing", lat=NYC[0], lng=NYC[1])) == [1, 2]
+    assert ids(board.top(db, category="plumbing", lat=LONDON[0], lng=LONDON[1])) == [3]
+    assert board.top(db, category="plumbing", lat=10.0, lng=10.0) == ([], 0)
+
+
+def test_update_moves_provider_between_boards(board, db, cache):
+    board.top(db)  # build
+    svc = db.get(Service, 1)
+    svc.category, svc.h3_res5 = "Tutoring", region(LONDON)
+    db.get(ProviderReputation, 1).overall_score = 2.0
+    db.commit()
+
+    board.update_provider(db, 1)
+
+    assert ids(board.top(db, category="plumbing")) == [3, 2]
+    assert board.top(db, category="tutoring", lat=LONDON[0], lng=LONDON[1]) == ([(1, 2.0)], 1)
+    assert ids(board.top(db, lat=NYC[0], lng=NYC[1])) == [3, 2]
+    if board._use_redis:
+        assert {key.decode() for key in cache._redis_client.smembers("leaderboard:member:1")} == {
+            board_key(category="tutoring"),
+            board_key(region=region(LONDON)),
+            board_key(category="tutoring", region=region(LONDON)),
+        }
+
+
+def test_provider_without_active_services_leaves_every_board(board, db, cache):
+    board.top(db)
+    db.get(Service, 2).status = "inactive"
+    db.commit()
+    board.update_provider(db, 2)
+    assert ids(board.top(db, category="plumbing")) == [1, 3]
+    if board._use_redis:
+        assert not cache._redis_client.exists("leaderboard:member:2")
+
+
+def test_redis_rebuild_swaps_boards_and_drops_stale_ones(cache, db, monkeypatch):
+    monkeypatch.setattr(leaderboard_module, "cache_manager", cache)
+    lb = object.__new__(Leaderboard)
+    lb.__init__()
+    redis = cache._redis_client
+    redis.zadd("leaderboard:category:gardening", {9: 1.0})
+    redis.sadd("leaderboard:member:9", "leaderboard:category:gardening")
+
+    assert lb.rebuild(db) == 3
+
+    keys = {key.decode() for key in redis.keys("*")}
+    assert "leaderboard:category:gardening" not in keys
+    assert "leaderboard:member:9" not in keys
+    assert not any(key.startswith("leaderboard-build:") for key in keys)
+    assert redis.exists(Leaderboard.BUILT_KEY)
+    assert ids(lb.top(db, category="plumbing")) == [1, 3, 2]
+
+
+def test_failed_redis_rebuild_leaves_no_temporary_keys(cache, db, monkeypatch):
+    monkeypatch.setattr(leaderboard_module, "cache_manager", cache)
+    lb = object.__new__(Leaderboard)
+    lb.__init__()
+    redis = cache._redis_client
+    redis.zadd("leaderboard:category:plumbing", {7: 1.0})
+    pipeline = redis.pipeline
+
+    def failing_pipeline(transaction=True, **kwargs):
+        pipe = pipeline(transaction=transaction, **kwargs)
+        if transaction:
+            def fail():
+                raise ConnectionError("connection lost before EXEC")
+            pipe.execute = fail
+        return pipe
+
+    monkeypatch.setattr(redis, "pipeline", failing_pipeline)
+    lb.rebuild(db)
+
+    keys = {key.decode() for key in redis.keys("*")}
+    assert not any(key.startswith("leaderboard-build:") for key in keys)
+    # The old board is still served as it was
+    assert redis.zrange("leaderboard:category:plumbing", 0, -1) == [b"7"]
+    # The in-process copy was rebuilt regardless
+    assert lb._memory.page(board_key(category="plumbing"), 0, 10)[1] == 3
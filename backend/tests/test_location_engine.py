@@ -0,0 +1,88 @@
+import math
+
+import h3
+import pytest
+
+from app.core.location_engine import (
+    MAX_CELL_TERMS,
+    SEARCH_RESOLUTIONS,
+    get_child_range,
+    get_distance_km,
+    get_h3_indexes,
+    plan_search_cells,
+    split_compact_cells,
+)
+
+ORIGIN = (40.7128, -74.0060)
+RADII = [0.5, 1, 2, 5, 10, 20, 50]
+
+
+def points_around(lat, lng, km, count=72):
+    """Points on circles of radius km and km/2 around (lat, lng)"""
+    points = []
+    for radius in (km * 0.999, km / 2):
+        for i in range(count):
+            bearing = 2 * math.pi * i / count
+            dlat = radius / 111.32 * math.cos(bearing)
+            dlng = radius / (111.32 * math.cos(math.radians(lat))) * math.sin(bearing)
+            points.append((lat + dlat, lng + dlng))
+    return points
+
+
+def covered(cells, lat, lng):
+    cell_set = set(cells)
+    finest = h3.latlng_to_cell(lat, lng, SEARCH_RESOLUTIONS[0])
+    return any(h3.cell_to_parent(finest, res) in cell_set for res in range(h3.get_resolution(finest) + 1))
+
+
+def test_indexes_are_parents_of_the_finest_cell():
+    indexes = get_h3_indexes(*ORIGIN)
+    assert set(indexes) == set(SEARCH_RESOLUTIONS)
+    for res, cell in indexes.items():
+        assert h3.get_resolution(cell) == res
+        assert cell == h3.cell_to_parent(indexes[SEARCH_RESOLUTIONS[0]], res)
+
+
+@pytest.mark.parametrize("km", RADII)
+def test_plan_covers_the_radius_within_the_term_budget(km):
+    resolution, cells = plan_search_cells(*ORIGIN, km)
+
+    assert resolution in SEARCH_RESOLUTIONS
+    assert 0 < len(cells) <= MAX_CELL_TERMS
+    assert all(h3.get_resolution(cell) <= resolution for cell in cells)
+    for lat, lng in points_around(*ORIGIN, km):
+        assert get_distance_km(*ORIGIN, lat, lng) <= km
+        assert covered(cells, lat, lng), (km, lat, lng)
+
+
+def test_plan_coarsens_as_the_radius_grows():
+    resolutions = [plan_search_cells(*ORIGIN, km)[0] for km in RADII]
+    assert resolutions == sorted(resolutions, reverse=True)
+    assert resolutions[0] == SEARCH_RESOLUTIONS[0]
+    assert resolutions[-1] < SEARCH_RESOLUTIONS[0]
+
+
+@pytest.mark.parametrize("parent_res, child_res", [(5, 7), (5, 9), (7, 9), (9, 9)])
+def test_child_range_contains_exactly_the_descendants(parent_res, child_res):
+    parent = h3.latlng_to_cell(*ORIGIN, parent_res)
+    lo, hi = get_child_range(parent, child_res)
+    children = h3.cell_to_children(parent, child_res)
+
+    assert lo == min(children) and hi == max(children)
+    assert h3.is_valid_cell(lo) and h3.is_valid_cell(hi)
+    # Descendants of the neighbours sort outside the range
+    for neighbour in h3.grid_ring(parent, 1):
+        assert not any(lo <= child <= hi for child in h3.cell_to_children(neighbour, child_res))
+
+
+def test_string_order_matches_integer_order():
+    cells = sorted(h3.grid_disk(h3.latlng_to_cell(*ORIGIN, 9), 3))
+    assert [h3.str_to_int(cell) for cell in cells] == sorted(h3.str_to_int(cell) for cell in cells)
+
+
+def test_split_compact_cells():
+    center = h3.latlng_to_cell(*ORIGIN, 9)
+    coarse = h3.cell_to_parent(center, 7)
+    exact, ranges = split_compact_cells([center, coarse], resolution=9)
+    assert exact == [center]
+    assert ranges == [get_child_range(coarse, 9)]
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import Column, DateTime, Integer, create_engine
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from app.core.pagination import InvalidCursorError, decode_cursor, encode_cursor, paginate
+
+Base = declarative_base()
+
+
+class Item(Base):
+    __tablename__ = "items"
+
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, nullable=False)
+
+
+T0 = datetime(2024, 5, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    # Runs of equal created_at, so pages must break ties on id
+    session.add_all(Item(id=i, created_at=T0 + timedelta(minutes=i // 4)) for i in range(1, 24))
+    # One timestamp written with microseconds, which SQLite stores as longer text
+    session.add(Item(id=24, created_at=T0 + timedelta(minutes=5, microseconds=500)))
+    session.commit()
+    yield session
+    session.close()
+
+
+def walk(db, limit, descending=True):
+    pages, cursor = [], None
+    while True:
+        rows, cursor = paginate(db.query(Item), Item.created_at, Item.id, cursor, limit, descending=descending)
+        pages.append([row.id for row in rows])
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(T0, 42)) == (T0, 42)
+    aware = T0.replace(microsecond=123456, tzinfo=timezone.utc)
+    assert decode_cursor(encode_cursor(aware, 7)) == (aware, 7)
+
+
+def test_cursor_is_url_safe_without_padding():
+    token = encode_cursor(T0, 1)
+    assert "=" not in token
+    assert set(token) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_")
+
+
+@pytest.mark.parametrize("token", ["", "not-a-cursor", encode_cursor(T0, 1)[:-3]])
+def test_malformed_cursor_raises_invalid_cursor_error(token):
+    # A ValueError subclass, so routers can tell it from the services' permission errors
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(token)
+
+
+@pytest.mark.parametrize("limit", [1, 3, 4, 5, 24, 100])
+def test_pages_cover_every_row_once_in_order(db, limit):
+    expected = [item.id for item in db.query(Item).order_by(Item.created_at.desc(), Item.id.desc())]
+    pages = walk(db, limit)
+
+    assert [row_id for page in pages for row_id in page] == expected
+    assert all(len(page) == limit for page in pages[:-1])
+    assert 0 < len(pages[-1]) <= limit
+
+
+def test_ascending_pages(db):
+    expected = [item.id for item in db.query(Item).order_by(Item.created_at, Item.id)]
+    assert [row_id for page in walk(db, 5, descending=False) for row_id in page] == expected
+
+
+def test_last_page_has_no_cursor(db):
+    rows, cursor = paginate(db.query(Item), Item.created_at, Item.id, None, 24)
+    assert len(rows) == 24
+    assert cursor is None
+
+    rows, cursor = paginate(db.query(Item), Item.created_at, Item.id, None, 23)
+    assert len(rows) == 23
+    assert cursor is not None
+    rows, cursor = paginate(db.query(Item), Item.created_at, Item.id, cursor, 23)
+    assert len(rows) == 1
+    assert cursor is None
@@ -0,0 +1,94 @@
+import math
+
+import pytest
+
+from app.core.search_engine import RRF_K, reciprocal_rank_fusion
+from app.core.text_index import TextIndex, tokenize
+
+SERVICES = {
+    1: ("Emergency plumber", "Fixes leaking pipes and blocked drains", "Home"),
+    2: ("Math tutor", "Algebra and calculus lessons for students", "Education"),
+    3: ("Bike repair", "Puncture and brake repair, plumbing not included", "Repairs"),
+    4: ("Plumbing and heating", "Boiler service and pipe fitting", "Home"),
+    5: ("Piano lessons", "Lessons for beginners", "Music"),
+}
+
+
+@pytest.fixture
+def index():
+    text = object.__new__(TextIndex)
+    text.__init__()
+    for service_id, fields in SERVICES.items():
+        text.upsert(service_id, *fields)
+    return text
+
+
+def test_tokenize_drops_stopwords_and_punctuation():
+    assert tokenize("The plumber, near ME for 24/7 repairs!") == ["plumber", "24", "7", "repairs"]
+    assert tokenize(None) == []
+
+
+def test_scores_follow_bm25(index):
+    # Only service 1 mentions "plumber", once, in its title (weight 2.0)
+    n_docs, df, tf = len(SERVICES), 1, TextIndex.FIELD_WEIGHTS["title"]
+    doc_len = index._doc_len[1]
+    avg_len = index._total_len / n_docs
+    idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+    norm = TextIndex.K1 * (1.0 - TextIndex.B + TextIndex.B * doc_len / avg_len)
+    expected = idf * tf * (TextIndex.K1 + 1.0) / (tf + norm)
+
+    scores = index.scores("plumber", [1, 2, 42])
+    assert scores[0] == pytest.approx(expected, rel=1e-6)
+    assert scores[1] == 0.0 and scores[2] == 0.0
+
+
+def test_title_hit_outranks_description_hit(index):
+    title_hit, description_hit = index.scores("lessons", [5, 2])
+    assert title_hit > description_hit > 0
+
+
+def test_search_returns_matches_best_first(index):
+    hits = index.search("lessons", 10)
+    assert [service_id for service_id, _ in hits] == [5, 2]
+    assert index.search("lessons", 1) == hits[:1]
+    assert index.search("violin", 10) == []
+
+
+def test_prefix_search_expands_terms(index):
+    assert {service_id for service_id, _ in index.search("plumb", 10)} == set()
+    assert {service_id for service_id, _ in index.search("plumb", 10, prefix=True)} == {1, 3, 4}
+
+
+def test_prefix_search_expands_the_vocabulary_once(index, monkeypatch):
+    calls = []
+    expand = index._query_terms
+    monkeypatch.setattr(index, "_query_terms", lambda query, prefix: calls.append(query) or expand(query, prefix))
+    index.search("plumb", 10, prefix=True)
+    assert calls == ["plumb"]
+
+
+def test_upsert_replaces_and_remove_forgets(index):
+    index.upsert(1, "Electrician", "Wiring", "Home")
+    assert index.scores("plumber", [1])[0] == 0.0
+    assert index.search("electrician", 10)[0][0] == 1
+    assert index.remove(1)
+    assert index.search("electrician", 10) == []
+    assert len(index) == len(SERVICES) - 1
+    assert index._total_len == pytest.approx(sum(index._doc_len.values()))
+
+
+def test_rrf_sums_reciprocal_ranks():
+    fused = reciprocal_rank_fusion([[10, 20, 30], [30, 10]])
+    assert fused[10] == pytest.approx(1 / (RRF_K + 1) + 1 / (RRF_K + 2))
+    assert fused[20] == pytest.approx(1 / (RRF_K + 2))
+    assert fused[30] == pytest.approx(1 / (RRF_K + 3) + 1 / (RRF_K + 1))
+    assert sorted(fused, key=fused.get, reverse=True) == [10, 30, 20]
+    assert reciprocal_rank_fusion([]) == {}
+
+
+def test_rrf_rewards_agreement_over_a_single_top_rank():
+    vector_order = [1, 2, 3, 4]
+    text_order = [5, 2, 6, 7]
+    fused = reciprocal_rank_fusion([vector_order, text_order])
+    assert max(fused, key=fused.get) == 2
+
@@ -0,0 +1,72 @@
+"""
+Verification job for materialized provider reputation
+Recomputes every provider's aggregate from the raw bookings and reviews and
+reports drift against the stored, incrementally maintained row. Drift is
+absolute for values up to 1 and relative above that.
+
+    python verify_reputation.py                     # report providers drifting more than 1e-6
+    python verify_reputation.py --tolerance 0.01 --fix   # also rebuild the drifting rows
+
+Exits with status 1 when drift above the tolerance was found (and not fixed),
+so it can run as a scheduled check.
+"""
+import argparse
+import logging
+import sys
+
+from app.db.database import SessionLocal
+from app.models.provider_reputation import ProviderReputation
+from app.models.service import Service
+from app.models import user, booking, review, chat_message, payment  # noqa: F401 - register related mappers
+from app.services.reputation_service import reputation_service
+from app.core.leaderboard import leaderboard
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def verify_reputation(tolerance: float, fix: bool) -> int:
+    """
+    Check every provider with a service or a reputation row
+
+    Returns:
+        Number of providers drifting more than `tolerance`
+    """
+    db = SessionLocal()
+    try:
+        provider_ids = sorted(
+            {provider_id for (provider_id,) in db.query(Service.provider_id).distinct()}
+            | {provider_id for (provider_id,) in db.query(ProviderReputation.provider_id)}
+        )
+        logger.info(f"Verifying reputation of {len(provider_ids)} providers")
+
+        drifting = 0
+        worst = 0.0
+        for provider_id in provider_ids:
+            report = reputation_service.verify(db, provider_id)
+            worst = max(worst, report["max_drift"])
+            if report["max_drift"] <= tolerance:
+                continue
+
+            drifting += 1
+            logger.warning(f"❌ Provider {provider_id} drifted by {report['max_drift']:.6g} (stored, recomputed): {report}")
+            if fix:
+                reputation_service.rebuild(db, provider_id)
+                db.commit()
+                leaderboard.update_provider(db, provider_id)
+                logger.info(f"✅ Rebuilt provider {provider_id}")
+
+        logger.info(f"🎉 Verification complete: {drifting} drifting providers, worst drift {worst:.6g}")
+        return drifting
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tolerance", type=float, default=1e-6, help="Largest acceptable difference (relative above 1)")
+    parser.add_argument("--fix", action="store_true", help="Rebuild drifting rows from the raw data")
+    args = parser.parse_args()
+
+    drifting = verify_reputation(args.tolerance, args.fix)
+    sys.exit(1 if drifting and not args.fix else 0)
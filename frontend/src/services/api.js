@@ -193,20 +193,28 @@ export const bookingsAPI = {
   },
 
   // List bookings (as seeker and/or provider)
+  // The API returns one page at a time; follow X-Next-Cursor until the last page
   list: async (params = { as_seeker: true, as_provider: true }) => {
-    const queryParams = new URLSearchParams();
-    if (params.as_seeker !== undefined) queryParams.append('as_seeker', params.as_seeker);
-    if (params.as_provider !== undefined) queryParams.append('as_provider', params.as_provider);
-
-    const url = `${API_BASE_URL}/bookings?${queryParams.toString()}`;
-    const response = await fetch(url, {
-      headers: getAuthHeaders(),
-    });
-    if (!response.ok) {
-      const msg = await getErrorDetail(response);
-      throw new Error(msg);
-    }
-    return response.json();
+    const bookings = [];
+    let cursor = null;
+    do {
+      const queryParams = new URLSearchParams();
+      if (params.as_seeker !== undefined) queryParams.append('as_seeker', params.as_seeker);
+      if (params.as_provider !== undefined) queryParams.append('as_provider', params.as_provider);
+      if (cursor) queryParams.append('cursor', cursor);
+
+      const url = `${API_BASE_URL}/bookings?${queryParams.toString()}`;
+      const response = await fetch(url, {
+        headers: getAuthHeaders(),
+      });
+      if (!response.ok) {
+        const msg = await getErrorDetail(response);
+        throw new Error(msg);
+      }
+      bookings.push(...(await response.json()));
+      cursor = response.headers.get('X-Next-Cursor');
+    } while (cursor);
+    return bookings;
   },
 
   // Get a single booking by ID